@@ -5,12 +5,13 @@ import functools
 import logging
 import random
 import secrets
+import threading
 from argparse import Namespace
 from collections import Counter, deque
 from collections.abc import Collection, MutableSequence
 from enum import IntEnum, IntFlag
-from typing import (AbstractSet, Any, Callable, ClassVar, Dict, Iterable, Iterator, List, Literal, Mapping, NamedTuple,
-                    Optional, Protocol, Set, Tuple, Union, TYPE_CHECKING)
+from typing import (AbstractSet, Any, Callable, ClassVar, Dict, FrozenSet, Iterable, Iterator, List, Literal, Mapping,
+                    NamedTuple, Optional, Protocol, Set, Tuple, Union, TYPE_CHECKING)
 import dataclasses
 
 from typing_extensions import NotRequired, TypedDict
@@ -21,6 +22,7 @@ import Utils
 
 if TYPE_CHECKING:
     from entrance_rando import ERPlacementState
+    from generation_profile import GenerationProfile
     from worlds import AutoWorld
 
 
@@ -75,6 +77,15 @@ class MultiWorld():
     regions: RegionManager
     itempool: List[Item]
     is_race: bool = False
+    profile: Optional[GenerationProfile] = None
+    """Set to collect a generation profile report, see generation_profile.py"""
+    fill_generation: int
+    """Incremented whenever item placements may have changed, invalidating the cached sphere decompositions.
+    Code that places or removes items by assigning Location.item directly, outside a generation step, has to increment
+    it too."""
+    _sphere_cache: Dict[str, Tuple[int, SphereDecomposition]]
+    _sphere_locks: Dict[str, threading.Lock]
+    _rule_index: CompiledRuleIndex
     precollected_items: Dict[int, List[Item]]
     state: CollectionState
 
@@ -146,6 +157,9 @@ class MultiWorld():
             return sum(len(regions) for regions in self.region_cache.values())
 
     def __init__(self, players: int):
+        # worlds extend CollectionState when imported, so all of them are loaded before the first state exists
+        from worlds import load_all_worlds
+        load_all_worlds()
         # world-local random state is saved for multiple generations running concurrently
         self.random = ThreadBarrierProxy(random.Random())
         self.players = players
@@ -172,6 +186,10 @@ class MultiWorld():
         self.local_early_items = {player: {} for player in self.player_ids}
         self.indirect_connections = {}
         self.start_inventory_from_pool: Dict[int, Options.StartInventoryPool] = {}
+        self.fill_generation = 0
+        self._sphere_cache = {}
+        self._sphere_locks = {"all": threading.Lock(), "sendable": threading.Lock()}
+        self._rule_index = CompiledRuleIndex()
         self.plando_item_blocks = {}
 
         for player in range(1, players + 1):
@@ -491,10 +509,12 @@ class MultiWorld():
     def push_precollected(self, item: Item):
         self.precollected_items[item.player].append(item)
         self.state.collect(item, True)
+        self.fill_generation += 1
 
     def push_item(self, location: Location, item: Item, collect: bool = True):
         location.item = item
         item.location = location
+        self.fill_generation += 1
         if collect:
             self.state.collect(item, location.advancement, location)
 
@@ -565,23 +585,21 @@ class MultiWorld():
         if starting_state:
             if self.has_beaten_game(starting_state):
                 return True
-            state = starting_state.copy()
+            state = starting_state.snapshot()
         else:
             state = CollectionState(self)
             if self.has_beaten_game(state):
                 return True
 
         base_locations = self.get_locations() if locations is None else locations
-        prog_locations = {location for location in base_locations if location.item
-                          and location.item.advancement and location not in state.locations_checked}
+        prog_locations = PendingLocations(state, (location for location in base_locations
+                                                  if location.item and location.item.advancement
+                                                  and location not in state.locations_checked))
 
         while prog_locations:
-            sphere: Set[Location] = set()
             # build up spheres of collection radius.
             # Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
-            for location in prog_locations:
-                if location.can_reach(state):
-                    sphere.add(location)
+            sphere = prog_locations.pop_reachable()
 
             if not sphere:
                 # ran out of places and did not finish yet, quit
@@ -589,13 +607,19 @@ class MultiWorld():
 
             for location in sphere:
                 state.collect(location.item, True, location)
-            prog_locations -= sphere
 
             if self.has_beaten_game(state):
                 return True
 
         return False
 
+    def get_sphere_decomposition(self) -> SphereDecomposition:
+        """
+        Returns the logical spheres of all filled locations, starting from the precollected items.
+        The result is cached until fill_generation changes, so repeated calls after fill are free.
+        """
+        return self._get_cached_spheres("all", self._build_sphere_decomposition)
+
     def get_spheres(self) -> Iterator[Set[Location]]:
         """
         yields a set of locations for each logical sphere
@@ -604,35 +628,59 @@ class MultiWorld():
         locations is followed by an empty set, and then a set of all of the
         unreachable locations.
         """
+        spheres, unreachable = self.get_sphere_decomposition()
+        for sphere in spheres:
+            yield set(sphere)
+        if unreachable:
+            yield set()
+            yield set(unreachable)
+
+    def get_sendable_spheres(self) -> Iterator[Set[Location]]:
+        """
+        yields a set of multiserver sendable locations (location.item.code: int) for each logical sphere
+
+        If there are unreachable locations, the last sphere of reachable locations is followed by an empty set,
+        and then a set of all of the unreachable locations.
+        """
+        spheres, unreachable = self._get_cached_spheres("sendable", self._build_sendable_sphere_decomposition)
+        for sphere in spheres:
+            yield set(sphere)
+        if unreachable:
+            yield set()
+            yield set(unreachable)
+
+    def _get_cached_spheres(self, kind: str,
+                            build: Callable[[], SphereDecomposition]) -> SphereDecomposition:
+        # output steps run in threads, the lock keeps them from building the same decomposition at the same time
+        with self._sphere_locks[kind]:
+            cached = self._sphere_cache.get(kind)
+            if cached and cached[0] == self.fill_generation:
+                return cached[1]
+            fill_generation = self.fill_generation
+            decomposition = build()
+            self._sphere_cache[kind] = fill_generation, decomposition
+            return decomposition
+
+    def _build_sphere_decomposition(self) -> SphereDecomposition:
         state = CollectionState(self)
-        locations = set(self.get_filled_locations())
+        locations = PendingLocations(state, self.get_filled_locations())
+        spheres: List[FrozenSet[Location]] = []
 
         while locations:
-            sphere: Set[Location] = set()
-
-            for location in locations:
-                if location.can_reach(state):
-                    sphere.add(location)
-            yield sphere
+            sphere = locations.pop_reachable()
             if not sphere:
-                if locations:
-                    yield locations  # unreachable locations
                 break
-
+            spheres.append(frozenset(sphere))
             for location in sphere:
                 state.collect(location.item, True, location)
-            locations -= sphere
 
-    def get_sendable_spheres(self) -> Iterator[Set[Location]]:
-        """
-        yields a set of multiserver sendable locations (location.item.code: int) for each logical sphere
+        return SphereDecomposition(tuple(spheres), frozenset(locations.remaining()))
 
-        If there are unreachable locations, the last sphere of reachable locations is followed by an empty set,
-        and then a set of all of the unreachable locations.
-        """
+    def _build_sendable_sphere_decomposition(self) -> SphereDecomposition:
         state = CollectionState(self)
-        locations: Set[Location] = set()
-        events: Set[Location] = set()
+        locations = PendingLocations(state)
+        events = PendingLocations(state)
+        spheres: List[FrozenSet[Location]] = []
         for location in self.get_filled_locations():
             if type(location.item.code) is int and type(location.address) is int:
                 locations.add(location)
@@ -640,36 +688,32 @@ class MultiWorld():
                 events.add(location)
 
         while locations:
-            sphere: Set[Location] = set()
-
             # cull events out
-            done_events: Set[Union[Location, None]] = {None}
+            done_events: Set[Location] = events.pop_reachable()
             while done_events:
-                done_events = set()
-                for event in events:
-                    if event.can_reach(state):
-                        state.collect(event.item, True, event)
-                        done_events.add(event)
-                events -= done_events
-
-            for location in locations:
-                if location.can_reach(state):
-                    sphere.add(location)
-
-            yield sphere
+                for event in done_events:
+                    state.collect(event.item, True, event)
+                done_events = events.pop_reachable()
+
+            sphere = locations.pop_reachable()
             if not sphere:
-                if locations:
-                    yield locations  # unreachable locations
                 break
+            spheres.append(frozenset(sphere))
+            for location in sphere:
+                state.collect(location.item, True, location)
+
+        return SphereDecomposition(tuple(spheres), frozenset(locations.remaining()))
 
+    def collect_spheres(self, spheres: Iterable[AbstractSet[Location]]) -> CollectionState:
+        """Returns a new state with the items of all locations in spheres collected, without checking reachability."""
+        state = CollectionState(self)
+        for sphere in spheres:
             for location in sphere:
                 state.collect(location.item, True, location)
-            locations -= sphere
+        return state
 
     def fulfills_accessibility(self, state: Optional[CollectionState] = None):
         """Check if accessibility rules are fulfilled with current or supplied state."""
-        if not state:
-            state = CollectionState(self)
         players: Dict[str, Set[int]] = {
             "minimal": set(),
             "items": set(),
@@ -678,8 +722,6 @@ class MultiWorld():
         for player, world in self.worlds.items():
             players[world.options.accessibility.current_key].add(player)
 
-        beatable_fulfilled = False
-
         def location_condition(location: Location) -> bool:
             """Determine if this location has to be accessible, location is already filtered by location_relevant"""
             return location.player in players["full"] or \
@@ -689,6 +731,21 @@ class MultiWorld():
             """Determine if this location is relevant to sweep."""
             return location.player in players["full"] or location.advancement
 
+        if not state:
+            # everything reachable is in the cached spheres, so only unfilled locations need to be checked
+            spheres, unreachable = self.get_sphere_decomposition()
+            state = self.collect_spheres(spheres)
+            missing = [location for location in self.get_locations() if location_relevant(location) and
+                       (location in unreachable if location.item else not location.can_reach(state))]
+            if self.has_beaten_game(state) and not any(location_condition(location) for location in missing):
+                return True
+            if missing:
+                logging.warning(f"Could not access required locations for accessibility check."
+                                f" Missing: {set(missing)}")
+            return False
+
+        beatable_fulfilled = False
+
         def all_done() -> bool:
             """Check if all access rules are fulfilled"""
             if not beatable_fulfilled:
@@ -697,18 +754,16 @@ class MultiWorld():
                 return False  # still locations required to be collected
             return True
 
-        locations = [location for location in self.get_locations() if location_relevant(location)]
+        locations = PendingLocations(state, (location for location in self.get_locations()
+                                             if location_relevant(location)))
 
         while locations:
-            sphere: List[Location] = []
-            for n in range(len(locations) - 1, -1, -1):
-                if locations[n].can_reach(state):
-                    sphere.append(locations.pop(n))
+            sphere = locations.pop_reachable()
 
             if not sphere:
                 # ran out of places and did not finish yet, quit
                 logging.warning(f"Could not access required locations for accessibility check."
-                                f" Missing: {locations}")
+                                f" Missing: {locations.remaining()}")
                 return False
 
             for location in sphere:
@@ -724,11 +779,235 @@ class MultiWorld():
         return False
 
 
+class SphereDecomposition(NamedTuple):
+    spheres: Tuple[FrozenSet[Location], ...]
+    """Locations in the order they become reachable, each sphere only depends on the items of earlier spheres."""
+    unreachable: FrozenSet[Location]
+    """Locations that are not reachable at all."""
+
+
 PathValue = Tuple[str, Optional["PathValue"]]
 
 
+class CompiledRuleIndex:
+    """
+    Locations with a compiled rule of their own player by the items and regions the rule reads, including the parent
+    region, shared by all PendingLocations of a MultiWorld. Entries are only ever added, a location whose rule got
+    replaced is found under the names of both rules, which only costs an extra check.
+    """
+    items: Dict[int, Dict[str, Set[Location]]]
+    regions: Dict[int, Dict[str, Set[Location]]]
+    indexed: Dict[Location, Tuple[Any, Region]]
+    """compiled rule and parent region each location was indexed with"""
+    rule_names: Dict[Any, Tuple[Set[str], Set[str]]]
+    """item and region names read by each CompiledRule"""
+
+    def __init__(self) -> None:
+        self.items = {}
+        self.regions = {}
+        self.indexed = {}
+        self.rule_names = {}
+
+    @staticmethod
+    def indexable(location: Location) -> bool:
+        if type(location).can_reach is not Location.can_reach:
+            return False
+        rule = getattr(location.access_rule, "compiled_rule", None)
+        region = location.parent_region
+        return rule is not None and rule.player == location.player and region is not None \
+            and region.player == location.player
+
+    def add(self, locations: Iterable[Location]) -> None:
+        """Adds indexable locations that were not indexed with their current rule and parent region yet."""
+        indexed = self.indexed
+        rule_names = self.rule_names
+        for location in locations:
+            key = location.access_rule.compiled_rule, location.parent_region
+            if indexed.get(location) == key:
+                continue
+            indexed[location] = key
+            rule, region = key
+            names = rule_names.get(rule)
+            if names is None:
+                names = rule_names[rule] = (rule.item_names(), rule.region_names())
+            item_index = self.items.setdefault(location.player, {})
+            for item_name in names[0]:
+                item_index.setdefault(item_name, set()).add(location)
+            region_index = self.regions.setdefault(location.player, {})
+            for region_name in names[1]:
+                region_index.setdefault(region_name, set()).add(location)
+            region_index.setdefault(region.name, set()).add(location)
+
+
+class PendingLocations:
+    """
+    Locations that were not reachable yet in a CollectionState, grouped by player.
+
+    A player's regions only become reachable through that player's items, so the only locations that can become
+    reachable without their player collecting anything are ones whose access rules read other players' items.
+    pop_reachable uses CollectionState.changes to find the players that collected or removed something since the last
+    pass and narrows down which of their locations are re-checked:
+
+    - Locations with a compiled rule (see worlds.generic.CompiledRules) are looked up in the CompiledRuleIndex of the
+      MultiWorld, so only those whose items increased or whose regions became reachable are re-checked.
+    - For worlds with World.own_items_logic, all other locations of the player are only re-checked if the player
+      changed, otherwise on every pass.
+
+    Access rules must not change while a location is pending.
+    """
+    state: CollectionState
+    locations: Dict[int, Set[Location]]
+    unindexed: Dict[int, Set[Location]]
+    """pending locations without a compiled rule of their own player, which can't be narrowed down by the index"""
+    fresh: Dict[int, Set[Location]]
+    """locations with a compiled rule that were not checked yet, they are indexed after their first check"""
+    checked_changes: Dict[int, int]
+    """CollectionState.changes of each player at their last check"""
+    checked_items: Dict[int, Dict[str, int]]
+    """prog_items of each player at their last check"""
+    checked_regions: Dict[int, Set[Region]]
+    """reachable regions of each player at their last check"""
+    index: CompiledRuleIndex
+    own_items_players: Set[int]
+    """players whose worlds set World.own_items_logic"""
+
+    def __init__(self, state: CollectionState, locations: Iterable[Location] = ()) -> None:
+        self.state = state
+        self.locations = {}
+        self.unindexed = {}
+        self.fresh = {}
+        self.checked_changes = {}
+        self.checked_items = {}
+        self.checked_regions = {}
+        self.index = state.multiworld._rule_index
+        self.own_items_players = {player for player, world in state.multiworld.worlds.items()
+                                  if world.own_items_logic}
+        for location in locations:
+            self.add(location)
+
+    def __bool__(self) -> bool:
+        return any(self.locations.values())
+
+    def __len__(self) -> int:
+        return sum(len(locations) for locations in self.locations.values())
+
+    def __iter__(self) -> Iterator[Location]:
+        for locations in self.locations.values():
+            yield from locations
+
+    def __contains__(self, location: Location) -> bool:
+        player_locations = self.locations.get(location.player)
+        return player_locations is not None and location in player_locations
+
+    def copy(self, state: CollectionState) -> PendingLocations:
+        """
+        Returns a copy that tracks state instead, which has to be a copy or snapshot of this state with nothing
+        collected or removed since, so the copy can skip the same locations.
+        """
+        ret = PendingLocations.__new__(PendingLocations)
+        ret.state = state
+        ret.locations = {player: locations.copy() for player, locations in self.locations.items()}
+        ret.unindexed = {player: locations.copy() for player, locations in self.unindexed.items()}
+        ret.fresh = {player: locations.copy() for player, locations in self.fresh.items()}
+        ret.checked_changes = self.checked_changes.copy()
+        # replaced instead of modified on every check, so they can be shared
+        ret.checked_items = self.checked_items.copy()
+        ret.checked_regions = self.checked_regions.copy()
+        ret.index = self.index
+        ret.own_items_players = self.own_items_players
+        return ret
+
+    def add(self, location: Location) -> None:
+        player = location.player
+        player_locations = self.locations.get(player)
+        if player_locations is None:
+            player_locations = self.locations[player] = set()
+            self.unindexed[player] = set()
+            self.fresh[player] = set()
+        player_locations.add(location)
+        if self.index.indexable(location):
+            self.fresh[player].add(location)
+        else:
+            self.unindexed[player].add(location)
+        self.checked_changes.pop(player, None)
+
+    def discard(self, location: Location) -> None:
+        player_locations = self.locations.get(location.player)
+        if player_locations is not None:
+            player_locations.discard(location)
+            self.unindexed[location.player].discard(location)
+            self.fresh[location.player].discard(location)
+
+    def remaining(self) -> Set[Location]:
+        """Returns all locations that were not reachable so far."""
+        return set(self)
+
+    def pop_reachable(self) -> Set[Location]:
+        """Removes and returns all pending locations that are reachable in state."""
+        state = self.state
+        changes = state.changes
+        checked_changes = self.checked_changes
+        reachable: Set[Location] = set()
+        for player, locations in self.locations.items():
+            if not locations:
+                continue
+            unindexed = self.unindexed[player]
+            fresh = None
+            if checked_changes.get(player) == changes[player]:
+                if player in self.own_items_players or not unindexed:
+                    continue
+                candidates = unindexed
+            else:
+                checked_changes[player] = changes[player]
+                candidates = unindexed
+                fresh = self.fresh[player]
+                if fresh or player in self.index.items:
+                    candidates = unindexed | fresh | self._changed_candidates(player, locations)
+                    self.fresh[player] = set()
+            player_reachable = state.filter_reachable(candidates)
+            if fresh:
+                # most locations of the first spheres never need to be indexed
+                self.index.add(fresh - player_reachable)
+            if player_reachable:
+                locations -= player_reachable
+                unindexed -= player_reachable
+                reachable |= player_reachable
+        return reachable
+
+    def _changed_candidates(self, player: int, locations: Set[Location]) -> Set[Location]:
+        """
+        Returns the pending indexed locations of player whose items increased or whose regions became reachable
+        since the last check. Compiled rules only test for at least a count of items, so a location that was not
+        reachable can't become reachable without either.
+        """
+        candidates: Set[Location] = set()
+        item_index = self.index.items.get(player, {})
+        items = dict(self.state.prog_items[player])
+        checked_items = self.checked_items.get(player)
+        if checked_items is not None:
+            for item_name, count in items.items() - checked_items.items():
+                if count > checked_items.get(item_name, 0) and item_name in item_index:
+                    candidates |= item_index[item_name]
+        self.checked_items[player] = items
+        if self.state.stale[player]:
+            self.state.update_reachable_regions(player)
+        regions = self.state.reachable_regions[player]
+        checked_regions = self.checked_regions.get(player)
+        if checked_regions is not None:
+            region_index = self.index.regions.get(player, {})
+            for region in regions - checked_regions:
+                if region.name in region_index:
+                    candidates |= region_index[region.name]
+        self.checked_regions[player] = regions.copy()
+        return candidates & locations
+
+
 class CollectionState():
     prog_items: Dict[int, Counter[str]]
+    """
+    Per-player counts of collected items. A player's Counter may be shared with a snapshot, so writes have to go through
+    add_item, remove_item or set_item, or happen in World.collect or World.remove for the player of the item.
+    """
     multiworld: MultiWorld
     reachable_regions: Dict[int, Set[Region]]
     blocked_connections: Dict[int, Set[Entrance]]
@@ -736,6 +1015,10 @@ class CollectionState():
     path: Dict[Union[Region, Entrance], PathValue]
     locations_checked: Set[Location]
     stale: Dict[int, bool]
+    changes: Dict[int, int]
+    """Per-player count of collected and removed items, to find players whose reachability may have changed."""
+    shared_players: Set[int]
+    """Players whose prog_items, reachable_regions and blocked_connections are shared with a snapshot."""
     allow_partial_entrances: bool
     additional_init_functions: List[Callable[[CollectionState, MultiWorld], None]] = []
     additional_copy_functions: List[Callable[[CollectionState, CollectionState], CollectionState]] = []
@@ -750,6 +1033,8 @@ class CollectionState():
         self.path = {}
         self.locations_checked = set()
         self.stale = {player: True for player in parent.get_all_ids()}
+        self.changes = {player: 0 for player in parent.get_all_ids()}
+        self.shared_players = set()
         self.allow_partial_entrances = allow_partial_entrances
         for function in self.additional_init_functions:
             function(self, parent)
@@ -758,6 +1043,8 @@ class CollectionState():
                 self.collect(item, True)
 
     def update_reachable_regions(self, player: int):
+        if player in self.shared_players:
+            self._unshare(player)
         self.stale[player] = False
         world: AutoWorld.World = self.multiworld.worlds[player]
         reachable_regions = self.reachable_regions[player]
@@ -825,7 +1112,9 @@ class CollectionState():
             queue.extend(blocked_connections)
 
     def copy(self) -> CollectionState:
-        ret = CollectionState(self.multiworld)
+        # skip __init__, which would build empty containers and collect all precollected items only to replace them
+        ret = CollectionState.__new__(CollectionState)
+        ret.multiworld = self.multiworld
         ret.prog_items = {player: counter.copy() for player, counter in self.prog_items.items()}
         ret.reachable_regions = {player: region_set.copy() for player, region_set in
                                  self.reachable_regions.items()}
@@ -834,11 +1123,53 @@ class CollectionState():
         ret.advancements = self.advancements.copy()
         ret.path = self.path.copy()
         ret.locations_checked = self.locations_checked.copy()
+        # the copy may get modified directly, so reachability gets rebuilt (from the copied regions) like after __init__
+        ret.stale = {player: True for player in self.stale}
+        ret.changes = self.changes.copy()
+        ret.shared_players = set()
+        ret.allow_partial_entrances = self.allow_partial_entrances
+        for function in self.additional_init_functions:
+            function(ret, self.multiworld)
+        for function in self.additional_copy_functions:
+            ret = function(self, ret)
+        return ret
+
+    def snapshot(self) -> CollectionState:
+        """
+        Returns a copy that shares each player's prog_items, reachable_regions and blocked_connections with this state
+        until either state writes to them, so the cost only scales with the players that get modified afterwards.
+
+        Writes have to go through collect, remove, add_item, remove_item, set_item or update_reachable_regions, which
+        unshare the player first. World.collect and World.remove run after that for the item's player, so they can write
+        to prog_items of that player directly. Any other direct write, like an access rule caching a value in
+        prog_items, would change the state it was shared with, so use set_item for those.
+        """
+        ret = CollectionState.__new__(CollectionState)
+        ret.multiworld = self.multiworld
+        ret.prog_items = self.prog_items.copy()
+        ret.reachable_regions = self.reachable_regions.copy()
+        ret.blocked_connections = self.blocked_connections.copy()
+        self.shared_players = set(self.prog_items)
+        ret.shared_players = self.shared_players.copy()
+        ret.advancements = self.advancements.copy()
+        ret.path = self.path.copy()
+        ret.locations_checked = self.locations_checked.copy()
+        # the shared containers are up-to-date for the shared items, so there is no need to rebuild them
+        ret.stale = self.stale.copy()
+        ret.changes = self.changes.copy()
         ret.allow_partial_entrances = self.allow_partial_entrances
+        for function in self.additional_init_functions:
+            function(ret, self.multiworld)
         for function in self.additional_copy_functions:
             ret = function(self, ret)
         return ret
 
+    def _unshare(self, player: int) -> None:
+        self.prog_items[player] = self.prog_items[player].copy()
+        self.reachable_regions[player] = self.reachable_regions[player].copy()
+        self.blocked_connections[player] = self.blocked_connections[player].copy()
+        self.shared_players.remove(player)
+
     def can_reach(self,
                   spot: Union[Location, Entrance, Region, str],
                   resolution_hint: Optional[str] = None,
@@ -864,6 +1195,33 @@ class CollectionState():
     def can_reach_region(self, spot: str, player: int) -> bool:
         return self.multiworld.get_region(spot, player).can_reach(self)
 
+    def filter_reachable(self, locations: Iterable[Location]) -> Set[Location]:
+        """
+        Returns the reachable locations out of locations in a single batched pass.
+        Compiled rules (see worlds.generic.CompiledRules) are shared between equal rules of a player,
+        so each of them is only evaluated once per pass.
+        """
+        results: Dict[int, bool] = {}
+        reachable: Set[Location] = set()
+        for location in locations:
+            if type(location).can_reach is not Location.can_reach:
+                if location.can_reach(self):
+                    reachable.add(location)
+                continue
+            assert location.parent_region, f"called can_reach on a Location \"{location}\" with no parent_region"
+            if not location.parent_region.can_reach(self):
+                continue
+            rule = location.access_rule
+            result = results.get(id(rule))
+            if result is None:
+                result = rule(self)
+                # only compiled rules are known to not depend on anything but the state
+                if getattr(rule, "compiled_rule", None):
+                    results[id(rule)] = result
+            if result:
+                reachable.add(location)
+        return reachable
+
     def sweep_for_events(self, locations: Optional[Iterable[Location]] = None) -> None:
         Utils.deprecate("sweep_for_events has been renamed to sweep_for_advancements. The functionality is the same. "
                         "Please switch over to sweep_for_advancements.")
@@ -874,11 +1232,11 @@ class CollectionState():
             locations = self.multiworld.get_filled_locations()
         reachable_advancements = True
         # since the loop has a good chance to run more than once, only filter the advancements once
-        locations = {location for location in locations if location.advancement and location not in self.advancements}
+        pending = PendingLocations(self, (location for location in locations
+                                          if location.advancement and location not in self.advancements))
 
         while reachable_advancements:
-            reachable_advancements = {location for location in locations if location.can_reach(self)}
-            locations -= reachable_advancements
+            reachable_advancements = pending.pop_reachable()
             for advancement in reachable_advancements:
                 self.advancements.add(advancement)
                 assert isinstance(advancement.item, Item), "tried to collect Event with no Item"
@@ -886,52 +1244,54 @@ class CollectionState():
 
     # item name related
     def has(self, item: str, player: int, count: int = 1) -> bool:
-        return self.prog_items[player][item] >= count
+        return self.prog_items[player].get(item, 0) >= count
 
     # for loops are specifically used in all/any/count methods, instead of all()/any()/sum(), to avoid the overhead of
     # creating and iterating generator instances. In `return all(player_prog_items[item] for item in items)`, the
     # argument to all() would be a new generator instance, for example.
+    # Counts are looked up with .get(item, 0) instead of [item], as most checked items are not collected yet and
+    # Counter calls its Python level __missing__ for those.
     def has_all(self, items: Iterable[str], player: int) -> bool:
         """Returns True if each item name of items is in state at least once."""
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         for item in items:
-            if not player_prog_items[item]:
+            if not count_of(item, 0):
                 return False
         return True
 
     def has_any(self, items: Iterable[str], player: int) -> bool:
         """Returns True if at least one item name of items is in state at least once."""
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         for item in items:
-            if player_prog_items[item]:
+            if count_of(item, 0):
                 return True
         return False
 
     def has_all_counts(self, item_counts: Mapping[str, int], player: int) -> bool:
         """Returns True if each item name is in the state at least as many times as specified."""
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         for item, count in item_counts.items():
-            if player_prog_items[item] < count:
+            if count_of(item, 0) < count:
                 return False
         return True
 
     def has_any_count(self, item_counts: Mapping[str, int], player: int) -> bool:
         """Returns True if at least one item name is in the state at least as many times as specified."""
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         for item, count in item_counts.items():
-            if player_prog_items[item] >= count:
+            if count_of(item, 0) >= count:
                 return True
         return False
 
     def count(self, item: str, player: int) -> int:
-        return self.prog_items[player][item]
+        return self.prog_items[player].get(item, 0)
 
     def has_from_list(self, items: Iterable[str], player: int, count: int) -> bool:
         """Returns True if the state contains at least `count` items matching any of the item names from a list."""
         found: int = 0
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         for item_name in items:
-            found += player_prog_items[item_name]
+            found += count_of(item_name, 0)
             if found >= count:
                 return True
         return False
@@ -940,27 +1300,27 @@ class CollectionState():
         """Returns True if the state contains at least `count` items matching any of the item names from a list.
         Ignores duplicates of the same item."""
         found: int = 0
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         for item_name in items:
-            found += player_prog_items[item_name] > 0
+            found += count_of(item_name, 0) > 0
             if found >= count:
                 return True
         return False
 
     def count_from_list(self, items: Iterable[str], player: int) -> int:
         """Returns the cumulative count of items from a list present in state."""
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         total = 0
         for item_name in items:
-            total += player_prog_items[item_name]
+            total += count_of(item_name, 0)
         return total
 
     def count_from_list_unique(self, items: Iterable[str], player: int) -> int:
         """Returns the cumulative count of items from a list present in state. Ignores duplicates of the same item."""
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         total = 0
         for item_name in items:
-            if player_prog_items[item_name] > 0:
+            if count_of(item_name, 0) > 0:
                 total += 1
         return total
 
@@ -968,9 +1328,9 @@ class CollectionState():
     def has_group(self, item_name_group: str, player: int, count: int = 1) -> bool:
         """Returns True if the state contains at least `count` items present in a specified item group."""
         found: int = 0
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
-            found += player_prog_items[item_name]
+            found += count_of(item_name, 0)
             if found >= count:
                 return True
         return False
@@ -980,27 +1340,27 @@ class CollectionState():
         Ignores duplicates of the same item.
         """
         found: int = 0
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
-            found += player_prog_items[item_name] > 0
+            found += count_of(item_name, 0) > 0
             if found >= count:
                 return True
         return False
 
     def count_group(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state."""
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         return sum(
-            player_prog_items[item_name]
+            count_of(item_name, 0)
             for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]
         )
 
     def count_group_unique(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state.
         Ignores duplicates of the same item."""
-        player_prog_items = self.prog_items[player]
+        count_of = self.prog_items[player].get
         return sum(
-            player_prog_items[item_name] > 0
+            count_of(item_name, 0) > 0
             for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]
         )
 
@@ -1008,10 +1368,13 @@ class CollectionState():
     def collect(self, item: Item, prevent_sweep: bool = False, location: Optional[Location] = None) -> bool:
         if location:
             self.locations_checked.add(location)
+        if item.player in self.shared_players:
+            self._unshare(item.player)
 
         changed = self.multiworld.worlds[item.player].collect(self, item)
 
         self.stale[item.player] = True
+        self.changes[item.player] += 1
 
         if changed and not prevent_sweep:
             self.sweep_for_advancements()
@@ -1027,15 +1390,20 @@ class CollectionState():
         :param count: How many of the item to add.
         """
         assert count > 0
+        if player in self.shared_players:
+            self._unshare(player)
         self.prog_items[player][item] += count
 
     def remove(self, item: Item):
+        if item.player in self.shared_players:
+            self._unshare(item.player)
         changed = self.multiworld.worlds[item.player].remove(self, item)
         if changed:
             # invalidate caches, nothing can be trusted anymore now
             self.reachable_regions[item.player] = set()
             self.blocked_connections[item.player] = set()
             self.stale[item.player] = True
+            self.changes[item.player] += 1
 
     def remove_item(self, item: str, player: int, count: int = 1) -> None:
         """
@@ -1046,6 +1414,8 @@ class CollectionState():
         :param count: How many of the item to remove.
         """
         assert count > 0
+        if player in self.shared_players:
+            self._unshare(player)
         self.prog_items[player][item] -= count
         if self.prog_items[player][item] < 1:
             del (self.prog_items[player][item])
@@ -1059,8 +1429,10 @@ class CollectionState():
         :param count: How many of the item to now have.
         """
         assert count >= 0
+        if player in self.shared_players:
+            self._unshare(player)
         if count == 0:
-            del (self.prog_items[player][item])
+            self.prog_items[player].pop(item, None)
         else:
             self.prog_items[player][item] = count
 
@@ -1402,6 +1774,8 @@ class Location:
         self.item = item
         item.location = self
         self.locked = True
+        if self.parent_region and self.parent_region.multiworld:
+            self.parent_region.multiworld.fill_generation += 1
 
     def __repr__(self):
         multiworld = self.parent_region.multiworld if self.parent_region and self.parent_region.multiworld else None
@@ -1571,39 +1945,36 @@ class Spoiler:
         from itertools import chain
         # get locations containing progress items
         multiworld = self.multiworld
-        prog_locations = {location for location in multiworld.get_filled_locations() if location.item.advancement}
         state_cache: List[Optional[CollectionState]] = [None]
         collection_spheres: List[Set[Location]] = []
         state = CollectionState(multiworld)
-        sphere_candidates = set(prog_locations)
         logging.debug('Building up collection spheres.')
-        while sphere_candidates:
-
-            # build up spheres of collection radius.
-            # Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
-
-            sphere = {location for location in sphere_candidates if state.can_reach(location)}
+        # build up spheres of collection radius from the cached decomposition, only progress items affect logic.
+        # Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
+        decomposition = multiworld.get_sphere_decomposition()
+        for sphere in decomposition.spheres:
+            sphere = {location for location in sphere if location.item.advancement}
+            if not sphere:
+                continue
 
             for location in sphere:
                 state.collect(location.item, True, location)
 
-            sphere_candidates -= sphere
             collection_spheres.append(sphere)
             state_cache.append(state.copy())
 
-            logging.debug('Calculated sphere %i, containing %i of %i progress items.', len(collection_spheres),
-                          len(sphere),
-                          len(prog_locations))
-            if not sphere:
-                logging.debug('The following items could not be reached: %s', ['%s (Player %d) at %s (Player %d)' % (
-                    location.item.name, location.item.player, location.name, location.player) for location in
-                                                                               sphere_candidates])
-                if any([multiworld.worlds[location.item.player].options.accessibility != 'minimal' for location in sphere_candidates]):
-                    raise RuntimeError(f'Not all progression items reachable ({sphere_candidates}). '
-                                       f'Something went terribly wrong here.')
-                else:
-                    self.unreachables = sphere_candidates
-                    break
+            logging.debug('Calculated sphere %i, containing %i progress items.', len(collection_spheres), len(sphere))
+
+        sphere_candidates = {location for location in decomposition.unreachable if location.item.advancement}
+        if sphere_candidates:
+            logging.debug('The following items could not be reached: %s', ['%s (Player %d) at %s (Player %d)' % (
+                location.item.name, location.item.player, location.name, location.player) for location in
+                                                                           sphere_candidates])
+            if any([multiworld.worlds[location.item.player].options.accessibility != 'minimal' for location in sphere_candidates]):
+                raise RuntimeError(f'Not all progression items reachable ({sphere_candidates}). '
+                                   f'Something went terribly wrong here.')
+            else:
+                self.unreachables = sphere_candidates
 
         # in the second phase, we cull each sphere such that the game is still beatable,
         # reducing each range of influence to the bare minimum required inside it
@@ -23,7 +23,8 @@ if __name__ == "__main__":
 
 from MultiServer import CommandProcessor
 from NetUtils import (Endpoint, decode, NetworkItem, encode, JSONtoTextParser, ClientStatus, Permission, NetworkSlot,
-                      RawJSONtoTextParser, add_json_text, add_json_location, add_json_item, JSONTypes, HintStatus, SlotType)
+                      RawJSONtoTextParser, add_json_text, add_json_location, add_json_item, JSONTypes, HintStatus,
+                      SlotType, get_items_checkpoint, decode_item_columns)
 from Utils import Version, stream_input, async_start
 from worlds import network_data_package, AutoWorldRegister
 import os
@@ -188,6 +189,12 @@ class CommonContext:
     game: typing.Optional[str] = None
     items_handling: typing.Optional[int] = None
     want_slot_data: bool = True  # should slot_data be retrieved via Connect
+    # after reconnecting or resyncing, only ask for the items that were not received before. Only turn on for clients
+    # that handle ReceivedItems with a nonzero index, instead of rebuilding their item state at index 0 after Connect
+    resume_received_items: bool = False
+    # ask the server for large ReceivedItems packets as columns. Only turn on for clients that read the items
+    # from on_package or items_received, as other code would find "columns" instead of "items" in the packet
+    columnar_items: bool = False
 
     class NameLookupDict:
         """A specialized dict, with helper methods, for id -> name item/location data package lookups by game."""
@@ -308,6 +315,8 @@ class CommonContext:
     """
     items_received: list[NetworkItem]
     """List of NetworkItems recieved from the server"""
+    previous_items_received: list[NetworkItem]
+    """items_received of the last connection, kept until the server answers whether they can be resumed"""
     missing_locations: set[int]
     """Container of Locations that are unchecked per server state"""
     checked_locations: set[int]
@@ -356,6 +365,7 @@ class CommonContext:
         self.locations_checked = set()  # local state
         self.locations_scouted = set()
         self.items_received = []
+        self.previous_items_received = []
         self.missing_locations = set()  # server state
         self.checked_locations = set()  # server state
         self.server_locations = set()  # all locations the server knows of, missing_location | checked_locations
@@ -408,6 +418,8 @@ class CommonContext:
         self.auth = None
         self.slot = None
         self.team = None
+        if self.resume_received_items and self.items_received:
+            self.previous_items_received = self.items_received
         self.items_received = []
         self.locations_info = {}
         self.server_version = Version(0, 0, 0)
@@ -472,7 +484,10 @@ class CommonContext:
             'password': self.password, 'name': self.auth, 'version': Utils.version_tuple,
             'tags': self.tags, 'items_handling': self.items_handling,
             'uuid': Utils.get_unique_identifier(), 'game': self.game, "slot_data": self.want_slot_data,
+            "columnar_items": self.columnar_items,
         }
+        if self.previous_items_received:
+            payload["items_checkpoint"] = get_items_checkpoint(self.previous_items_received)
         if kwargs:
             payload.update(kwargs)
         await self.send_msgs([payload])
@@ -966,12 +981,20 @@ async def process_server_cmd(ctx: CommonContext, args: dict):
         Utils.persistent_store("client", "last_server_address", server_url.netloc)
 
     elif cmd == 'ReceivedItems':
+        if "columns" in args:
+            args["items"] = decode_item_columns(args.pop("columns"))
         start_index = args["index"]
+        if start_index and not ctx.items_received and start_index == len(ctx.previous_items_received):
+            # the server resumed from the items_checkpoint of Connect
+            ctx.items_received = ctx.previous_items_received
+        ctx.previous_items_received = []
 
         if start_index == 0:
             ctx.items_received = []
         elif start_index != len(ctx.items_received):
             sync_msg = [{'cmd': 'Sync'}]
+            if ctx.resume_received_items:
+                sync_msg[0]["items_checkpoint"] = get_items_checkpoint(ctx.items_received)
             if ctx.locations_checked:
                 sync_msg.append({"cmd": "LocationChecks",
                                  "locations": list(ctx.locations_checked)})
@@ -1096,6 +1119,8 @@ def run_as_textclient(*args):
         game = ""  # empty matches any game since 0.3.2
         items_handling = 0b111  # receive all items for /received
         want_slot_data = False  # Can't use game specific slot_data
+        resume_received_items = True
+        columnar_items = True
 
         async def server_auth(self, password_requested: bool = False):
             if password_requested and not self.password:
@@ -1,15 +1,24 @@
 import collections
 import itertools
 import logging
+import time
 import typing
 from collections import Counter, deque
 
-from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld, PlandoItemBlock
+from BaseClasses import (CollectionState, Item, Location, LocationProgressType, MultiWorld, PendingLocations,
+                         PlandoItemBlock)
 from Options import Accessibility
 
 from worlds.AutoWorld import call_all
 from worlds.generic.Rules import add_item_rule
 
+stable_pool_fraction: float = 7 / 8
+"""
+Share of each player's unplaced items that `fill_restrictive` uses for the `IncrementalPoolSweep` checkpoint.
+Items are placed from the back of each player's queue, so the checkpoint stays valid until the last 1/8 is placed.
+A larger share means the checkpoint covers more of the pool, but it also has to be rebuilt sooner.
+"""
+
 
 class FillError(RuntimeError):
     def __init__(self, *args: typing.Union[str, typing.Any], **kwargs) -> None:
@@ -26,18 +35,77 @@ def _log_fill_progress(name: str, placed: int, total_items: int) -> None:
 
 def sweep_from_pool(base_state: CollectionState, itempool: typing.Sequence[Item] = tuple(),
                     locations: typing.Optional[typing.List[Location]] = None) -> CollectionState:
-    new_state = base_state.copy()
+    new_state = base_state.snapshot()
     for item in itempool:
         new_state.collect(item, True)
     new_state.sweep_for_advancements(locations=locations)
     return new_state
 
 
+class IncrementalPoolSweep:
+    """
+    Produces the same states as `sweep_from_pool`, but reuses a swept checkpoint for a subset of the pool.
+
+    Removing items from the assumed pool cannot be undone on a swept state, so the checkpoint is built only from items
+    that are expected to stay in the pool for a while. As long as all of those items are still in the pool and no
+    placed item got moved, the checkpoint is a subset of the maximum exploration state of the current pool, so
+    collecting the remaining pool items into a copy of it and sweeping again reaches the same state as a full re-sweep.
+    This only holds while the swept locations belong to the same players, so the checkpoint is rebuilt when they change.
+    """
+    base_state: CollectionState
+    checkpoint: typing.Optional[CollectionState]
+    checkpoint_items: typing.Set[int]
+    """ids of the items collected into checkpoint"""
+    checkpoint_players: typing.Optional[typing.FrozenSet[int]]
+    """players of the locations swept for checkpoint, None for all locations"""
+
+    def __init__(self, base_state: CollectionState) -> None:
+        self.base_state = base_state
+        self.checkpoint = None
+        self.checkpoint_items = set()
+        self.checkpoint_players = None
+
+    def invalidate(self) -> None:
+        """Discard the checkpoint, for example because a placed item was moved."""
+        self.checkpoint = None
+        self.checkpoint_items = set()
+        self.checkpoint_players = None
+
+    def discard(self, items: typing.Iterable[Item]) -> None:
+        """Report items that got removed from the assumed pool."""
+        if self.checkpoint and any(id(item) in self.checkpoint_items for item in items):
+            self.invalidate()
+
+    def sweep(self, itempool: typing.Sequence[Item], stable_items: typing.Callable[[], typing.Iterable[Item]],
+              locations: typing.Optional[typing.List[Location]] = None) -> CollectionState:
+        """
+        :param itempool: Items assumed to be collectable, same as for `sweep_from_pool`.
+        :param stable_items: Returns a subset of itempool that is expected to stay in it, used to build a checkpoint.
+        :param locations: Locations to sweep, same as for `sweep_from_pool`.
+        """
+        players = None if locations is None else frozenset(location.player for location in locations)
+        if self.checkpoint is not None and players != self.checkpoint_players:
+            # advancements of other players' locations would be collected in the checkpoint, but not in a re-sweep
+            self.invalidate()
+        if self.checkpoint is None:
+            stable = list(stable_items())
+            self.checkpoint = sweep_from_pool(self.base_state, stable, locations)
+            self.checkpoint_items = {id(item) for item in stable}
+            self.checkpoint_players = players
+        new_state = self.checkpoint.snapshot()
+        checkpoint_items = self.checkpoint_items
+        for item in itempool:
+            if id(item) not in checkpoint_items:
+                new_state.collect(item, True)
+        new_state.sweep_for_advancements(locations=locations)
+        return new_state
+
+
 def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locations: typing.List[Location],
                      item_pool: typing.List[Item], single_player_placement: bool = False, lock: bool = False,
                      swap: bool = True, on_place: typing.Optional[typing.Callable[[Location], None]] = None,
                      allow_partial: bool = False, allow_excluded: bool = False, one_item_per_player: bool = True,
-                     name: str = "Unknown") -> None:
+                     name: str = "Unknown", incremental_sweep: bool = True) -> None:
     """
     :param multiworld: Multiworld to be filled.
     :param base_state: State assumed before fill.
@@ -50,6 +118,8 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
     :param allow_partial: only place what is possible. Remaining items will be in the item_pool list.
     :param allow_excluded: if true and placement fails, it is re-attempted while ignoring excluded on Locations
     :param name: name of this fill step for progress logging purposes
+    :param incremental_sweep: if true, reuses sweep checkpoints between placements instead of re-sweeping from
+    base_state
     """
     unplaced_items: typing.List[Item] = []
     placements: typing.List[Location] = []
@@ -58,10 +128,19 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
     reachable_items: typing.Dict[int, typing.Deque[Item]] = {}
     for item in item_pool:
         reachable_items.setdefault(item.player, deque()).append(item)
+    pool_sweep = IncrementalPoolSweep(base_state) if incremental_sweep else None
+
+    def stable_items() -> typing.Iterator[Item]:
+        # items are taken from the end of each deque, so the front of each stays in the pool the longest
+        for items in reachable_items.values():
+            yield from itertools.islice(items, int(len(items) * stable_pool_fraction))
+        # unplaced items only get returned to item_pool after the loop
+        yield from unplaced_items
 
     # for progress logging
     total = min(len(item_pool), len(locations))
     placed = 0
+    start = time.perf_counter()
 
     while any(reachable_items.values()) and locations:
         if one_item_per_player:
@@ -82,9 +161,15 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                     del item_pool[-p]
                     break
 
-        maximum_exploration_state = sweep_from_pool(
-            base_state, item_pool + unplaced_items, multiworld.get_filled_locations(item.player)
-            if single_player_placement else None)
+        if pool_sweep:
+            pool_sweep.discard(items_to_place)
+            maximum_exploration_state = pool_sweep.sweep(
+                item_pool + unplaced_items, stable_items, multiworld.get_filled_locations(item.player)
+                if single_player_placement else None)
+        else:
+            maximum_exploration_state = sweep_from_pool(
+                base_state, item_pool + unplaced_items, multiworld.get_filled_locations(item.player)
+                if single_player_placement else None)
 
         has_beaten_game = multiworld.has_beaten_game(maximum_exploration_state)
 
@@ -151,6 +236,9 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
 
                             # cleanup at the end to hopefully get better errors
                             cleanup_required = True
+                            # the checkpoint may have collected placed_item from this location
+                            if pool_sweep:
+                                pool_sweep.invalidate()
 
                             break
 
@@ -176,6 +264,8 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
 
     if total > 1000:
         _log_fill_progress(name, placed, total)
+    if multiworld.profile:
+        multiworld.profile.record_fill_step(name, time.perf_counter() - start)
 
     if cleanup_required:
         # validate all placements and remove invalid ones
@@ -188,6 +278,7 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                 unplaced_items.append(placement.item)
                 placement.item = None
                 locations.append(placement)
+                multiworld.fill_generation += 1
 
     if allow_excluded:
         # check if partial fill is the result of excluded locations, in which case retry
@@ -199,7 +290,7 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
             for location in excluded_locations:
                 location.progress_type = location.progress_type.DEFAULT
             fill_restrictive(multiworld, base_state, excluded_locations, unplaced_items, single_player_placement, lock,
-                             swap, on_place, allow_partial, False)
+                             swap, on_place, allow_partial, False, incremental_sweep=incremental_sweep)
             for location in excluded_locations:
                 if not location.item:
                     location.progress_type = location.progress_type.EXCLUDED
@@ -233,6 +324,7 @@ def remaining_fill(multiworld: MultiWorld,
     swapped_items: typing.Counter[typing.Tuple[int, str]] = Counter()
     total = min(len(itempool), len(locations))
     placed = 0
+    start = time.perf_counter()
 
     # Optimisation: Decide whether to do full location.can_fill check (respect excluded), or only check the item rule
     if check_location_can_fill:
@@ -299,6 +391,8 @@ def remaining_fill(multiworld: MultiWorld,
 
     if total > 1000:
         _log_fill_progress(name, placed, total)
+    if multiworld.profile:
+        multiworld.profile.record_fill_step(name, time.perf_counter() - start)
 
     if unplaced_items and locations:
         # There are leftover unplaceable items and locations that won't accept them
@@ -342,6 +436,7 @@ def accessibility_corrections(multiworld: MultiWorld, state: CollectionState, lo
                 location.locked and location.item.player not in minimal_players):
             pool.append(location.item)
             location.item = None
+            multiworld.fill_generation += 1
             if location in state.advancements:
                 state.advancements.remove(location)
                 state.remove(location.item)
@@ -655,13 +750,21 @@ def flood_items(multiworld: MultiWorld) -> None:
                 break
 
 
-def balance_multiworld_progression(multiworld: MultiWorld) -> None:
+def balance_multiworld_progression(multiworld: MultiWorld, time_limit: float = 0, max_rounds: int = 0) -> None:
+    """
+    :param time_limit: Seconds after which no further spheres get balanced, 0 for no limit.
+    Unlike max_rounds, this makes the result depend on the speed of the machine.
+    :param max_rounds: Maximum number of spheres to balance, 0 for no limit.
+    """
     # A system to reduce situations where players have no checks remaining, popularly known as "BK mode."
     # Overall progression balancing algorithm:
     # Gather up all locations in a sphere.
     # Define a threshold value based on the player with the most available locations.
     # If other players are below the threshold value, swap progression in this sphere into earlier spheres,
     #   which gives more locations available by this sphere.
+    # Unchecked locations are kept in PendingLocations, so each sphere, in the main loop as in the balancing state,
+    #   only re-checks locations with compiled rules whose items or regions changed, and skips players whose items
+    #   did not change if their worlds set World.own_items_logic. All other locations are re-checked every sphere.
     balanceable_players: typing.Dict[int, float] = {
         player: multiworld.worlds[player].options.progression_balancing / 100
         for player in multiworld.player_ids
@@ -674,7 +777,9 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
         logging.debug(balanceable_players)
         state: CollectionState = CollectionState(multiworld)
         checked_locations: typing.Set[Location] = set()
-        unchecked_locations: typing.Set[Location] = set(multiworld.get_locations())
+        unchecked_locations = PendingLocations(state, multiworld.get_locations())
+        deadline = time.perf_counter() + time_limit if time_limit else None
+        balanced_rounds: int = 0
 
         total_locations_count: typing.Counter[int] = Counter(
             location.player
@@ -696,7 +801,7 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
 
         def get_sphere_locations(sphere_state: CollectionState,
                                  locations: typing.Set[Location]) -> typing.Set[Location]:
-            return {loc for loc in locations if sphere_state.can_reach(loc)}
+            return sphere_state.filter_reachable(locations)
 
         def item_percentage(player: int, num: int) -> float:
             return num / total_locations_count[player]
@@ -709,9 +814,8 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
             # Gather non-locked locations.
             # This ensures that only shuffled locations get counted for progression balancing,
             #   i.e. the items the players will be checking.
-            sphere_locations = get_sphere_locations(state, unchecked_locations)
+            sphere_locations = unchecked_locations.pop_reachable()
             for location in sphere_locations:
-                unchecked_locations.remove(location)
                 if not location.locked:
                     reachable_locations_count[location.player] += 1
 
@@ -738,9 +842,18 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                     if (player in threshold_percentages
                         and item_percentage(player, reachables) < threshold_percentages[player])
                 }
+                if balancing_players and max_rounds and balanced_rounds >= max_rounds:
+                    logging.warning(f"Progression balancing stopped at sphere {sphere_num - 1} after balancing "
+                                    f"{balanced_rounds} spheres, as it reached its limit of {max_rounds} spheres.")
+                    break
+                if balancing_players and deadline and time.perf_counter() > deadline:
+                    logging.warning(f"Progression balancing stopped at sphere {sphere_num - 1} after balancing "
+                                    f"{balanced_rounds} spheres, as it ran out of its {time_limit} seconds.")
+                    break
                 if balancing_players:
-                    balancing_state = state.copy()
-                    balancing_unchecked_locations = unchecked_locations.copy()
+                    balanced_rounds += 1
+                    balancing_state = state.snapshot()
+                    balancing_unchecked_locations = unchecked_locations.copy(balancing_state)
                     balancing_reachables = reachable_locations_count.copy()
                     balancing_sphere = sphere_locations.copy()
                     candidate_items: typing.Dict[int, typing.Set[Location]] = collections.defaultdict(set)
@@ -757,9 +870,8 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                                         location.progress_type != LocationProgressType.PRIORITY):
                                     candidate_items[player].add(location)
                                     logging.debug(f"Candidate item: {location.name}, {location.item.name}")
-                        balancing_sphere = get_sphere_locations(balancing_state, balancing_unchecked_locations)
+                        balancing_sphere = balancing_unchecked_locations.pop_reachable()
                         for location in balancing_sphere:
-                            balancing_unchecked_locations.remove(location)
                             if not location.locked:
                                 balancing_reachables[location.player] += 1
                         if multiworld.has_beaten_game(balancing_state) or all(
@@ -775,14 +887,19 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                         if l not in balancing_unchecked_locations:
                             unlocked_locations[l.player].add(l)
                     items_to_replace: typing.List[Location] = []
+                    out_of_time = False
                     for player in balancing_players:
                         locations_to_test = unlocked_locations[player]
                         items_to_test = list(candidate_items[player])
                         items_to_test.sort()
                         multiworld.random.shuffle(items_to_test)
                         while items_to_test:
+                            if deadline and time.perf_counter() > deadline:
+                                # keep the items found so far, the next sphere stops balancing
+                                out_of_time = True
+                                break
                             testing = items_to_test.pop()
-                            reducing_state = state.copy()
+                            reducing_state = state.snapshot()
                             for location in itertools.chain((
                                     l for l in items_to_replace
                                     if l.item.player == player
@@ -799,6 +916,10 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                                 p = item_percentage(player, reachable_locations_count[player] + len(reduced_sphere))
                                 if p < threshold_percentages[player]:
                                     items_to_replace.append(testing)
+                    if out_of_time:
+                        logging.warning(f"Progression balancing ran out of its {time_limit} seconds while balancing "
+                                        f"sphere {sphere_num - 1}, only moving the {len(items_to_replace)} items "
+                                        f"found so far.")
 
                     old_moved_item_count = moved_item_count
 
@@ -829,7 +950,7 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                         logging.debug(f"Moved {moved_item_count} items so far\n")
                         unlocked = {fresh for player in balancing_players for fresh in unlocked_locations[player]}
                         for location in get_sphere_locations(state, unlocked):
-                            unchecked_locations.remove(location)
+                            unchecked_locations.discard(location)
                             if not location.locked:
                                 reachable_locations_count[location.player] += 1
                             sphere_locations.add(location)
@@ -856,6 +977,8 @@ def swap_location_item(location_1: Location, location_2: Location, check_locked:
     location_2.item, location_1.item = location_1.item, location_2.item
     location_1.item.location = location_1
     location_2.item.location = location_2
+    if location_1.parent_region and location_1.parent_region.multiworld:
+        location_1.parent_region.multiworld.fill_generation += 1
 
 
 def parse_planned_blocks(multiworld: MultiWorld) -> dict[int, list[PlandoItemBlock]]:
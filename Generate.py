@@ -23,7 +23,7 @@ from BaseClasses import seeddigits, get_seed, PlandoOptions
 from Utils import parse_yamls, version_tuple, __version__, tuplize_version
 
 
-def mystery_argparse():
+def mystery_argparse(argv: list[str] | None = None):
     from settings import get_settings
     settings = get_settings()
     defaults = settings.generator
@@ -51,13 +51,23 @@ def mystery_argparse():
                         help="List of options that can be set manually. Can be combined, for example \"bosses, items\"")
     parser.add_argument("--skip_prog_balancing", action="store_true",
                         help="Skip progression balancing step during generation.")
+    parser.add_argument("--prog_balancing_time_limit", default=defaults.prog_balancing_time_limit, type=int,
+                        help="Seconds after which progression balancing stops balancing further spheres, 0 for no "
+                             "limit. Makes the result depend on the speed of the machine.")
+    parser.add_argument("--prog_balancing_rounds", default=defaults.prog_balancing_rounds, type=int,
+                        help="Maximum number of spheres progression balancing balances, 0 for no limit.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write a json report of time and memory spent per generation step, world and fill phase "
+                             "and of the most expensive access rules to the output folder. Slows generation down.")
+    parser.add_argument("--profile_top_rules", default=defaults.profile_top_rules, type=int,
+                        help="Number of most expensive access rules listed in the --profile report.")
     parser.add_argument("--skip_output", action="store_true",
                         help="Skips generation assertion and output stages and skips multidata and spoiler output. "
                              "Intended for debugging and testing purposes.")
     parser.add_argument("--spoiler_only", action="store_true",
                         help="Skips generation assertion and multidata, outputting only a spoiler log. "
                              "Intended for debugging and testing purposes.")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if args.skip_output and args.spoiler_only:
         parser.error("Cannot mix --skip_output and --spoiler_only")
@@ -175,6 +185,10 @@ def main(args=None) -> tuple[argparse.Namespace, int]:
     erargs.outputname = seed_name
     erargs.outputpath = args.outputpath
     erargs.skip_prog_balancing = args.skip_prog_balancing
+    erargs.prog_balancing_time_limit = args.prog_balancing_time_limit
+    erargs.prog_balancing_rounds = args.prog_balancing_rounds
+    erargs.profile = args.profile
+    erargs.profile_top_rules = args.profile_top_rules
     erargs.skip_output = args.skip_output
     erargs.spoiler_only = args.spoiler_only
     erargs.name = {}
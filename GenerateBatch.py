@@ -0,0 +1,150 @@
+"""
+Generates many seeds in one long-lived process, so world packages, the data package and host.yaml are only loaded once
+on platforms that can fork processes.
+
+Every job is the command line of a Generate.py run, either one job per line on stdin or one job per *.job file in a
+directory. Every job runs in its own worker process, so each job starts from the same clean state as a standalone
+Generate.py run and produces the same output for the same seed. The worker processes are forked after everything was
+loaded. Where fork is not available, they are spawned and load the worlds again for every job, like a standalone run.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import os
+import shlex
+import sys
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import ModuleUpdate
+
+ModuleUpdate.update()
+
+import Utils
+
+__all__ = ["preload_worlds", "parse_job", "run_job", "run_batch", "read_stdin_jobs", "read_directory_jobs"]
+
+Job = Tuple[str, str]
+"""name of the job, Generate.py arguments"""
+
+
+def preload_worlds() -> None:
+    """Imports all worlds and generation modules, including worlds that the world manifest lets skip at startup."""
+    import worlds
+    worlds.load_all_worlds()
+    import Main  # noqa: F401
+    import Generate  # noqa: F401
+
+
+def parse_job(arguments: str) -> argparse.Namespace:
+    import Generate
+
+    try:
+        return Generate.mystery_argparse(shlex.split(arguments))
+    except SystemExit as e:
+        # argparse exits on invalid arguments, which would end the batch instead of the job
+        raise ValueError(f"Invalid arguments: {arguments}") from e
+
+
+def run_job(args: argparse.Namespace) -> str:
+    """Generates a seed from parsed Generate.py arguments and returns its seed name."""
+    import Generate
+    from Main import main as ERmain
+
+    erargs, seed = Generate.main(args)
+    ERmain(erargs, seed)
+    return erargs.outputname
+
+
+def read_stdin_jobs() -> Iterator[Job]:
+    for line_number, line in enumerate(sys.stdin, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield f"stdin line {line_number}", line
+
+
+def read_directory_jobs(path: str, watch: bool = False) -> Iterator[Job]:
+    """Yields the *.job files in path by name. With watch, keeps polling for new files until interrupted."""
+    started = set()
+    while True:
+        for entry in sorted(os.scandir(path), key=lambda file: file.name):
+            if entry.is_file() and entry.name.endswith(".job") and entry.path not in started:
+                started.add(entry.path)
+                with open(entry.path, encoding="utf-8-sig") as f:
+                    yield entry.path, f.read()
+        if not watch:
+            return
+        time.sleep(1)
+
+
+def run_batch(jobs: Iterable[Job], workers: int = 1,
+              on_done: Optional[Callable[[str, Optional[str], Optional[BaseException]], None]] = None) -> None:
+    """
+    Generates jobs in a pool of worker processes and waits for all of them to finish.
+
+    :param jobs: name and Generate.py arguments of each job, may keep yielding new jobs
+    :param workers: number of seeds to generate at the same time
+    :param on_done: called with the name and the seed name or exception of each finished job
+    """
+    preload_worlds()
+    # a fresh process for every job, so no state of previous jobs can leak, like world class attributes or rng state
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        initializer = None
+    else:
+        context = multiprocessing.get_context("spawn")
+        initializer = preload_worlds
+
+    def finished(name: str, seed_name: Optional[str], exception: Optional[BaseException]) -> None:
+        if exception:
+            logging.error(f"Job {name} failed.", exc_info=exception)
+        else:
+            logging.info(f"Job {name} generated seed {seed_name}.")
+        if on_done:
+            on_done(name, seed_name, exception)
+
+    with context.Pool(workers, initializer=initializer, maxtasksperchild=1) as pool:
+        results: List[multiprocessing.pool.AsyncResult] = []
+        for name, arguments in jobs:
+            try:
+                args = parse_job(arguments)
+            except ValueError as e:
+                finished(name, None, e)
+                continue
+            logging.info(f"Starting job {name}.")
+            results.append(pool.apply_async(
+                run_job, (args,),
+                callback=lambda seed_name, name=name: finished(name, seed_name, None),
+                error_callback=lambda exception, name=name: finished(name, None, exception)))
+        for result in results:
+            result.wait()
+
+
+def mark_job_file(path: str, seed_name: Optional[str], exception: Optional[BaseException]) -> None:
+    """Renames a finished job file to *.done or *.failed."""
+    os.replace(path, f"{path[:-len('.job')]}.{'failed' if exception else 'done'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generates many seeds while keeping worlds loaded. Each job is a line of Generate.py arguments.")
+    parser.add_argument("jobs", help="Directory of *.job files, which get renamed to *.done or *.failed, "
+                                     "or - to read one job per line from stdin.")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Number of seeds to generate at the same time.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep waiting for new job files in the jobs directory.")
+    parser.add_argument("--log_level", default="info", help="Sets log level")
+    args = parser.parse_args()
+
+    Utils.init_logging("GenerateBatch", loglevel=args.log_level)
+    if args.jobs == "-":
+        run_batch(read_stdin_jobs(), args.workers)
+    else:
+        run_batch(read_directory_jobs(args.jobs, args.watch), args.workers, mark_job_file)
+
+
+if __name__ == "__main__":
+    main()
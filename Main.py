@@ -1,12 +1,11 @@
 import collections
 import concurrent.futures
+import contextlib
 import logging
 import os
-import pickle
 import tempfile
 import time
 import zipfile
-import zlib
 
 import worlds
 from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld
@@ -14,6 +13,7 @@ from Fill import FillError, balance_multiworld_progression, distribute_items_res
     parse_planned_blocks, distribute_planned_blocks, resolve_early_locations_for_planned
 from Options import StartInventoryPool
 from Utils import __version__, output_path, version_tuple
+from generation_profile import GenerationProfile
 from settings import get_settings
 from worlds import AutoWorld
 from worlds.generic.Rules import exclusion_rules, locality_rules
@@ -22,6 +22,25 @@ __all__ = ["main"]
 
 
 def main(args, seed=None, baked_server_options: dict[str, object] | None = None):
+    if not getattr(args, "profile", False):
+        return _main(args, seed, baked_server_options)
+    profile = GenerationProfile(top_rules=getattr(args, "profile_top_rules", 20))
+    try:
+        return _main(args, seed, baked_server_options, profile)
+    finally:
+        # also written if generation fails, to see how far it got
+        if profile.multiworld:
+            profile_path = output_path(f"AP_{profile.multiworld.seed_name}_profile.json")
+            profile.write(profile_path)
+            logging.info(f"Wrote generation profile to {profile_path}")
+
+
+def _no_profile_phase(name: str) -> contextlib.AbstractContextManager[None]:
+    return contextlib.nullcontext()
+
+
+def _main(args, seed=None, baked_server_options: dict[str, object] | None = None,
+          profile: GenerationProfile | None = None):
     if not baked_server_options:
         baked_server_options = get_settings().server_options.as_dict()
     assert isinstance(baked_server_options, dict)
@@ -32,6 +51,10 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     start = time.perf_counter()
     # initialize the multiworld
     multiworld = MultiWorld(args.multi)
+    phase = _no_profile_phase
+    if profile:
+        profile.attach(multiworld)
+        phase = profile.phase
 
     logger = logging.getLogger()
     multiworld.set_seed(seed, args.race, str(args.outputname) if args.outputname else None)
@@ -176,26 +199,34 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     if any(multiworld.item_links.values()):
         multiworld._all_state = None
 
-    logger.info("Running Item Plando.")
-    resolve_early_locations_for_planned(multiworld)
-    distribute_planned_blocks(multiworld, [x for player in multiworld.plando_item_blocks
-                                           for x in multiworld.plando_item_blocks[player]])
+    if profile:
+        profile.instrument_rules(multiworld)
+
+    with phase("pre_fill"):
+        logger.info("Running Item Plando.")
+        resolve_early_locations_for_planned(multiworld)
+        distribute_planned_blocks(multiworld, [x for player in multiworld.plando_item_blocks
+                                               for x in multiworld.plando_item_blocks[player]])
 
-    logger.info('Running Pre Main Fill.')
+        logger.info('Running Pre Main Fill.')
 
-    AutoWorld.call_all(multiworld, "pre_fill")
+        AutoWorld.call_all(multiworld, "pre_fill")
 
     logger.info(f'Filling the multiworld with {len(multiworld.itempool)} items.')
 
-    if multiworld.algorithm == 'flood':
-        flood_items(multiworld)  # different algo, biased towards early game progress items
-    elif multiworld.algorithm == 'balanced':
-        distribute_items_restrictive(multiworld, get_settings().generator.panic_method)
+    with phase("fill"):
+        if multiworld.algorithm == 'flood':
+            flood_items(multiworld)  # different algo, biased towards early game progress items
+        elif multiworld.algorithm == 'balanced':
+            distribute_items_restrictive(multiworld, get_settings().generator.panic_method)
 
-    AutoWorld.call_all(multiworld, 'post_fill')
+    with phase("post_fill"):
+        AutoWorld.call_all(multiworld, 'post_fill')
 
     if multiworld.players > 1 and not args.skip_prog_balancing:
-        balance_multiworld_progression(multiworld)
+        with phase("progression balancing"):
+            balance_multiworld_progression(multiworld, getattr(args, "prog_balancing_time_limit", 0),
+                                           getattr(args, "prog_balancing_rounds", 0))
     else:
         logger.info("Progression balancing skipped.")
 
@@ -210,20 +241,26 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     outfilebase = 'AP_' + multiworld.seed_name
 
     if args.spoiler_only:
-        if args.spoiler > 1:
-            logger.info('Calculating playthrough.')
-            multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
+        with phase("output"):
+            if args.spoiler > 1:
+                logger.info('Calculating playthrough.')
+                with phase("playthrough"):
+                    multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
 
-        multiworld.spoiler.to_file(output_path('%s_Spoiler.txt' % outfilebase))
+            multiworld.spoiler.to_file(output_path('%s_Spoiler.txt' % outfilebase))
         logger.info('Done. Skipped multidata modification. Total time: %s', time.perf_counter() - start)
         return multiworld
 
     output = tempfile.TemporaryDirectory()
-    with output as temp_dir:
+    with phase("output"), output as temp_dir:
         output_players = [player for player in multiworld.player_ids if AutoWorld.World.generate_output.__code__
                           is not multiworld.worlds[player].generate_output.__code__]
         with concurrent.futures.ThreadPoolExecutor(len(output_players) + 2) as pool:
-            check_accessibility_task = pool.submit(multiworld.fulfills_accessibility)
+            def check_accessibility() -> bool:
+                with phase("accessibility check"):
+                    return multiworld.fulfills_accessibility()
+
+            check_accessibility_task = pool.submit(check_accessibility)
 
             output_file_futures = [pool.submit(AutoWorld.call_stage, multiworld, "generate_output", temp_dir)]
             for player in output_players:
@@ -237,7 +274,7 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
             def write_multidata():
                 import NetUtils
-                from NetUtils import HintStatus
+                from NetUtils import HintStatus, encode_multidata
                 slot_data = {}
                 client_versions = {}
                 games = {}
@@ -334,11 +371,8 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
                 }
                 AutoWorld.call_all(multiworld, "modify_multidata", multidata)
 
-                multidata = zlib.compress(pickle.dumps(multidata), 9)
-
                 with open(os.path.join(temp_dir, f'{outfilebase}.archipelago'), 'wb') as f:
-                    f.write(bytes([3]))  # version of format
-                    f.write(multidata)
+                    f.write(encode_multidata(multidata, get_settings().generator.multidata_format_version))
 
             output_file_futures.append(pool.submit(write_multidata))
             if not check_accessibility_task.result():
@@ -355,7 +389,8 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
         if args.spoiler > 1:
             logger.info('Calculating playthrough.')
-            multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
+            with phase("playthrough"):
+                multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
 
         if args.spoiler:
             multiworld.spoiler.to_file(os.path.join(temp_dir, '%s_Spoiler.txt' % outfilebase))
@@ -12,6 +12,7 @@ import inspect
 import itertools
 import logging
 import math
+import mmap
 import operator
 import pickle
 import random
@@ -32,7 +33,9 @@ if typing.TYPE_CHECKING:
 
 import colorama
 import websockets
-from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import Frame, Opcode
+from websockets.version import version as websockets_version
 try:
     # ponyorm is a requirement for webhost, not default server, so may not be importable
     from pony.orm.dbapiprovider import OperationalError
@@ -43,7 +46,8 @@ import NetUtils
 import Utils
 from Utils import version_tuple, restricted_loads, Version, async_start, get_intended_text
 from NetUtils import Endpoint, ClientStatus, NetworkItem, decode, encode, NetworkPlayer, Permission, NetworkSlot, \
-    SlotType, LocationStore, Hint, HintStatus
+    SlotType, LocationStore, Hint, HintStatus, SphereIndex, MULTIDATA_FORMAT_VERSION, decode_multidata, \
+    LazySlotData, get_items_hash, encode_item_columns
 from BaseClasses import ItemClassification
 
 
@@ -67,6 +71,55 @@ def pop_from_container(container, value):
     return container
 
 
+def get_server_extensions() -> typing.List[ServerPerMessageDeflateFactory]:
+    """websockets' default compression, but without context takeover for messages sent by the server.
+    Every message is then compressed on its own, so broadcasts only have to compress a message once."""
+    return [ServerPerMessageDeflateFactory(server_no_context_takeover=True, server_max_window_bits=12,
+                                           client_max_window_bits=12, compress_settings={"memLevel": 5})]
+
+
+shared_frames_websockets_versions: typing.Tuple[int, int] = (13, 14)
+"""Major versions of websockets, from inclusive to exclusive, whose legacy protocol internals writing shared frames
+relies on. test_multi_server checks them and that requirements.txt pins the same range."""
+shared_frames_supported: bool = \
+    shared_frames_websockets_versions[0] <= int(websockets_version.split(".")[0]) < shared_frames_websockets_versions[1]
+"""Other versions of websockets always use websockets.broadcast."""
+
+
+def _get_shared_frame_key(socket) -> typing.Optional[typing.Hashable]:
+    """Returns a key that is equal for all sockets that encode a message to the same frame,
+    or None if the socket has to encode it itself."""
+    if not shared_frames_supported or not hasattr(socket, "transport") \
+            or getattr(socket, "_fragmented_message_waiter", True) is not None:
+        # a socket in the middle of sending a fragmented message has to queue this one behind it
+        return None
+    if not socket.extensions:
+        return "uncompressed"
+    if len(socket.extensions) == 1:
+        extension = socket.extensions[0]
+        if isinstance(extension, PerMessageDeflate) and extension.local_no_context_takeover:
+            return extension.local_max_window_bits, tuple(sorted(extension.compress_settings.items()))
+    return None
+
+
+def broadcast_shared_frames(sockets: typing.Iterable, msg: str) -> typing.List:
+    """Writes msg to all sockets that compress each message on its own, compressing it only once per set of
+    compression settings. Returns the sockets that have to encode msg themselves."""
+    frames: typing.Dict[typing.Hashable, bytes] = {}
+    data = msg.encode()
+    remaining = []
+    for socket in sockets:
+        key = _get_shared_frame_key(socket)
+        if key is None:
+            remaining.append(socket)
+            continue
+        frame = frames.get(key)
+        if frame is None:
+            frame = frames[key] = Frame(Opcode.TEXT, data).serialize(mask=False, extensions=socket.extensions)
+        socket.transport.write(frame)
+    return remaining
+
+
 def update_container_unique(container, entries):
     if isinstance(container, list):
         existing_container_as_set = set(container)
@@ -126,12 +179,15 @@ def get_saving_second(seed_name: str, interval: int = 60) -> int:
 
 class Client(Endpoint):
     version = Version(0, 0, 0)
+    columnar_items: bool = False
     tags: typing.List[str]
     remote_items: bool
     remote_start_inventory: bool
     no_items: bool
     no_locations: bool
     no_text: bool
+    stored_data_prefixes: typing.Set[str]
+    """prefixes the client subscribed to with SetNotify, to remove its subscriptions on disconnect"""
 
     def __init__(self, socket: "ServerConnection", ctx: Context) -> None:
         super().__init__(socket)
@@ -140,6 +196,7 @@ class Client(Endpoint):
         self.slot = None
         self.send_index = 0
         self.tags = []
+        self.stored_data_prefixes = set()
         self.messageprocessor = client_message_processor(ctx, self)
         self.ctx = weakref.ref(ctx)
 
@@ -168,6 +225,237 @@ class Client(Endpoint):
 team_slot = typing.Tuple[int, int]
 
 
+class PrefixSubscriptions:
+    """
+    Clients subscribed to all data storage keys that start with a prefix, stored in a trie of the prefix characters,
+    so finding the subscribers of a key only walks the characters of that key.
+    """
+    __slots__ = ("children", "clients")
+    children: typing.Dict[str, PrefixSubscriptions]
+    clients: typing.Optional[typing.MutableSet[Client]]
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.clients = None
+
+    def add(self, prefix: str, client: Client) -> None:
+        node = self
+        for char in prefix:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = PrefixSubscriptions()
+            node = child
+        if node.clients is None:
+            node.clients = weakref.WeakSet()
+        node.clients.add(client)
+
+    def remove(self, prefix: str, client: Client) -> None:
+        """Removes the subscription of client to prefix, along with the nodes that are left without any."""
+        path: typing.List[PrefixSubscriptions] = [self]
+        for char in prefix:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        node = path[-1]
+        if node.clients is not None:
+            node.clients.discard(client)
+            if not node.clients:
+                node.clients = None
+        for char, parent in zip(reversed(prefix), reversed(path[:-1])):
+            if node.clients is not None or node.children:
+                break
+            del parent.children[char]
+            node = parent
+
+    def get(self, key: str) -> typing.Set[Client]:
+        """Returns the clients subscribed to a prefix of key."""
+        clients: typing.Set[Client] = set()
+        node: typing.Optional[PrefixSubscriptions] = self
+        for char in key:
+            if node.clients:
+                clients.update(node.clients)
+            node = node.children.get(char)
+            if node is None:
+                return clients
+        if node.clients:
+            clients.update(node.clients)
+        return clients
+
+
+class SaveJournal:
+    """
+    Collects the changes of a save (see Context.get_save) since it was last written, so a save only has to write those.
+    With a path, the changes are appended to a journal file next to a full snapshot, which load replays on top of it.
+
+    Code that changes an entry of a dict in the save reports it through Context.mark_save_changed, so collecting the
+    changes only costs as much as there are changes. The lists in received_items only ever grow, so only their new
+    items get journaled. The small fields in compared_fields change in too many places to report each change, they are
+    compared against their last written value instead.
+    """
+    magic = b"APSJ"
+    compared_fields: typing.ClassVar[typing.Tuple[str, ...]] = ("version", "random_state", "game_options")
+    pair_fields: typing.ClassVar[typing.FrozenSet[str]] = frozenset({"client_activity_timers",
+                                                                     "client_connection_timers"})
+    """saved as tuples of key value pairs, changed like dicts"""
+
+    path: typing.Optional[str]
+    epoch: int
+    """counts written snapshots, a journal only applies to the snapshot of the same epoch"""
+    size: int
+    """bytes written to the journal since the last snapshot"""
+    snapshot_size: int
+    written: typing.Dict[str, typing.Any]
+    """last written value of each of compared_fields"""
+    received_lengths: typing.Dict[typing.Any, int]
+    """number of written items of each list in received_items"""
+    marked: typing.Dict[str, typing.Optional[typing.Set[typing.Any]]]
+    """changed keys of each field since the last get_changes, None if the field changed as a whole"""
+    lock: threading.Lock
+    """changes are marked on the event loop, while get_changes runs in the auto save thread"""
+
+    def __init__(self, path: typing.Optional[str] = None) -> None:
+        self.path = path
+        self.epoch = 0
+        self.size = 0
+        self.snapshot_size = 0
+        self.written = {}
+        self.received_lengths = {}
+        self.marked = {}
+        self.lock = threading.Lock()
+
+    @property
+    def needs_snapshot(self) -> bool:
+        """Once the journal is as large as the snapshot, writing a new snapshot is cheaper than replaying it."""
+        return self.size >= self.snapshot_size
+
+    def mark(self, field: str, key: typing.Any = None) -> None:
+        """Reports a changed entry of a dict in the save, or without key a field that changed as a whole."""
+        with self.lock:
+            if key is None:
+                self.marked[field] = None
+            elif field not in self.marked:
+                self.marked[field] = {key}
+            else:
+                keys = self.marked[field]
+                if keys is not None:
+                    keys.add(key)
+
+    def clear_marks(self) -> None:
+        """Forgets the changes marked so far, for a full save that is taken afterwards."""
+        with self.lock:
+            self.marked = {}
+
+    def reset(self, save: typing.Dict[str, typing.Any]) -> None:
+        """Remembers save as fully written."""
+        self.written = {field: copy.copy(save[field]) for field in self.compared_fields if field in save}
+        self.received_lengths = {key: len(items) for key, items in save.get("received_items", {}).items()}
+
+    def get_changes(self, get_value: typing.Callable[[str], typing.Any],
+                    get_entry: typing.Callable[[str, typing.Any], typing.Any]) \
+            -> typing.List[typing.Tuple[typing.Any, ...]]:
+        """
+        Returns the changes since the last call or reset and remembers them as written. get_value returns a field of
+        the save and get_entry an entry of a dict field, raising KeyError for entries that do not exist.
+        ("set", field, key, value) and ("del", field, key) change an entry of a dict, ("extend", field, key, items)
+        appends to a list in received_items and ("replace", field, value) replaces any other value.
+        """
+        with self.lock:
+            marked, self.marked = self.marked, {}
+        changes: typing.List[typing.Tuple[typing.Any, ...]] = []
+        for field in self.compared_fields:
+            value = get_value(field)
+            if field not in self.written or self.written[field] != value:
+                self.written[field] = copy.copy(value)
+                changes.append(("replace", field, value))
+        for field, keys in marked.items():
+            if keys is None:
+                changes.append(("replace", field, get_value(field)))
+                continue
+            for key in keys:
+                try:
+                    value = get_entry(field, key)
+                except KeyError:
+                    changes.append(("del", field, key))
+                    continue
+                if field == "received_items":
+                    written_length = self.received_lengths.get(key, 0)
+                    self.received_lengths[key] = len(value)
+                    if written_length <= len(value):
+                        if written_length < len(value):
+                            changes.append(("extend", field, key, value[written_length:]))
+                        continue
+                changes.append(("set", field, key, value))
+        return changes
+
+    @classmethod
+    def apply(cls, save: typing.Dict[str, typing.Any], changes: typing.Iterable[typing.Tuple[typing.Any, ...]]) -> None:
+        """Applies changes from get_changes to a save."""
+        pair_fields = {field: dict(save[field]) for field in cls.pair_fields if field in save}
+        for change in changes:
+            operation, field = change[:2]
+            if operation == "replace":
+                if field in pair_fields:
+                    pair_fields[field] = dict(change[2])
+                else:
+                    save[field] = change[2]
+                continue
+            container = pair_fields[field] if field in pair_fields else save.setdefault(field, {})
+            if operation == "set":
+                container[change[2]] = change[3]
+            elif operation == "extend":
+                container.setdefault(change[2], []).extend(change[3])
+            else:
+                container.pop(change[2], None)
+        for field, values in pair_fields.items():
+            save[field] = tuple(values.items())
+
+    def next_epoch(self, save: typing.Dict[str, typing.Any]) -> None:
+        """
+        Marks save as the snapshot of a new epoch and remembers it as written. Call start once it is written.
+        The lists in received_items of save get copied, so items received while it is written stay in the journal.
+        """
+        self.epoch += 1
+        save["journal_epoch"] = self.epoch
+        if "received_items" in save:
+            save["received_items"] = {key: list(items) for key, items in save["received_items"].items()}
+        self.reset(save)
+
+    def start(self, snapshot_size: int) -> None:
+        """Empties the journal after the snapshot save was written."""
+        if self.path:
+            with open(self.path, "wb") as f:
+                f.write(self.magic + self.epoch.to_bytes(4, "little"))
+        self.size = 0
+        self.snapshot_size = snapshot_size
+
+    def append(self, changes: typing.List[typing.Tuple[typing.Any, ...]]) -> None:
+        data = zlib.compress(pickle.dumps(changes))
+        with open(self.path, "ab") as f:
+            f.write(len(data).to_bytes(4, "little") + data)
+        self.size += 4 + len(data)
+
+    def load(self, save: typing.Dict[str, typing.Any]) -> None:
+        """Replays the journal onto save, if it belongs to the snapshot save was loaded from."""
+        self.epoch = save.get("journal_epoch", 0)
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if data[:4] != self.magic or int.from_bytes(data[4:8], "little") != self.epoch:
+            return  # the snapshot was written after this journal
+        position = 8
+        while position + 4 <= len(data):
+            length = int.from_bytes(data[position:position + 4], "little")
+            chunk = data[position + 4:position + 4 + length]
+            if len(chunk) < length:
+                break  # interrupted while writing, everything before is intact
+            self.apply(save, restricted_loads(zlib.decompress(chunk)))
+            position += 4 + length
+        self.size = position - 8
+
+
 class Context:
     dumper = staticmethod(encode)
     loader = staticmethod(decode)
@@ -192,6 +480,7 @@ class Context:
     stored_data: typing.Dict[str, object]
     read_data: typing.Dict[str, object]
     stored_data_notification_clients: typing.Dict[str, typing.Set[Client]]
+    stored_data_prefix_clients: PrefixSubscriptions
     slot_info: typing.Dict[int, NetworkSlot]
     generator_version = Version(0, 0, 0)
     checksums: typing.Dict[str, str]
@@ -203,13 +492,15 @@ class Context:
     all_location_and_group_names: typing.Dict[str, typing.Set[str]]
     non_hintable_names: typing.Dict[str, typing.AbstractSet[str]]
     spheres: typing.List[typing.Dict[int, typing.Set[int]]]
+    sphere_index: SphereIndex
     """ each sphere is { player: { location_id, ... } } """
     logger: logging.Logger
 
     def __init__(self, host: str, port: int, server_password: str, password: str, location_check_points: int,
                  hint_cost: int, item_cheat: bool, release_mode: str = "disabled", collect_mode="disabled",
                  remaining_mode: str = "disabled", auto_shutdown: typing.SupportsFloat = 0, compatibility: int = 2,
-                 log_network: bool = False, logger: logging.Logger = logging.getLogger()):
+                 log_network: bool = False, slot_data_idle_time: typing.SupportsFloat = 0,
+                 logger: logging.Logger = logging.getLogger()):
         self.logger = logger
         super(Context, self).__init__()
         self.slot_info = {}
@@ -239,6 +530,8 @@ class Context:
         self.location_check_points = location_check_points
         self.hints_used = collections.defaultdict(int)
         self.hints: typing.Dict[team_slot, typing.Set[Hint]] = collections.defaultdict(set)
+        # (team, finding player, location) -> hints that are not found yet
+        self.hint_index: typing.Dict[typing.Tuple[int, int, int], typing.Set[Hint]] = {}
         self.release_mode: str = release_mode
         self.remaining_mode: str = remaining_mode
         self.collect_mode: str = collect_mode
@@ -251,12 +544,16 @@ class Context:
         self.client_game_state: typing.Dict[team_slot, int] = collections.defaultdict(int)
         self.er_hint_data: typing.Dict[int, typing.Dict[int, str]] = {}
         self.auto_shutdown = auto_shutdown
+        # seconds after which unused slot_data is dropped and decompressed again on the next use, 0 to keep it
+        self.slot_data_idle_time = float(slot_data_idle_time)
+        self.slot_data_eviction: typing.Optional[asyncio.TimerHandle] = None
         self.commandprocessor = ServerCommandProcessor(self)
         self.embedded_blacklist = {"host", "port"}
         self.client_ids: typing.Dict[typing.Tuple[int, int], datetime.datetime] = {}
         self.auto_save_interval = 60  # in seconds
         self.auto_saver_thread: typing.Optional[threading.Thread] = None
         self.save_dirty = False
+        self.save_journal: typing.Optional[SaveJournal] = None
         self.tags = ['AP']
         self.games: typing.Dict[int, str] = {}
         self.minimum_client_versions: typing.Dict[int, Version] = {}
@@ -266,8 +563,11 @@ class Context:
         self.random = random.Random()
         self.stored_data = {}
         self.stored_data_notification_clients = collections.defaultdict(weakref.WeakSet)
+        self.stored_data_prefix_clients = PrefixSubscriptions()
         self.read_data = {}
         self.spheres = []
+        self.sphere_index = SphereIndex([])
+        self.queued_texts: typing.Dict[int, typing.List[dict]] = {}
 
         # init empty to satisfy linter, I suppose
         self.gamespackage = {}
@@ -289,12 +589,12 @@ class Context:
         import worlds
         self.gamespackage = worlds.network_data_package["games"]
 
-        self.item_name_groups = {world_name: world.item_name_groups for world_name, world in
-                                 worlds.AutoWorldRegister.world_types.items()}
-        self.location_name_groups = {world_name: world.location_name_groups for world_name, world in
-                                     worlds.AutoWorldRegister.world_types.items()}
-        for world_name, world in worlds.AutoWorldRegister.world_types.items():
-            self.non_hintable_names[world_name] = world.hint_blacklist
+        # taken from the data package instead of the world types, so no world has to be imported
+        self.item_name_groups = {world_name: game_package["item_name_groups"] for world_name, game_package in
+                                 self.gamespackage.items()}
+        self.location_name_groups = {world_name: game_package["location_name_groups"] for world_name, game_package in
+                                     self.gamespackage.items()}
+        self.non_hintable_names.update(worlds.hint_blacklists)
 
         for game_package in self.gamespackage.values():
             # remove groups from data sent to clients
@@ -329,6 +629,8 @@ class Context:
 
     # General networking
     async def send_msgs(self, endpoint: Endpoint, msgs: typing.Iterable[dict]) -> bool:
+        if self.queued_texts:
+            self.flush_queued_texts()
         if not endpoint.socket or not endpoint.socket.open:
             return False
         msg = self.dumper(msgs)
@@ -344,6 +646,8 @@ class Context:
             return True
 
     async def send_encoded_msgs(self, endpoint: Endpoint, msg: str) -> bool:
+        if self.queued_texts:
+            self.flush_queued_texts()
         if not endpoint.socket or not endpoint.socket.open:
             return False
         try:
@@ -358,12 +662,19 @@ class Context:
             return True
 
     async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Endpoint], msg: str) -> bool:
+        if self.queued_texts:
+            self.flush_queued_texts()
+        return self.broadcast_encoded_now(endpoints, msg)
+
+    def broadcast_encoded_now(self, endpoints: typing.Iterable[Endpoint], msg: str) -> bool:
+        """Writes msg to the endpoints right away instead of in a task, so it is sent before any message that is
+        sent later."""
         sockets = []
         for endpoint in endpoints:
             if endpoint.socket and endpoint.socket.open:
                 sockets.append(endpoint.socket)
         try:
-            websockets.broadcast(sockets, msg)
+            websockets.broadcast(broadcast_shared_frames(sockets, msg), msg)
         except RuntimeError:
             self.logger.exception("Exception during broadcast_send_encoded_msgs")
             return False
@@ -373,6 +684,8 @@ class Context:
             return True
 
     def broadcast_all(self, msgs: typing.List[dict]):
+        if self.queued_texts:
+            self.flush_queued_texts()
         msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
         data = self.dumper(msgs)
         endpoints = (
@@ -387,16 +700,42 @@ class Context:
         self.broadcast_all([{**{"cmd": "PrintJSON", "data": [{ "text": text }]}, **additional_arguments}])
 
     def broadcast_team(self, team: int, msgs: typing.List[dict]):
-        msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
+        if self.queued_texts:
+            self.flush_queued_texts()
         data = self.dumper(msgs)
-        endpoints = (
+        async_start(self.broadcast_send_encoded_msgs(self.get_team_endpoints(team, msgs), data))
+
+    def get_team_endpoints(self, team: int, msgs: typing.List[dict]) -> typing.Iterator[Client]:
+        msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
+        return (
             endpoint
             for endpoint in itertools.chain.from_iterable(self.clients[team].values())
             if not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+
+    def queue_team_texts(self, team: int, msgs: typing.List[dict]):
+        """Queues PrintJSON messages for a team, to be broadcast together with all texts queued until the event loop
+        gets to run again. Any other message sent to a client sends the queued texts first to keep the order."""
+        queued = bool(self.queued_texts)
+        self.queued_texts.setdefault(team, []).extend(msgs)
+        if not queued:
+            try:
+                asyncio.get_running_loop().call_soon(self.flush_queued_texts)
+            except RuntimeError:  # no event loop to wait for
+                self.flush_queued_texts()
+
+    def flush_queued_texts(self):
+        queued_texts, self.queued_texts = self.queued_texts, {}
+        for team, msgs in queued_texts.items():
+            # split into chunks that are close to compression window of 64K but not too big on the wire
+            # (roughly 1300-2600 bytes after compression depending on repetitiveness)
+            for start in range(0, len(msgs), 140):
+                chunk = msgs[start:start + 140]
+                self.broadcast_encoded_now(self.get_team_endpoints(team, chunk), self.dumper(chunk))
 
     def broadcast(self, endpoints: typing.Iterable[Client], msgs: typing.List[dict]):
+        if self.queued_texts:
+            self.flush_queued_texts()
         msgs = self.dumper(msgs)
         async_start(self.broadcast_send_encoded_msgs(endpoints, msgs))
 
@@ -405,6 +744,8 @@ class Context:
             self.endpoints.remove(endpoint)
         if endpoint.slot and endpoint in self.clients[endpoint.team][endpoint.slot]:
             self.clients[endpoint.team][endpoint.slot].remove(endpoint)
+        for prefix in endpoint.stored_data_prefixes:
+            self.stored_data_prefix_clients.remove(prefix, endpoint)
         await on_client_disconnected(self, endpoint)
 
     def notify_client(self, client: Client, text: str, additional_arguments: dict = {}):
@@ -433,16 +774,23 @@ class Context:
                     raise Exception("No .archipelago found in archive.")
         else:
             with open(multidatapath, 'rb') as f:
-                data = f.read()
+                if f.read(1) == bytes([MULTIDATA_FORMAT_VERSION]):
+                    # sections are read from the mapped file when they get used
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    f.seek(0)
+                    data = f.read()
 
         self._load(self.decompress(data), {}, use_embedded_server_options)
         self.data_filename = multidatapath
 
     @staticmethod
-    def decompress(data: bytes) -> dict:
+    def decompress(data: typing.Union[bytes, mmap.mmap]) -> dict:
         format_version = data[0]
-        if format_version > 3:
+        if format_version > MULTIDATA_FORMAT_VERSION:
             raise Utils.VersionException("Incompatible multidata.")
+        if format_version == MULTIDATA_FORMAT_VERSION:
+            return decode_multidata(data)
         return restricted_loads(zlib.decompress(data[1:]))
 
     def _load(self, decoded_obj: dict, game_data_packages: typing.Dict[str, typing.Any],
@@ -479,18 +827,17 @@ class Context:
             team_0[slot_id] = []
             self.player_names[0, slot_id] = slot_info.name
             self.player_name_lookup[slot_info.name] = 0, slot_id
-            self.read_data[f"hints_{0}_{slot_id}"] = lambda local_team=0, local_player=slot_id: \
-                list(self.get_rechecked_hints(local_team, local_player))
-            self.read_data[f"client_status_{0}_{slot_id}"] = lambda local_team=0, local_player=slot_id: \
-                self.client_game_state[local_team, local_player]
 
         self.seed_name = decoded_obj["seed_name"]
         self.random.seed(self.seed_name)
         self.connect_names = decoded_obj['connect_names']
-        self.locations = LocationStore(decoded_obj.pop("locations"))  # pre-emptively free memory
+        locations = decoded_obj.pop("locations")  # pre-emptively free memory
+        # the WebHost passes a LocationStore that is shared by all rooms of the same seed
+        self.locations = locations if isinstance(locations, LocationStore) else LocationStore(locations)
         self.slot_data = decoded_obj['slot_data']
-        for slot, data in self.slot_data.items():
-            self.read_data[f"slot_data_{slot}"] = lambda data=data: data
+        if self.slot_data_idle_time and not isinstance(self.slot_data, LazySlotData):
+            # keep slot_data of older multidata compressed as well, so it can be evicted while unused
+            self.slot_data = LazySlotData.from_dict(self.slot_data)
         self.er_hint_data = {int(player): {int(address): name for address, name in loc_data.items()}
                              for player, loc_data in decoded_obj["er_hint_data"].items()}
 
@@ -500,12 +847,15 @@ class Context:
 
         for slot, hints in decoded_obj["precollected_hints"].items():
             self.hints[0, slot].update(hints)
+            for hint in hints:
+                self.index_hint(0, hint)
 
         # declare slots that aren't players as done
         for slot, slot_info in self.slot_info.items():
             if slot_info.type.always_goal:
                 for team in self.clients:
                     self.client_game_state[team, slot] = ClientStatus.CLIENT_GOAL
+                    self.mark_save_changed("client_game_state", (team, slot))
 
         if use_embedded_server_options:
             server_options = decoded_obj.get("server_options", {})
@@ -516,12 +866,12 @@ class Context:
             if game_name in game_data_packages:
                 data = game_data_packages[game_name]
             self.logger.info(f"Loading embedded data package for game {game_name}")
-            self.gamespackage[game_name] = data
+            # remove groups from data package, but keep in self.item_name_groups, without modifying the shared data
+            self.gamespackage[game_name] = {key: value for key, value in data.items()
+                                            if key not in ("item_name_groups", "location_name_groups")}
             self.item_name_groups[game_name] = data["item_name_groups"]
             if "location_name_groups" in data:
                 self.location_name_groups[game_name] = data["location_name_groups"]
-                del data["location_name_groups"]
-            del data["item_name_groups"]  # remove from data package, but keep in self.item_name_groups
         self._init_game_data()
         for game_name, data in self.item_name_groups.items():
             self.read_data[f"item_name_groups_{game_name}"] = lambda lgame=game_name: self.item_name_groups[lgame]
@@ -530,6 +880,7 @@ class Context:
 
         # sorted access spheres
         self.spheres = decoded_obj.get("spheres", [])
+        self.sphere_index = SphereIndex(self.spheres)
 
     # saving
 
@@ -545,12 +896,27 @@ class Context:
         return False
 
     def _save(self, exit_save: bool = False) -> bool:
+        journal = self.save_journal
         try:
-            encoded_save = pickle.dumps(self.get_save())
-            with open(self.save_filename, "wb") as f:
-                f.write(zlib.compress(encoded_save))
+            if journal and not exit_save and not journal.needs_snapshot:
+                changes = journal.get_changes(self.get_save_value, self.get_save_entry)
+                if changes:
+                    journal.append(changes)
+            else:
+                if journal:
+                    journal.clear_marks()  # the snapshot includes them
+                save = self.get_save()
+                if journal:
+                    journal.next_epoch(save)
+                encoded_save = zlib.compress(pickle.dumps(save))
+                with open(self.save_filename, "wb") as f:
+                    f.write(encoded_save)
+                if journal:
+                    journal.start(len(encoded_save))
         except Exception as e:
             self.logger.exception(e)
+            if journal:
+                journal.snapshot_size = 0  # changes may be lost, write everything next time
             return False
         else:
             return True
@@ -563,10 +929,15 @@ class Context:
                 name, ext = os.path.splitext(self.data_filename)
                 self.save_filename = name + '.apsave' if ext.lower() in ('.archipelago', '.zip') \
                     else self.data_filename + '_' + 'apsave'
+            self.save_journal = SaveJournal(self.save_filename + ".journal")
             try:
                 with open(self.save_filename, 'rb') as f:
-                    save_data = restricted_loads(zlib.decompress(f.read()))
-                    self.set_save(save_data)
+                    encoded_save = f.read()
+                save_data = restricted_loads(zlib.decompress(encoded_save))
+                self.save_journal.load(save_data)
+                self.set_save(save_data)
+                self.save_journal.snapshot_size = len(encoded_save)
+                self.save_journal.reset(self.get_save())
             except FileNotFoundError:
                 self.logger.error('No save data found, starting a new game')
             except Exception as e:
@@ -605,7 +976,6 @@ class Context:
                 atexit.register(self._save, True)  # make sure we save on exit too
 
     def get_save(self) -> dict:
-        self.recheck_hints()
         d = {
             "version": self.save_version,
             "connect_names": self.connect_names,
@@ -622,16 +992,44 @@ class Context:
             "random_state": self.random.getstate(),
             "group_collected": dict(self.group_collected),
             "stored_data": self.stored_data,
-            "game_options": {"hint_cost": self.hint_cost, "location_check_points": self.location_check_points,
-                             "server_password": self.server_password, "password": self.password,
-                             "release_mode": self.release_mode,
-                             "remaining_mode": self.remaining_mode, "collect_mode": self.collect_mode,
-                             "item_cheat": self.item_cheat, "compatibility": self.compatibility}
+            "game_options": self.get_save_value("game_options")
 
         }
 
         return d
 
+    def get_save_value(self, field: str) -> typing.Any:
+        """Returns one field of get_save. Only the SaveJournal.compared_fields avoid building the whole save."""
+        if field == "version":
+            return self.save_version
+        if field == "random_state":
+            return self.random.getstate()
+        if field == "game_options":
+            return {"hint_cost": self.hint_cost, "location_check_points": self.location_check_points,
+                    "server_password": self.server_password, "password": self.password,
+                    "release_mode": self.release_mode,
+                    "remaining_mode": self.remaining_mode, "collect_mode": self.collect_mode,
+                    "item_cheat": self.item_cheat, "compatibility": self.compatibility}
+        return self.get_save()[field]
+
+    def get_save_entry(self, field: str, key: typing.Any) -> typing.Any:
+        """Returns the saved value of one entry of a dict field of get_save, raises KeyError if it does not exist."""
+        container = getattr(self, field)
+        if key not in container:
+            raise KeyError(key)
+        value = container[key]
+        if field in SaveJournal.pair_fields:
+            return value.timestamp()
+        if field == "received_items":
+            return value  # only grows, the journal takes the new items
+        return copy.copy(value)  # changes on the event loop while the auto save thread writes it
+
+    def mark_save_changed(self, field: str, key: typing.Any = None) -> None:
+        """Reports a changed entry of a dict field of get_save, or without key a changed field, to the save journal.
+        Code that changes the save has to call it, or the change is only written with the next snapshot."""
+        if self.save_journal:
+            self.save_journal.mark(field, key)
+
     def set_save(self, savedata: dict):
         if self.connect_names != savedata["connect_names"]:
             raise Exception("This savegame does not appear to match the loaded multiworld.")
@@ -640,6 +1038,10 @@ class Context:
         self.received_items = savedata["received_items"]
         self.hints_used.update(savedata["hints_used"])
         self.hints.update(savedata["hints"])
+        self.recheck_hints()
+        for (team, _), hints in self.hints.items():
+            for hint in hints:
+                self.index_hint(team, hint)
 
         self.name_aliases.update(savedata["name_aliases"])
         self.client_game_state.update(savedata["client_game_state"])
@@ -697,6 +1099,7 @@ class Context:
                 new_hints.add(new_hint)
                 if hint == new_hint:
                     continue
+                self.mark_save_changed("hints", (hint_team, hint_slot))
                 for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
                     if changed is not None:
                         changed.add((hint_team,player))
@@ -708,15 +1111,73 @@ class Context:
         self.recheck_hints(team, slot)
         return self.hints[team, slot]
 
+    def get_slot_data(self, slot: int) -> typing.Any:
+        """Returns the slot_data of a slot, which stays in memory until it was unused for slot_data_idle_time."""
+        if self.slot_data_idle_time and not self.slot_data_eviction:
+            with contextlib.suppress(RuntimeError):  # no running event loop
+                self.slot_data_eviction = asyncio.get_running_loop().call_later(self.slot_data_idle_time,
+                                                                                self.evict_idle_slot_data)
+        return self.slot_data[slot]
+
+    def evict_idle_slot_data(self) -> None:
+        self.slot_data_eviction = None
+        if isinstance(self.slot_data, LazySlotData) and self.slot_data.evict_idle(self.slot_data_idle_time):
+            # check again later for the slots that are still in use
+            self.slot_data_eviction = asyncio.get_running_loop().call_later(self.slot_data_idle_time,
+                                                                            self.evict_idle_slot_data)
+
+    def get_read_data(self, key: str) -> typing.Any:
+        """Returns the value of a _read_ key without its prefix, or None if there is no such key.
+        Values of a slot are only built when they are requested."""
+        if key in self.read_data:
+            return self.read_data[key]()
+        if key.startswith("slot_data_"):
+            slot = key[10:]
+            if slot.isdecimal() and int(slot) in self.slot_data:
+                return self.get_slot_data(int(slot))
+        elif key.startswith(("hints_", "client_status_")) and key.count("_") >= 2:
+            name, team, slot = key.rsplit("_", 2)
+            if team.isdecimal() and slot.isdecimal() and (int(team), int(slot)) in self.player_names:
+                if name == "hints":
+                    return list(self.get_rechecked_hints(int(team), int(slot)))
+                if name == "client_status":
+                    return self.client_game_state[int(team), int(slot)]
+        return None
+
+    def index_hint(self, team: int, hint: Hint) -> None:
+        """Adds a hint to hint_index, so checking its location updates it."""
+        if not hint.found:
+            self.hint_index.setdefault((team, hint.finding_player, hint.location), set()).add(hint)
+
+    def recheck_hints_for_locations(self, team: int, finding_player: int, locations: typing.Iterable[int],
+                                    changed: typing.Set[team_slot]) -> None:
+        """Marks the hints for newly checked locations of finding_player as found, looked up through hint_index.
+        Each (team,slot) pair that has at least one hint modified is added to changed."""
+        for location in locations:
+            hints = self.hint_index.pop((team, finding_player, location), None)
+            if not hints:
+                continue
+            for hint in hints:
+                new_hint = hint.re_check(self, team)
+                if hint == new_hint:
+                    continue
+                for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
+                    changed.add((team, player))
+                    self.replace_hint(team, player, hint, new_hint)
+
     def get_sphere(self, player: int, location_id: int) -> int:
         """Get sphere of a location, -1 if spheres are not available."""
-        if self.spheres:
-            for i, sphere in enumerate(self.spheres):
-                if location_id in sphere.get(player, set()):
-                    return i
-            raise KeyError(f"No Sphere found for location ID {location_id} belonging to player {player}. "
-                           f"Location or player may not exist.")
-        return -1
+        return self.get_spheres_for(player, (location_id,))[0]
+
+    def get_spheres_for(self, player: int, location_ids: typing.Iterable[int]) -> typing.List[int]:
+        """Get spheres of several locations of a player in the same order, all -1 if spheres are not available."""
+        if not self.sphere_index:
+            return [-1 for _ in location_ids]
+        try:
+            return self.sphere_index.get_many(player, location_ids)
+        except KeyError as e:
+            raise KeyError(f"No Sphere found for location ID {e.args[0][1]} belonging to player {player}. "
+                           f"Location or player may not exist.") from e
 
     def get_players_package(self):
         return [NetworkPlayer(t, p, self.get_aliased_name(t, p), n) for (t, p), n in self.player_names.items()]
@@ -773,9 +1234,12 @@ class Context:
                 # we can check once if hint already exists
                 if hint not in self.hints[team, hint.finding_player]:
                     self.hints[team, hint.finding_player].add(hint)
+                    self.mark_save_changed("hints", (team, hint.finding_player))
+                    self.index_hint(team, hint)
                     new_hint_events.add(hint.finding_player)
                     for player in self.slot_set(hint.receiving_player):
                         self.hints[team, player].add(hint)
+                        self.mark_save_changed("hints", (team, player))
                         new_hint_events.add(player)
 
             self.logger.info("Notice (Team #%d): %s" % (team + 1, format_hint(self, team, hint)))
@@ -800,6 +1264,11 @@ class Context:
         if old_hint in self.hints[team, slot]:
             self.hints[team, slot].remove(old_hint)
             self.hints[team, slot].add(new_hint)
+            self.mark_save_changed("hints", (team, slot))
+        indexed = self.hint_index.get((team, old_hint.finding_player, old_hint.location))
+        if indexed and old_hint in indexed:
+            indexed.remove(old_hint)
+            self.index_hint(team, new_hint)
     
     # "events"
 
@@ -820,15 +1289,52 @@ class Context:
             "hint_points": get_slot_points(self, team, slot)
         }])
 
+    def get_stored_data_subscribers(self, key: str) -> typing.Set[Client]:
+        """Returns the clients that subscribed to key or a prefix of it with SetNotify."""
+        targets: typing.Set[Client] = self.stored_data_prefix_clients.get(key)
+        if key in self.stored_data_notification_clients:
+            targets.update(self.stored_data_notification_clients[key])
+        return targets
+
+    def set_stored_data(self, client: Client, args: dict) -> dict:
+        """Applies the operations of a Set package and returns its SetReply. Does not notify or save."""
+        return self.set_stored_data_batch(client, [args])[0]
+
+    def set_stored_data_batch(self, client: Client, sets: typing.Sequence[dict]) -> typing.List[dict]:
+        """
+        Applies the operations of Set packages in order and returns their SetReplies. Does not notify or save.
+        The operations work on copies of the stored values, which only get stored once all operations succeeded,
+        so if one of them raises, the data storage is left unchanged.
+        """
+        values: typing.Dict[str, typing.Any] = {}
+        replies: typing.List[dict] = []
+        for args in sets:
+            key: str = args["key"]
+            original_value = values[key] if key in values else self.stored_data.get(key, args.get("default", 0))
+            # operations may modify the value in place
+            value = copy.copy(original_value)
+            reply = {**args, "cmd": "SetReply", "slot": client.slot}
+            if args.get("want_original_value", True):
+                reply["original_value"] = original_value
+            for operation in args["operations"]:
+                func = modify_functions[operation["operation"]]
+                value = func(value, operation["value"])
+            values[key] = reply["value"] = value
+            replies.append(reply)
+        self.stored_data.update(values)
+        for key in values:
+            self.mark_save_changed("stored_data", key)
+        return replies
+
     def on_changed_hints(self, team: int, slot: int):
         key: str = f"_read_hints_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
+        targets: typing.Set[Client] = self.get_stored_data_subscribers(key)
         if targets:
             self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.hints[team, slot]}])
 
     def on_client_status_change(self, team: int, slot: int):
         key: str = f"_read_client_status_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
+        targets: typing.Set[Client] = self.get_stored_data_subscribers(key)
         if targets:
             self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.client_game_state[team, slot]}])
 
@@ -938,12 +1444,14 @@ async def on_client_joined(ctx: Context, client: Client):
                                   "It may stop working in the future. If you are a player, please report this to the "
                                   "client's developer.")
     ctx.client_connection_timers[client.team, client.slot] = datetime.datetime.now(datetime.timezone.utc)
+    ctx.mark_save_changed("client_connection_timers", (client.team, client.slot))
 
 
 async def on_client_left(ctx: Context, client: Client):
     if len(ctx.clients[client.team][client.slot]) < 1:
         update_client_status(ctx, client, ClientStatus.CLIENT_UNKNOWN)
         ctx.client_connection_timers[client.team, client.slot] = datetime.datetime.now(datetime.timezone.utc)
+        ctx.mark_save_changed("client_connection_timers", (client.team, client.slot))
 
     version_str = '.'.join(str(x) for x in client.version)
 
@@ -1021,6 +1529,47 @@ def get_start_inventory(ctx: Context, player: int, remote_start_inventory: bool)
     return ctx.start_inventory.setdefault(player, []) if remote_start_inventory else []
 
 
+# ReceivedItems with at least this many items are sent as columns to clients that support it
+min_columnar_items = 32
+
+
+def get_received_items_packet(client: Client, index: int, items: typing.List[NetworkItem]) -> dict:
+    if client.columnar_items and len(items) >= min_columnar_items:
+        return {"cmd": "ReceivedItems", "index": index, "columns": encode_item_columns(items)}
+    return {"cmd": "ReceivedItems", "index": index, "items": items}
+
+
+def get_checkpoint_index(items: typing.List[NetworkItem], checkpoint: typing.Any) -> typing.Optional[int]:
+    """Returns how many items the client already has according to its items_checkpoint,
+    or None if there is no checkpoint or it does not match the items."""
+    if type(checkpoint) != dict:
+        return None
+    index, items_hash = checkpoint.get("index"), checkpoint.get("hash")
+    if type(index) != int or type(items_hash) != int or not 0 <= index <= len(items):
+        return None
+    if get_items_hash(items[:index]) != items_hash:
+        return None
+    return index
+
+
+def get_resync_items(ctx: Context, client: Client, checkpoint: typing.Any = None) -> typing.List[dict]:
+    """Returns the ReceivedItems packets that bring a client up to date, resuming from its items_checkpoint
+    if it matches, and sets its send_index."""
+    if client.no_items:
+        client.send_index = 0
+        return []
+    items = get_start_inventory(ctx, client.slot, client.remote_start_inventory) + \
+        get_received_items(ctx, client.team, client.slot, client.remote_items)
+    client.send_index = len(items)
+    index = get_checkpoint_index(items, checkpoint)
+    if index is not None:
+        # sent even if nothing is missing, to confirm the client can keep its items
+        return [get_received_items_packet(client, index, items[index:])]
+    if items:
+        return [get_received_items_packet(client, 0, items)]
+    return []
+
+
 def send_new_items(ctx: Context):
     for team, clients in ctx.clients.items():
         for slot, clients in clients.items():
@@ -1031,10 +1580,8 @@ def send_new_items(ctx: Context):
                 items = get_received_items(ctx, team, slot, client.remote_items)
                 if len(start_inventory) + len(items) > client.send_index:
                     first_new_item = max(0, client.send_index - len(start_inventory))
-                    async_start(ctx.send_msgs(client, [{
-                        "cmd": "ReceivedItems",
-                        "index": client.send_index,
-                        "items": start_inventory[client.send_index:] + items[first_new_item:]}]))
+                    async_start(ctx.send_msgs(client, [get_received_items_packet(
+                        client, client.send_index, start_inventory[client.send_index:] + items[first_new_item:])]))
                     client.send_index = len(start_inventory) + len(items)
 
 
@@ -1069,6 +1616,7 @@ def collect_player(ctx: Context, team: int, slot: int, is_group: bool = False):
             if slot in group_players:
                 group_collected_players = ctx.group_collected.setdefault(group, set())
                 group_collected_players.add(slot)
+                ctx.mark_save_changed("group_collected", group)
                 if set(group_players) == group_collected_players:
                     collect_player(ctx, team, group, True)
 
@@ -1082,7 +1630,9 @@ def send_items_to(ctx: Context, team: int, target_slot: int, *items: NetworkItem
         for item in items:
             if item.player != target_slot:
                 get_received_items(ctx, team, target, False).append(item)
+                ctx.mark_save_changed("received_items", (team, target, False))
             get_received_items(ctx, team, target, True).append(item)
+            ctx.mark_save_changed("received_items", (team, target, True))
 
 
 def register_location_checks(ctx: Context, team: int, slot: int, locations: typing.Iterable[int],
@@ -1093,6 +1643,7 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
     if new_locations:
         if count_activity:
             ctx.client_activity_timers[team, slot] = datetime.datetime.now(datetime.timezone.utc)
+            ctx.mark_save_changed("client_activity_timers", (team, slot))
 
         sortable: list[tuple[int, int, int, int]] = []
         for location in new_locations:
@@ -1109,17 +1660,13 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
             ctx.logger.info('(Team #%d) %s sent %s to %s (%s)' % (
                 team + 1, ctx.player_names[(team, slot)], ctx.item_names[ctx.slot_info[target_player].game][item_id],
                 ctx.player_names[(team, target_player)], ctx.location_names[ctx.slot_info[slot].game][location]))
-            if len(info_texts) >= 140:
-                # split into chunks that are close to compression window of 64K but not too big on the wire
-                # (roughly 1300-2600 bytes after compression depending on repetitiveness)
-                ctx.broadcast_team(team, info_texts)
-                info_texts.clear()
             info_texts.append(json_format_send_event(new_item, target_player))
-        ctx.broadcast_team(team, info_texts)
+        ctx.queue_team_texts(team, info_texts)
         del info_texts
         del sortable
 
         ctx.location_checks[team, slot] |= new_locations
+        ctx.mark_save_changed("location_checks", (team, slot))
         send_new_items(ctx)
         ctx.broadcast(ctx.clients[team][slot], [{
             "cmd": "RoomUpdate",
@@ -1127,7 +1674,7 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
             "checked_locations": new_locations,  # send back new checks only
         }])
         updated_slots: typing.Set[tuple[int, int]] = set()
-        ctx.recheck_hints(team, slot, updated_slots)
+        ctx.recheck_hints_for_locations(team, slot, new_locations, updated_slots)
         for hint_team, hint_slot in updated_slots:
             ctx.on_changed_hints(hint_team, hint_slot)
         ctx.save()
@@ -1567,12 +2114,14 @@ class ClientMessageProcessor(CommonCommandProcessor):
         if alias_name:
             alias_name = alias_name[:16].strip()
             self.ctx.name_aliases[self.client.team, self.client.slot] = alias_name
+            self.ctx.mark_save_changed("name_aliases", (self.client.team, self.client.slot))
             self.output(f"Hello, {alias_name}")
             update_aliases(self.ctx, self.client.team)
             self.ctx.save()
             return True
         elif (self.client.team, self.client.slot) in self.ctx.name_aliases:
             del (self.ctx.name_aliases[self.client.team, self.client.slot])
+            self.ctx.mark_save_changed("name_aliases", (self.client.team, self.client.slot))
             self.output("Removed Alias")
             update_aliases(self.ctx, self.client.team)
             self.ctx.save()
@@ -1592,6 +2141,8 @@ class ClientMessageProcessor(CommonCommandProcessor):
                 new_item = NetworkItem(names[item_name], -1, self.client.slot)
                 get_received_items(self.ctx, self.client.team, self.client.slot, False).append(new_item)
                 get_received_items(self.ctx, self.client.team, self.client.slot, True).append(new_item)
+                for remote_items in (False, True):
+                    self.ctx.mark_save_changed("received_items", (self.client.team, self.client.slot, remote_items))
                 self.ctx.broadcast_text_all(
                     'Cheat console: sending "' + item_name + '" to ' + self.ctx.get_aliased_name(self.client.team,
                                                                                                  self.client.slot),
@@ -1613,6 +2164,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
             hints = {hint.re_check(self.ctx, self.client.team) for hint in
                      self.ctx.hints[self.client.team, self.client.slot]}
             self.ctx.hints[self.client.team, self.client.slot] = hints
+            self.ctx.mark_save_changed("hints", (self.client.team, self.client.slot))
             self.ctx.notify_hints(self.client.team, list(hints), recipients=(self.client.slot,))
             self.output(f"A hint costs {self.ctx.get_hint_cost(self.client.slot)} points. "
                         f"You have {points_available} points.")
@@ -1702,6 +2254,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
                     hints.append(hint)
                     can_pay -= 1
                     self.ctx.hints_used[self.client.team, self.client.slot] += 1
+                    self.ctx.mark_save_changed("hints_used", (self.client.team, self.client.slot))
 
                 self.ctx.notify_hints(self.client.team, hints)
                 if not_found_hints:
@@ -1830,6 +2383,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             ctx.clients[team][slot].append(client)
             client.version = args['version']
             client.tags = args['tags']
+            client.columnar_items = bool(args.get("columnar_items", False))
             client.no_locations = bool(client.tags & _non_game_messages.keys())
             # set NoText for old PopTracker clients that predate the tag to save traffic
             client.no_text = "NoText" in client.tags or ("PopTracker" in client.tags and client.version < (0, 5, 1))
@@ -1842,17 +2396,12 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                 "slot_info": ctx.slot_info,
                 "hint_points": get_slot_points(ctx, team, slot),
             }
-            reply = [connected_packet]
-            start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
-            items = get_received_items(ctx, client.team, client.slot, client.remote_items)
-            if (start_inventory or items) and not client.no_items:
-                reply.append({"cmd": 'ReceivedItems', "index": 0, "items": start_inventory + items})
-                client.send_index = len(start_inventory) + len(items)
+            reply = [connected_packet, *get_resync_items(ctx, client, args.get("items_checkpoint"))]
             if not client.auth:  # if this was a Re-Connect, don't print to console
                 client.auth = True
                 await on_client_joined(ctx, client)
             if args.get("slot_data", True):
-                connected_packet["slot_data"] = ctx.slot_data[client.slot]
+                connected_packet["slot_data"] = ctx.get_slot_data(client.slot)
             await ctx.send_msgs(client, reply)
 
     elif cmd == "GetDataPackage":
@@ -1886,14 +2435,9 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             if args.get('items_handling', None) is not None and client.items_handling != args['items_handling']:
                 try:
                     client.items_handling = args['items_handling']
-                    start_inventory = get_start_inventory(ctx, client.slot, client.remote_start_inventory)
-                    items = get_received_items(ctx, client.team, client.slot, client.remote_items)
-                    if (items or start_inventory) and not client.no_items:
-                        client.send_index = len(start_inventory) + len(items)
-                        await ctx.send_msgs(client, [{"cmd": "ReceivedItems", "index": 0,
-                                                      "items": start_inventory + items}])
-                    else:
-                        client.send_index = 0
+                    resync = get_resync_items(ctx, client)
+                    if resync:
+                        await ctx.send_msgs(client, resync)
                 except (ValueError, TypeError) as err:
                     await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', 'type': 'arguments',
                                                   'text': f'Invalid items_handling: {err}',
@@ -1914,12 +2458,9 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                         {"type": "TagsChanged", "team": client.team, "slot": client.slot, "tags": client.tags})
 
         elif cmd == 'Sync':
-            start_inventory = get_start_inventory(ctx, client.slot, client.remote_start_inventory)
-            items = get_received_items(ctx, client.team, client.slot, client.remote_items)
-            if (start_inventory or items) and not client.no_items:
-                client.send_index = len(start_inventory) + len(items)
-                await ctx.send_msgs(client, [{"cmd": "ReceivedItems", "index": 0,
-                                              "items": start_inventory + items}])
+            resync = get_resync_items(ctx, client, args.get("items_checkpoint"))
+            if resync:
+                await ctx.send_msgs(client, resync)
 
         elif cmd == 'LocationChecks':
             if client.no_locations:
@@ -2032,40 +2573,61 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             args["cmd"] = "Retrieved"
             keys = args["keys"]
             args["keys"] = {
-                key: ctx.read_data.get(key[6:], lambda: None)() if key.startswith("_read_") else
+                key: ctx.get_read_data(key[6:]) if key.startswith("_read_") else
                      ctx.stored_data.get(key, None)
                 for key in keys
             }
             await ctx.send_msgs(client, [args])
 
         elif cmd == "Set":
-            if "key" not in args or args["key"].startswith("_read_") or \
-                    "operations" not in args or not type(args["operations"]) == list:
+            # a batch of Sets is applied in order, with its SetReplies sent together and a single save
+            sets = args["sets"] if "key" not in args and "sets" in args else [args]
+            # the whole batch is checked first and only stored once all of it applied, so an invalid entry can not
+            # leave the batch partially applied
+            if type(sets) != list or not sets or not all(
+                    type(set_args) == dict and type(set_args.get("key")) == str
+                    and not set_args["key"].startswith("_read_") and type(set_args.get("operations")) == list
+                    and all(type(operation) == dict and type(operation.get("operation")) == str
+                            and operation["operation"] in modify_functions
+                            for operation in set_args["operations"])
+                    for set_args in sets):
                 await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
                                               "text": 'Set', "original_cmd": cmd}])
                 return
-            args["cmd"] = "SetReply"
-            value = ctx.stored_data.get(args["key"], args.get("default", 0))
-            args["original_value"] = copy.copy(value)
-            args["slot"] = client.slot
-            for operation in args["operations"]:
-                func = modify_functions[operation["operation"]]
-                value = func(value, operation["value"])
-            ctx.stored_data[args["key"]] = args["value"] = value
-            targets = set(ctx.stored_data_notification_clients[args["key"]])
-            if args.get("want_reply", False):
-                targets.add(client)
-            if targets:
-                ctx.broadcast(targets, [args])
+            try:
+                replies = ctx.set_stored_data_batch(client, sets)
+            except Exception:
+                # like a value of the wrong type for an operation, none of the batch was applied
+                await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
+                                              "text": 'Set', "original_cmd": cmd}])
+                return
+            reply_indexes: typing.Dict[Client, typing.List[int]] = collections.defaultdict(list)
+            for index, set_args in enumerate(sets):
+                targets = ctx.get_stored_data_subscribers(set_args["key"])
+                if set_args.get("want_reply", False):
+                    targets.add(client)
+                for target in targets:
+                    reply_indexes[target].append(index)
+            # clients that get the same SetReplies share one encoded message
+            targets_by_replies: typing.Dict[typing.Tuple[int, ...], typing.List[Client]] = \
+                collections.defaultdict(list)
+            for target, indexes in reply_indexes.items():
+                targets_by_replies[tuple(indexes)].append(target)
+            for indexes, targets in targets_by_replies.items():
+                ctx.broadcast(targets, [replies[index] for index in indexes])
             ctx.save()
 
         elif cmd == "SetNotify":
-            if "keys" not in args or type(args["keys"]) != list:
+            if type(args.get("keys", [])) != list or type(args.get("prefixes", [])) != list or \
+                    ("keys" not in args and "prefixes" not in args):
                 await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
                                               "text": 'SetNotify', "original_cmd": cmd}])
                 return
-            for key in args["keys"]:
+            for key in args.get("keys", []):
                 ctx.stored_data_notification_clients[key].add(client)
+            for prefix in args.get("prefixes", []):
+                ctx.stored_data_prefix_clients.add(str(prefix), client)
+                client.stored_data_prefixes.add(str(prefix))
 
 
 def update_client_status(ctx: Context, client: Client, new_status: ClientStatus):
@@ -2080,6 +2642,7 @@ def update_client_status(ctx: Context, client: Client, new_status: ClientStatus)
                 ctx.broadcast_text_all(f"Team #{client.team + 1} has completed all of their games! Congratulations!")
 
         ctx.client_game_state[client.team, client.slot] = new_status
+        ctx.mark_save_changed("client_game_state", (client.team, client.slot))
         ctx.on_client_status_change(client.team, client.slot)
         ctx.save()
 
@@ -2139,12 +2702,14 @@ class ServerCommandProcessor(CommonCommandProcessor):
                     if alias_name:
                         alias_name = alias_name.strip()[:15]
                         self.ctx.name_aliases[team, slot] = alias_name
+                        self.ctx.mark_save_changed("name_aliases", (team, slot))
                         self.output(f"Named {player_name} as {alias_name}")
                         update_aliases(self.ctx, team)
                         self.ctx.save()
                         return True
                     else:
                         del (self.ctx.name_aliases[team, slot])
+                        self.ctx.mark_save_changed("name_aliases", (team, slot))
                         self.output(f"Removed Alias for {player_name}")
                         update_aliases(self.ctx, team)
                         self.ctx.save()
@@ -2486,6 +3051,9 @@ def parse_args() -> argparse.Namespace:
     #0 -> recommended for tournaments to force a level playing field, only allow an exact version match
     """)
     parser.add_argument('--log_network', default=defaults["log_network"], action="store_true")
+    parser.add_argument('--slot_data_idle_time', default=defaults["slot_data_idle_time"], type=int,
+                        help="drop slot_data that was not requested for this many seconds from memory, "
+                             "it gets decompressed again on the next request. 0 to keep it.")
     args = parser.parse_args()
     return args
 
@@ -2532,7 +3100,7 @@ async def main(args: argparse.Namespace):
     ctx = Context(args.host, args.port, args.server_password, args.password, args.location_check_points,
                   args.hint_cost, not args.disable_item_cheat, args.release_mode, args.collect_mode,
                   args.remaining_mode,
-                  args.auto_shutdown, args.compatibility, args.log_network)
+                  args.auto_shutdown, args.compatibility, args.log_network, args.slot_data_idle_time)
     data_filename = args.multidata
 
     if not data_filename:
@@ -2566,7 +3134,8 @@ async def main(args: argparse.Namespace):
 
     ssl_context = load_server_cert(args.cert, args.cert_key) if args.cert else None
 
-    ctx.server = websockets.serve(functools.partial(server, ctx=ctx), host=ctx.host, port=ctx.port, ssl=ssl_context)
+    ctx.server = websockets.serve(functools.partial(server, ctx=ctx), host=ctx.host, port=ctx.port, ssl=ssl_context,
+                                  extensions=get_server_extensions())
     ip = args.host if args.host else Utils.get_public_ipv4()
     logging.info('Hosting game at %s:%d (%s)' % (ip, ctx.port,
                                                  'No password' if not ctx.password else 'Password: %s' % ctx.password))
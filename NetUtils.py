@@ -1,14 +1,24 @@
 from __future__ import annotations
 
+import array
+import bisect
+import pickle
+import struct
 import typing
+import time
 import enum
+import itertools
+import sys
 import warnings
+import zlib
 from json import JSONEncoder, JSONDecoder
 
 if typing.TYPE_CHECKING:
+    import mmap
+
     from websockets import WebSocketServerProtocol as ServerConnection
 
-from Utils import ByValue, Version
+from Utils import ByValue, Version, VersionException, restricted_loads
 
 
 class HintStatus(ByValue, enum.IntEnum):
@@ -94,6 +104,33 @@ class NetworkItem(typing.NamedTuple):
     flags: int = 0
 
 
+def get_items_hash(items: typing.Iterable[NetworkItem], items_hash: int = 0) -> int:
+    """
+    CRC-32 of items in order, each as item, location, player and flags in little endian 64 bit integers.
+    Pass the hash of earlier items as items_hash to continue it with more items.
+    """
+    packed = array.array("q", itertools.chain.from_iterable(items))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return zlib.crc32(packed, items_hash)
+
+
+def get_items_checkpoint(items: typing.Sequence[NetworkItem]) -> typing.Dict[str, int]:
+    """The items_checkpoint argument of Connect and Sync for the items a client already received."""
+    return {"index": len(items), "hash": get_items_hash(items)}
+
+
+def encode_item_columns(items: typing.Sequence[NetworkItem]) -> typing.List[typing.List[int]]:
+    """Splits items into a list each of item, location, player and flags, for the columns argument of ReceivedItems."""
+    if not items:
+        return [[], [], [], []]
+    return [list(column) for column in zip(*items)]
+
+
+def decode_item_columns(columns: typing.Sequence[typing.Sequence[int]]) -> typing.List[NetworkItem]:
+    return [NetworkItem(*item) for item in zip(*columns)]
+
+
 def _scan_for_TypedTuples(obj: typing.Any) -> typing.Any:
     if isinstance(obj, tuple) and hasattr(obj, "_fields"):  # NamedTuple is not actually a parent class
         data = obj._asdict()
@@ -390,7 +427,72 @@ class Hint(typing.NamedTuple):
         return self.receiving_player == self.finding_player
 
 
+class SphereIndex:
+    """Sphere of each location, as sorted location IDs and a parallel array of their spheres per player."""
+    _players: typing.Dict[int, typing.Tuple[array.array, array.array]]
+
+    def __init__(self, spheres: typing.Sequence[typing.Mapping[int, typing.Collection[int]]]) -> None:
+        player_locations: typing.Dict[int, typing.List[typing.Tuple[int, int]]] = {}
+        for sphere_number, sphere in enumerate(spheres):
+            for player, location_ids in sphere.items():
+                player_locations.setdefault(player, []).extend(
+                    (location_id, sphere_number) for location_id in location_ids)
+        sphere_type = "H" if len(spheres) <= 0xFFFF else "L"
+        self._players = {}
+        for player, locations in player_locations.items():
+            locations.sort()
+            self._players[player] = (array.array("q", [location_id for location_id, _ in locations]),
+                                     array.array(sphere_type, [sphere_number for _, sphere_number in locations]))
+
+    def __bool__(self) -> bool:
+        return bool(self._players)
+
+    def get(self, player: int, location_id: int, default: typing.Optional[int] = None) -> int:
+        """Returns the sphere of a location. If it is not in any sphere, returns default or raises KeyError."""
+        location_ids, spheres = self._players.get(player, ((), ()))
+        i = bisect.bisect_left(location_ids, location_id)
+        if i == len(location_ids) or location_ids[i] != location_id:
+            if default is None:
+                raise KeyError((player, location_id))
+            return default
+        return spheres[i]
+
+    def get_many(self, player: int, location_ids: typing.Iterable[int], default: typing.Optional[int] = None
+                 ) -> typing.List[int]:
+        """Returns the spheres of several locations of a player, in the same order."""
+        return [self.get(player, location_id, default) for location_id in location_ids]
+
+
+_packed_locations_header = struct.Struct("<I4x")  # player count
+_packed_location = struct.Struct("<qIIqI4x")  # location, sender, receiver, item, flags, same as _speedups.LocationEntry
+
+
+def pack_locations(locations: typing.Mapping[int, typing.Mapping[int, typing.Sequence[int]]]) -> bytes:
+    """Packs locations as an array of (location, sender, receiver, item, flags), sorted by sender and location,
+    which LocationStore.from_packed can use without unpacking it."""
+    parts = [_packed_locations_header.pack(max(locations, default=0))]
+    for sender, sender_locations in sorted(locations.items()):
+        for location, data in sorted(sender_locations.items()):
+            parts.append(_packed_location.pack(location, sender, data[1], data[0], data[2] if len(data) > 2 else 0))
+    return b"".join(parts)
+
+
+def unpack_locations(data: typing.Union[bytes, memoryview]) \
+        -> typing.Dict[int, typing.Dict[int, typing.Tuple[int, int, int]]]:
+    player_count, = _packed_locations_header.unpack_from(data)
+    locations: typing.Dict[int, typing.Dict[int, typing.Tuple[int, int, int]]] = \
+        {player: {} for player in range(1, player_count + 1)}
+    for location, sender, receiver, item, flags in \
+            _packed_location.iter_unpack(memoryview(data)[_packed_locations_header.size:]):
+        locations[sender][location] = item, receiver, flags
+    return locations
+
+
 class _LocationStore(dict, typing.MutableMapping[int, typing.Dict[int, typing.Tuple[int, int, int]]]):
+    @classmethod
+    def from_packed(cls, data: typing.Union[bytes, memoryview]) -> _LocationStore:
+        return cls(unpack_locations(data))
+
     def __init__(self, values: typing.MutableMapping[int, typing.Dict[int, typing.Tuple[int, int, int]]]):
         super().__init__(values)
 
@@ -472,3 +574,119 @@ else:
             warnings.warn("_speedups not available. Falling back to pure python LocationStore. "
                           "Install a matching C++ compiler for your platform to compile _speedups.")
             LocationStore = _LocationStore
+
+
+MULTIDATA_FORMAT_VERSION = 4
+"""Newest format version of .archipelago files that encode_multidata can write. Up to version 3, the version byte was
+followed by a zlib compressed pickle of the whole multidata."""
+LEGACY_MULTIDATA_FORMAT_VERSION = 3
+"""Format version encode_multidata writes by default, which servers without support for version 4 can still load."""
+_multidata_header = struct.Struct("<B7xQ")  # format version, offset of the section table
+
+
+class LazySlotData(typing.Mapping[int, typing.Any]):
+    """
+    slot_data of a multidata container, where each slot is only decompressed when it is first used.
+    Decoded slots that were not used for a while can be dropped again with evict_idle.
+    """
+    _sections: typing.Dict[int, typing.Union[bytes, memoryview]]
+    _decoded: typing.Dict[int, typing.Any]
+    _last_used: typing.Dict[int, float]
+
+    def __init__(self, sections: typing.Dict[int, typing.Union[bytes, memoryview]]) -> None:
+        self._sections = sections
+        self._decoded = {}
+        self._last_used = {}
+
+    @classmethod
+    def from_dict(cls, slot_data: typing.Mapping[int, typing.Any]) -> LazySlotData:
+        """Compresses already decoded slot_data, for multidata of older formats."""
+        return cls({slot: zlib.compress(pickle.dumps(data)) for slot, data in slot_data.items()})
+
+    def __getitem__(self, slot: int) -> typing.Any:
+        self._last_used[slot] = time.monotonic()
+        if slot in self._decoded:
+            return self._decoded[slot]
+        try:
+            data = self._decoded[slot] = restricted_loads(zlib.decompress(self._sections[slot]))
+        except KeyError:
+            del self._last_used[slot]
+            raise
+        return data
+
+    def evict_idle(self, max_idle: float) -> int:
+        """Drops decoded slots that were not used for max_idle seconds and returns how many are still decoded."""
+        now = time.monotonic()
+        for slot in [slot for slot, last_used in self._last_used.items() if now - last_used >= max_idle]:
+            del self._decoded[slot]
+            del self._last_used[slot]
+        return len(self._decoded)
+
+    def __iter__(self) -> typing.Iterator[int]:
+        return iter(self._sections)
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+
+def encode_multidata(multidata: typing.Mapping[str, typing.Any],
+                     format_version: int = LEGACY_MULTIDATA_FORMAT_VERSION) -> bytes:
+    """
+    Encodes multidata in format_version.
+
+    Up to version 3, that is the version byte followed by a zlib compressed pickle of the whole multidata.
+    From version 4, after a header with the format version, the file contains sections aligned to 8 bytes and a table
+    of their offsets: compressed locations packed for LocationStore.from_packed, a compressed pickle of slot_data per
+    slot and a compressed pickle of everything else.
+    """
+    if format_version < MULTIDATA_FORMAT_VERSION:
+        # decoded version 4 multidata holds a LocationStore and LazySlotData, which can't be unpickled by older servers
+        multidata = {
+            **multidata,
+            "locations": {sender: dict(locations.items()) for sender, locations in multidata["locations"].items()},
+            "slot_data": dict(multidata["slot_data"]),
+        }
+        return bytes([format_version]) + zlib.compress(pickle.dumps(multidata), 9)
+    if format_version > MULTIDATA_FORMAT_VERSION:
+        raise ValueError(f"Unknown multidata format version {format_version}.")
+
+    sections: typing.Dict[typing.Any, bytes] = {
+        "main": zlib.compress(pickle.dumps({key: value for key, value in multidata.items()
+                                            if key not in ("locations", "slot_data")}), 9),
+        # level 9 takes over ten times as long on packed locations, for a file that is only 2% smaller
+        "locations": zlib.compress(pack_locations(multidata["locations"])),
+    }
+    for slot, data in multidata["slot_data"].items():
+        sections[slot] = zlib.compress(pickle.dumps(data), 9)
+
+    output = bytearray(_multidata_header.size)
+    offsets: typing.Dict[typing.Any, typing.Tuple[int, int]] = {}
+    for name, data in sections.items():
+        output += bytes(-len(output) % 8)
+        offsets[name] = len(output), len(data)
+        output += data
+    table = {
+        "main": offsets.pop("main"),
+        "locations": offsets.pop("locations"),
+        "slot_data": offsets,
+    }
+    _multidata_header.pack_into(output, 0, MULTIDATA_FORMAT_VERSION, len(output))
+    output += zlib.compress(pickle.dumps(table))
+    return bytes(output)
+
+
+def decode_multidata(data: typing.Union[bytes, memoryview, "mmap.mmap"]) -> typing.Dict[str, typing.Any]:
+    """Decodes version 4 multidata written by encode_multidata. slot_data keeps referencing data."""
+    view = memoryview(data)
+    format_version, table_offset = _multidata_header.unpack_from(view)
+    if format_version != MULTIDATA_FORMAT_VERSION:
+        raise VersionException(f"Incompatible multidata format version {format_version}.")
+    table = restricted_loads(zlib.decompress(view[table_offset:]))
+
+    def section(offset: int, length: int) -> memoryview:
+        return view[offset:offset + length]
+
+    multidata = restricted_loads(zlib.decompress(section(*table["main"])))
+    multidata["locations"] = LocationStore.from_packed(zlib.decompress(section(*table["locations"])))
+    multidata["slot_data"] = LazySlotData({slot: section(*location) for slot, location in table["slot_data"].items()})
+    return multidata
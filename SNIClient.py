@@ -7,7 +7,9 @@ import multiprocessing
 import os
 import subprocess
 import base64
+import bisect
 import logging
+import operator
 import asyncio
 import enum
 import typing
@@ -127,6 +129,8 @@ class SNIContext(CommonContext):
     snes_reconnect_address: typing.Optional[str]
     snes_recv_queue: "asyncio.Queue[bytes]"
     snes_request_lock: asyncio.Lock
+    snes_last_read: "typing.Optional[asyncio.Future[bool]]"
+    """completed with whether the read request that was sent last got its data"""
     snes_write_buffer: typing.List[typing.Tuple[int, bytes]]
     snes_connector_lock: threading.Lock
     death_state: DeathState
@@ -153,6 +157,7 @@ class SNIContext(CommonContext):
         self.snes_reconnect_address = None
         self.snes_recv_queue = asyncio.Queue()
         self.snes_request_lock = asyncio.Lock()
+        self.snes_last_read = None
         self.snes_write_buffer = []
         self.snes_connector_lock = threading.Lock()
         self.death_state = DeathState.alive  # for death link flop behaviour
@@ -514,10 +519,31 @@ async def snes_recv_loop(ctx: SNIContext) -> None:
             ctx.snes_autoreconnect_task = asyncio.create_task(snes_autoreconnect(ctx), name="snes auto-reconnect")
 
 
-async def snes_read(ctx: SNIContext, address: int, size: int) -> typing.Optional[bytes]:
-    try:
-        await ctx.snes_request_lock.acquire()
+snes_max_read_operands = 8
+"""address ranges per GetAddress request, further ranges are sent as additional requests"""
+
 
+def merge_read_ranges(reads: typing.Iterable[typing.Tuple[int, int]]) -> typing.List[typing.Tuple[int, int]]:
+    """Merges adjacent and overlapping (address, size) ranges into as few ranges as possible, sorted by address."""
+    merged: typing.List[typing.Tuple[int, int]] = []
+    for address, size in sorted(reads):
+        if merged and address <= merged[-1][0] + merged[-1][1]:
+            merged_address, merged_size = merged[-1]
+            merged[-1] = (merged_address, max(merged_size, address + size - merged_address))
+        else:
+            merged.append((address, size))
+    return merged
+
+
+async def _snes_get_address(ctx: SNIContext, ranges: typing.Sequence[typing.Tuple[int, int]]) \
+        -> typing.Optional[bytes]:
+    """
+    Sends one GetAddress request and returns the data of all its ranges, concatenated.
+    The request lock is only held to send, so requests of other tasks can be sent while this one waits for its reply.
+    SNI replies in order, so each request reads from the queue once the one sent before it has its data.
+    """
+    size = sum(range_size for _, range_size in ranges)
+    async with ctx.snes_request_lock:
         if (
             ctx.snes_state != SNESState.SNES_ATTACHED or
             ctx.snes_socket is None or
@@ -529,22 +555,32 @@ async def snes_read(ctx: SNIContext, address: int, size: int) -> typing.Optional
         GetAddress_Request: SNESRequest = {
             "Opcode": "GetAddress",
             "Space": "SNES",
-            "Operands": [hex(address)[2:], hex(size)[2:]]
+            "Operands": [operand for address, range_size in ranges
+                         for operand in (hex(address)[2:], hex(range_size)[2:])]
         }
         try:
             await ctx.snes_socket.send(dumps(GetAddress_Request))
         except ConnectionClosed:
             return None
+        previous_read, ctx.snes_last_read = ctx.snes_last_read, asyncio.get_running_loop().create_future()
+        this_read = ctx.snes_last_read
+        recv_queue = ctx.snes_recv_queue
+
+    success = False
+    try:
+        if previous_read and not await previous_read:
+            return None  # the connection is being closed because of the previous read
 
         data: bytes = bytes()
         while len(data) < size:
             try:
-                data += await asyncio.wait_for(ctx.snes_recv_queue.get(), 5)
+                data += await asyncio.wait_for(recv_queue.get(), 5)
             except asyncio.TimeoutError:
                 break
 
         if len(data) != size:
-            snes_logger.error('Error reading %s, requested %d bytes, received %d' % (hex(address), size, len(data)))
+            snes_logger.error('Error reading %s, requested %d bytes, received %d' %
+                              (", ".join(hex(address) for address, _ in ranges), size, len(data)))
             if len(data):
                 snes_logger.error(str(data))
                 snes_logger.warning('Communication Failure with SNI')
@@ -552,9 +588,50 @@ async def snes_read(ctx: SNIContext, address: int, size: int) -> typing.Optional
                 await ctx.snes_socket.close()
             return None
 
+        success = True
         return data
+    except asyncio.CancelledError:
+        # the reply would be read by the next request instead
+        if ctx.snes_socket is not None and not ctx.snes_socket.closed:
+            async_start(ctx.snes_socket.close())
+        raise
     finally:
-        ctx.snes_request_lock.release()
+        this_read.set_result(success)
+        if ctx.snes_last_read is this_read:
+            ctx.snes_last_read = None
+
+
+async def snes_read_batch(ctx: SNIContext, reads: typing.Sequence[typing.Tuple[int, int]]) \
+        -> typing.Optional[typing.List[bytes]]:
+    """
+    Reads several (address, size) ranges at once and returns the data of each, in the same order.
+    Adjacent and overlapping ranges are merged, and all requests are sent before waiting for the first reply,
+    so a batch takes about one round-trip to SNI.
+    """
+    merged = merge_read_ranges(reads)
+    requests = [merged[index:index + snes_max_read_operands]
+                for index in range(0, len(merged), snes_max_read_operands)]
+    replies = await asyncio.gather(*(_snes_get_address(ctx, ranges) for ranges in requests))
+    range_data: typing.List[typing.Tuple[int, bytes]] = []
+    for ranges, reply in zip(requests, replies):
+        if reply is None:
+            return None
+        offset = 0
+        for address, size in ranges:
+            range_data.append((address, reply[offset:offset + size]))
+            offset += size
+
+    results: typing.List[bytes] = []
+    for address, size in reads:
+        # the merged range that contains the read is the last one starting at or before it
+        range_index = bisect.bisect_right(range_data, address, key=operator.itemgetter(0)) - 1
+        range_address, data = range_data[range_index]
+        results.append(data[address - range_address:address - range_address + size])
+    return results
+
+
+async def snes_read(ctx: SNIContext, address: int, size: int) -> typing.Optional[bytes]:
+    return await _snes_get_address(ctx, ((address, size),))
 
 
 async def snes_write(ctx: SNIContext, write_list: typing.List[typing.Tuple[int, bytes]]) -> bool:
@@ -41,6 +41,8 @@ app.config["JOB_THRESHOLD"] = 1
 app.config["JOB_TIME"] = 600
 # memory limit for generator processes in bytes
 app.config["GENERATOR_MEMORY_LIMIT"] = 4294967296
+# after how many seconds without a request the slot_data of a slot is dropped from a room hoster's memory, 0 to keep it
+app.config["ROOM_SLOT_DATA_IDLE_TIME"] = 600
 app.config['SESSION_PERMANENT'] = True
 
 # waitress uses one thread for I/O, these are for processing of views that then get sent
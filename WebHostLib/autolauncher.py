@@ -85,6 +85,10 @@ def init_generator(config: dict[str, Any]) -> None:
     db.bind(**pony_config)
     db.generate_mapping()
 
+    # load worlds while idle instead of during the first generation, as spawned processes start without them
+    from GenerateBatch import preload_worlds
+    preload_worlds()
+
 
 def cleanup():
     """delete unowned user-content"""
@@ -175,6 +179,7 @@ class MultiworldInstance():
         self.cert = config["SELFLAUNCHCERT"]
         self.key = config["SELFLAUNCHKEY"]
         self.host = config["HOST_ADDRESS"]
+        self.slot_data_idle_time = config["ROOM_SLOT_DATA_IDLE_TIME"]
         self.rooms_to_start = multiprocessing.Queue()
         self.rooms_shutting_down = multiprocessing.Queue()
         self.name = f"MultiHoster{id}"
@@ -186,7 +191,8 @@ class MultiworldInstance():
         process = multiprocessing.Process(group=None, target=run_server_process,
                                           args=(self.name, self.ponyconfig, get_static_server_data(),
                                                 self.cert, self.key, self.host,
-                                                self.rooms_to_start, self.rooms_shutting_down),
+                                                self.rooms_to_start, self.rooms_shutting_down,
+                                                self.slot_data_idle_time),
                                           name=self.name)
         process.start()
         self.process = process
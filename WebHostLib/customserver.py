@@ -13,13 +13,16 @@ import threading
 import time
 import typing
 import sys
+import weakref
 
 import websockets
 from pony.orm import commit, db_session, select
 
 import Utils
 
-from MultiServer import Context, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, load_server_cert
+from MultiServer import Context, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, \
+    load_server_cert, SaveJournal, get_server_extensions
+from NetUtils import LazySlotData, LocationStore
 from Utils import restricted_loads, cache_argsless
 from .locker import Locker
 from .models import Command, GameDataPackage, Room, db
@@ -34,11 +37,13 @@ class CustomClientMessageProcessor(ClientMessageProcessor):
         """
         if platform.lower().startswith("t"):  # twitch
             self.ctx.video[self.client.team, self.client.slot] = "Twitch", user
+            self.ctx.mark_save_changed("video")
             self.ctx.save()
             self.output(f"Registered Twitch Stream https://www.twitch.tv/{user}")
             return True
         elif platform.lower().startswith("y"):  # youtube
             self.ctx.video[self.client.team, self.client.slot] = "Youtube", user
+            self.ctx.mark_save_changed("video")
             self.ctx.save()
             self.output(f"Registered Youtube Stream for {user}")
             return True
@@ -57,28 +62,80 @@ class DBCommandProcessor(ServerCommandProcessor):
         self.ctx.logger.info(text)
 
 
+class SharedMultidata:
+    """Decoded multidata of a seed, shared by all rooms of that seed that run in the same process.
+    Rooms must not modify it, Context._load only reads from a shallow copy of multidata."""
+    multidata: typing.Dict[str, typing.Any]
+    """multidata with a LocationStore as locations, LazySlotData as slot_data
+    and without the data packages that match the static ones"""
+    games: typing.List[str]
+    """games that had a data package in multidata"""
+    game_data_packages: typing.Dict[str, typing.Any]
+    missing_checksum: bool
+    """whether the data package of a game has to be loaded from multidata, because it was rolled on old AP"""
+
+    def __init__(self, multidata: typing.Dict[str, typing.Any], static_gamespackage: typing.Dict[str, typing.Any],
+                 logger: logging.Logger):
+        self.games = list(multidata.get("datapackage", {}))
+        self.game_data_packages = {}
+        self.missing_checksum = False
+        for game in list(multidata.get("datapackage", {})):
+            game_data = multidata["datapackage"][game]
+            if "checksum" in game_data:
+                if static_gamespackage.get(game, {}).get("checksum") == game_data["checksum"]:
+                    # non-custom. remove from multidata and use static data
+                    # games package could be dropped from static data once all rooms embed data package
+                    del multidata["datapackage"][game]
+                else:
+                    row = GameDataPackage.get(checksum=game_data["checksum"])
+                    if row:  # None if rolled on >= 0.3.9 but uploaded to <= 0.3.8. multidata should be complete
+                        self.game_data_packages[game] = Utils.restricted_loads(row.data)
+                    else:
+                        logger.warning(f"Did not find game_data_package for {game}: {game_data['checksum']}")
+            else:
+                self.missing_checksum = True  # Game rolled on old AP and will load data package from multidata
+        if not isinstance(multidata["locations"], LocationStore):  # format version 4 decodes to a LocationStore
+            multidata["locations"] = LocationStore(multidata["locations"])
+        if not isinstance(multidata["slot_data"], LazySlotData):  # so rooms can evict slot_data of older formats
+            multidata["slot_data"] = LazySlotData.from_dict(multidata["slot_data"])
+        self.multidata = multidata
+
+
+# seed id -> multidata of running rooms, entries are dropped once no room of the seed is running anymore
+shared_multidata: weakref.WeakValueDictionary[typing.Any, SharedMultidata] = weakref.WeakValueDictionary()
+# name tables of the static data packages, shared by all rooms that only use static data packages
+static_game_tables: typing.Optional[typing.Tuple[typing.Any, ...]] = None
+
+
 class WebHostContext(Context):
     room_id: int
+    shared_multidata: SharedMultidata
+    static_game_data: bool
+    """whether this room only uses the static data packages, so it can use static_game_tables"""
 
-    def __init__(self, static_server_data: dict, logger: logging.Logger):
+    def __init__(self, static_server_data: dict, logger: logging.Logger, slot_data_idle_time: float = 0):
         # static server data is used during _load_game_data to load required data,
         # without needing to import worlds system, which takes quite a bit of memory
         self.static_server_data = static_server_data
         super(WebHostContext, self).__init__("", 0, "", "", 1,
                                              40, True, "enabled", "enabled",
-                                             "enabled", 0, 2, logger=logger)
+                                             "enabled", 0, 2, slot_data_idle_time=slot_data_idle_time,
+                                             logger=logger)
         del self.static_server_data
         self.main_loop = asyncio.get_running_loop()
         self.video = {}
         self.tags = ["AP", "WebHost"]
 
     def __del__(self):
+        self.log_memory("Context destroyed")
+
+    def log_memory(self, message: str):
         try:
             import psutil
             from Utils import format_SI_prefix
-            self.logger.debug(f"Context destroyed, Mem: {format_SI_prefix(psutil.Process().memory_info().rss, 1024)}iB")
+            self.logger.debug(f"{message}, Mem: {format_SI_prefix(psutil.Process().memory_info().rss, 1024)}iB")
         except ImportError:
-            self.logger.debug("Context destroyed")
+            self.logger.debug(message)
 
     def _load_game_data(self):
         for key, value in self.static_server_data.items():
@@ -108,68 +165,87 @@ class WebHostContext(Context):
         else:
             self.port = get_random_port()
 
-        multidata = self.decompress(room.seed.multidata)
-        game_data_packages = {}
-
-        static_gamespackage = self.gamespackage  # this is shared across all rooms
-        static_item_name_groups = self.item_name_groups
-        static_location_name_groups = self.location_name_groups
-        self.gamespackage = {"Archipelago": static_gamespackage.get("Archipelago", {})}  # this may be modified by _load
-        self.item_name_groups = {"Archipelago": static_item_name_groups.get("Archipelago", {})}
-        self.location_name_groups = {"Archipelago": static_location_name_groups.get("Archipelago", {})}
-        missing_checksum = False
-
-        for game in list(multidata.get("datapackage", {})):
-            game_data = multidata["datapackage"][game]
-            if "checksum" in game_data:
-                if static_gamespackage.get(game, {}).get("checksum") == game_data["checksum"]:
-                    # non-custom. remove from multidata and use static data
-                    # games package could be dropped from static data once all rooms embed data package
-                    del multidata["datapackage"][game]
-                else:
-                    row = GameDataPackage.get(checksum=game_data["checksum"])
-                    if row:  # None if rolled on >= 0.3.9 but uploaded to <= 0.3.8. multidata should be complete
-                        game_data_packages[game] = Utils.restricted_loads(row.data)
-                        continue
-                    else:
-                        self.logger.warning(f"Did not find game_data_package for {game}: {game_data['checksum']}")
-            else:
-                missing_checksum = True  # Game rolled on old AP and will load data package from multidata
-            self.gamespackage[game] = static_gamespackage.get(game, {})
-            self.item_name_groups[game] = static_item_name_groups.get(game, {})
-            self.location_name_groups[game] = static_location_name_groups.get(game, {})
-
-        if not game_data_packages and not missing_checksum:
-            # all static -> use the static dicts directly
-            self.gamespackage = static_gamespackage
-            self.item_name_groups = static_item_name_groups
-            self.location_name_groups = static_location_name_groups
+        seed_id = room.seed.id
+        if seed_id in shared_multidata:
+            self.shared_multidata = shared_multidata[seed_id]
+        else:
+            self.shared_multidata = shared_multidata[seed_id] = SharedMultidata(
+                self.decompress(room.seed.multidata), self.gamespackage, self.logger)
+        multidata = dict(self.shared_multidata.multidata)
+        game_data_packages = self.shared_multidata.game_data_packages
+
+        # all static -> use the static dicts, which are shared across all rooms, directly
+        self.static_game_data = not game_data_packages and not self.shared_multidata.missing_checksum
+        if not self.static_game_data:
+            static_gamespackage = self.gamespackage
+            static_item_name_groups = self.item_name_groups
+            static_location_name_groups = self.location_name_groups
+            # these may be modified by _load
+            self.gamespackage = {"Archipelago": static_gamespackage.get("Archipelago", {})}
+            self.item_name_groups = {"Archipelago": static_item_name_groups.get("Archipelago", {})}
+            self.location_name_groups = {"Archipelago": static_location_name_groups.get("Archipelago", {})}
+            for game in self.shared_multidata.games:
+                if game not in game_data_packages:
+                    self.gamespackage[game] = static_gamespackage.get(game, {})
+                    self.item_name_groups[game] = static_item_name_groups.get(game, {})
+                    self.location_name_groups[game] = static_location_name_groups.get(game, {})
         return self._load(multidata, game_data_packages, True)
 
+    def _init_game_data(self):
+        global static_game_tables
+        if not self.static_game_data:
+            super()._init_game_data()
+        elif static_game_tables:
+            (self.checksums, self.item_names, self.location_names,
+             self.all_item_and_group_names, self.all_location_and_group_names) = static_game_tables
+        else:
+            super()._init_game_data()
+            static_game_tables = (self.checksums, self.item_names, self.location_names,
+                                  self.all_item_and_group_names, self.all_location_and_group_names)
+
     @db_session
     def init_save(self, enabled: bool = True):
         self.saving = enabled
         if self.saving:
+            # the room stores the whole save, the journal only tells whether it changed since it was written
+            self.save_journal = SaveJournal()
             savegame_data = Room.get(id=self.room_id).multisave
             if savegame_data:
                 self.set_save(restricted_loads(Room.get(id=self.room_id).multisave))
+                self.save_journal.reset(self.get_save())
             self._start_async_saving(atexit_save=False)
         threading.Thread(target=self.listen_to_db_commands, daemon=True).start()
 
-    @db_session
     def _save(self, exit_save: bool = False) -> bool:
+        changed = not self.save_journal or bool(self.save_journal.get_changes(self.get_save_value,
+                                                                              self.get_save_entry))
+        try:
+            self._write_save(self.get_save() if changed else None, exit_save)
+        except BaseException:
+            if self.save_journal:
+                self.save_journal.reset({})  # write the whole save again next time
+            raise
+        return True
+
+    @db_session
+    def _write_save(self, save: typing.Optional[dict], exit_save: bool) -> None:
         room = Room.get(id=self.room_id)
-        room.multisave = pickle.dumps(self.get_save())
+        if save is not None:
+            room.multisave = pickle.dumps(save)
         # saving only occurs on activity, so we can "abuse" this information to mark this as last_activity
         if not exit_save:  # we don't want to count a shutdown as activity, which would restart the server again
             room.last_activity = datetime.datetime.utcnow()
-        return True
 
     def get_save(self) -> dict:
         d = super(WebHostContext, self).get_save()
-        d["video"] = [(tuple(playerslot), videodata) for playerslot, videodata in self.video.items()]
+        d["video"] = self.get_save_value("video")
         return d
 
+    def get_save_value(self, field: str) -> typing.Any:
+        if field == "video":
+            return [(tuple(playerslot), videodata) for playerslot, videodata in self.video.items()]
+        return super(WebHostContext, self).get_save_value(field)
+
 
 def get_random_port():
     return random.randint(49152, 65535)
@@ -179,10 +255,7 @@ def get_random_port():
 def get_static_server_data() -> dict:
     import worlds
     data = {
-        "non_hintable_names": {
-            world_name: world.hint_blacklist
-            for world_name, world in worlds.AutoWorldRegister.world_types.items()
-        },
+        "non_hintable_names": worlds.hint_blacklists,
         "gamespackage": {
             world_name: {
                 key: value
@@ -192,12 +265,12 @@ def get_static_server_data() -> dict:
             for world_name, game_package in worlds.network_data_package["games"].items()
         },
         "item_name_groups": {
-            world_name: world.item_name_groups
-            for world_name, world in worlds.AutoWorldRegister.world_types.items()
+            world_name: game_package["item_name_groups"]
+            for world_name, game_package in worlds.network_data_package["games"].items()
         },
         "location_name_groups": {
-            world_name: world.location_name_groups
-            for world_name, world in worlds.AutoWorldRegister.world_types.items()
+            world_name: game_package["location_name_groups"]
+            for world_name, game_package in worlds.network_data_package["games"].items()
         },
     }
 
@@ -226,7 +299,8 @@ def set_up_logging(room_id) -> logging.Logger:
 
 def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                        cert_file: typing.Optional[str], cert_key_file: typing.Optional[str],
-                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue):
+                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue,
+                       slot_data_idle_time: float = 0):
     from setproctitle import setproctitle
 
     setproctitle(name)
@@ -275,18 +349,21 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
         with Locker(f"RoomLocker {room_id}"):
             try:
                 logger = set_up_logging(room_id)
-                ctx = WebHostContext(static_server_data, logger)
+                ctx = WebHostContext(static_server_data, logger, slot_data_idle_time)
                 ctx.load(room_id)
+                ctx.log_memory("Room loaded")
                 ctx.init_save()
                 assert ctx.server is None
                 try:
                     ctx.server = websockets.serve(
-                        functools.partial(server, ctx=ctx), ctx.host, ctx.port, ssl=get_ssl_context())
+                        functools.partial(server, ctx=ctx), ctx.host, ctx.port, ssl=get_ssl_context(),
+                        extensions=get_server_extensions())
 
                     await ctx.server
                 except OSError:  # likely port in use
                     ctx.server = websockets.serve(
-                        functools.partial(server, ctx=ctx), ctx.host, 0, ssl=get_ssl_context())
+                        functools.partial(server, ctx=ctx), ctx.host, 0, ssl=get_ssl_context(),
+                        extensions=get_server_extensions())
 
                     await ctx.server
                 port = 0
@@ -9,7 +9,7 @@ from flask import make_response, render_template, request, Request, Response
 from werkzeug.exceptions import abort
 
 from MultiServer import Context, get_saving_second
-from NetUtils import ClientStatus, Hint, NetworkItem, NetworkSlot, SlotType
+from NetUtils import ClientStatus, Hint, NetworkItem, NetworkSlot, SlotType, SphereIndex
 from Utils import restricted_loads, KeyedDefaultDict
 from . import app, cache
 from .models import GameDataPackage, Room
@@ -101,9 +101,11 @@ class TrackerData:
         """Retrieves the game for a given player."""
         return self.get_slot_info(team, player).game
 
+    @_cache_results
     def get_player_locations(self, team: int, player: int) -> Dict[int, ItemMetadata]:
         """Retrieves all locations with their containing item's metadata for a given player."""
-        return self._multidata["locations"][player]
+        # multidata format version 4 decodes locations to a LocationStore
+        return dict(self._multidata["locations"][player].items())
 
     def get_player_starting_inventory(self, team: int, player: int) -> List[int]:
         """Retrieves a list of all item codes a given slot starts with."""
@@ -297,6 +299,23 @@ class TrackerData:
         """ each sphere is { player: { location_id, ... } } """
         return self._multidata.get("spheres", [])
 
+    @_cache_results
+    def get_sphere_index(self) -> SphereIndex:
+        return SphereIndex(self.get_spheres())
+
+    @_cache_results
+    def get_checked_locations_by_sphere(self, team: int) -> List[Tuple[int, int, int]]:
+        """Retrieves (sphere, player, location id) of all checked locations that have a sphere, sorted by sphere."""
+        sphere_index = self.get_sphere_index()
+        checked_locations = []
+        for player in self._multidata["slot_info"]:
+            location_ids = list(self.get_player_checked_locations(team, player))
+            for sphere, location_id in zip(sphere_index.get_many(player, location_ids, -1), location_ids):
+                if sphere != -1:
+                    checked_locations.append((sphere, player, location_id))
+        checked_locations.sort()
+        return checked_locations
+
 
 def _process_if_request_valid(incoming_request: Request, room: Optional[Room]) -> Optional[Response]:
     if not room:
@@ -9,11 +9,13 @@ This is deliberately .pyx because using a non-compiled "pure python" may be slow
 
 # pip install cython cymem
 import cython
+import sys
 import warnings
 from cpython cimport PyObject
 from typing import Any, Dict, Iterable, Iterator, Generator, Sequence, Tuple, TypeVar, Union, Set, List, TYPE_CHECKING
 from cymem.cymem cimport Pool
-from libc.stdint cimport int64_t, uint32_t
+from libc.stdint cimport int64_t, uint32_t, uintptr_t
+from libc.string cimport memcpy
 from collections import defaultdict
 
 cdef extern from *:
@@ -54,6 +56,7 @@ cdef extern from "intset.h":
 
 
 cdef struct LocationEntry:
+    # NOTE: NetUtils.pack_locations writes the same layout, so LocationStore.from_packed can use packed data directly
     # layout is so that
     # 64bit player: location+sender and item+receiver 128bit comparisons, if supported
     # 32bit player: aligned to 32/64bit with no unused space
@@ -96,6 +99,7 @@ cdef class LocationStore:
     cdef list _items  # ~64KB/1000 players, speed up items (56 per tuple + 8 per list entry)
     cdef list _proxies  # ~92KB/1000 players, speed up self[player] (56 per struct + 28 per len + 8 per list entry)
     cdef PyObject** _raw_proxies  # 8K/1000 players, faster access to _proxies, but does not keep a ref
+    cdef object _buffer  # keeps packed data alive and unmodified if entries point into it
 
     def get_size(self):
         from sys import getsizeof
@@ -172,7 +176,11 @@ cdef class LocationStore:
                 self.sender_index[sender].count += 1
                 i += 1
 
+        self._init_caches(max_sender, count, sender_count)
+
+    cdef _init_caches(self, size_t max_sender, size_t count, size_t sender_count):
         # build pyobject caches
+        cdef size_t i
         self._proxies.append(None)  # player 0
         assert self.sender_index[0].count == 0
         for i in range(1, max_sender + 1):
@@ -190,6 +198,65 @@ cdef class LocationStore:
         self.entry_count = count
         self._len = sender_count
 
+    @staticmethod
+    def from_packed(data: Any) -> LocationStore:
+        """Creates a LocationStore from locations packed by NetUtils.pack_locations.
+        The entries are used in place if data is suitably aligned, so data must not be modified afterwards."""
+        cdef const unsigned char[::1] view = data
+        cdef size_t header_size = 8
+        cdef size_t size = view.shape[0]
+        if size < header_size or (size - header_size) % sizeof(LocationEntry):
+            raise ValueError("Invalid packed locations")
+        if sys.byteorder != "little" or sizeof(LocationEntry) != 32:
+            # packed layout does not match the native one
+            from NetUtils import unpack_locations
+            return LocationStore(unpack_locations(data))
+
+        cdef size_t max_sender = (<const uint32_t*>&view[0])[0]
+        cdef size_t count = (size - header_size) // sizeof(LocationEntry)
+        if not max_sender:
+            raise ValueError(f"Rejecting game with 0 players")
+        if max_sender > MAX_PLAYER_ID:
+            raise ValueError(f"Invalid player id {max_sender} for location")
+        if not count:
+            warnings.warn("Game has no locations")
+
+        cdef LocationStore store = LocationStore.__new__(LocationStore)
+        store._mem = Pool()
+        store._keys = []
+        store._items = []
+        store._proxies = []
+        store._buffer = memoryview(data)  # holding an export also prevents resizing a bytearray
+        if count:
+            if (<uintptr_t>&view[header_size]) % sizeof(ap_id_t):
+                store.entries = <LocationEntry*>store._mem.alloc(count, sizeof(LocationEntry))
+                memcpy(store.entries, &view[header_size], count * sizeof(LocationEntry))
+            else:
+                store.entries = <LocationEntry*>&view[header_size]
+        store.sender_index = <IndexEntry*>store._mem.alloc(max_sender + 1, sizeof(IndexEntry))
+        store._raw_proxies = <PyObject**>store._mem.alloc(max_sender + 1, sizeof(PyObject*))
+
+        # validate entries and build index
+        cdef LocationEntry* entry
+        cdef LocationEntry* previous = NULL
+        cdef size_t i
+        for i in range(count):
+            entry = store.entries + i
+            if entry.sender < 1 or entry.sender > max_sender:
+                raise ValueError(f"Invalid player id {entry.sender} for location")
+            if entry.receiver < 1 or entry.receiver > MAX_PLAYER_ID:
+                raise ValueError(f"Invalid player id {entry.receiver} for item")
+            if previous and (entry.sender < previous.sender or
+                             entry.sender == previous.sender and entry.location <= previous.location):
+                raise ValueError("Packed locations are not sorted")
+            if not previous or entry.sender != previous.sender:
+                store.sender_index[entry.sender].start = i
+            store.sender_index[entry.sender].count += 1
+            previous = entry
+
+        store._init_caches(max_sender, count, max_sender)
+        return store
+
     # fake dict access
     def __len__(self) -> int:
         return self._len
@@ -358,6 +425,9 @@ cdef class PlayerLocationProxy:
                 return entry
         return NULL
 
+    def __contains__(self, key: int) -> bool:
+        return self._get(key) != NULL
+
     def __getitem__(self, key: int) -> Tuple[int, int, int]:
         cdef LocationEntry* entry = self._get(key)
         if entry:
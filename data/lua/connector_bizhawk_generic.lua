@@ -20,7 +20,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 ]]
 
-local SCRIPT_VERSION = 1
+local SCRIPT_VERSION = 3
 
 -- Set to log incoming requests
 -- Will cause lag due to large console output
@@ -37,6 +37,28 @@ field `type`. The value of `type` determines what other fields may exist.
 To get the script version, instead of JSON, send "VERSION" to get the script
 version directly (e.g. "2").
 
+Ranges of memory can be watched with `WATCH` requests. Before the response to
+each message, the script checks every watched range, and if the data of any of
+them changed since it was last sent, it first sends one extra line with a
+`WATCH_UPDATE` object (not a list) containing the new data of those ranges. A
+client can then keep its own copy of the watched memory up to date instead of
+reading it again with every message.
+
+#### Binary Frames
+
+After getting the version, a client may send "BINARY" to switch the rest of
+the connection to binary frames. The script answers "BINARY" (still as a line)
+if it supports them. Every message after that in either direction is a frame:
+
+- `uint32` (little endian): the length of the JSON part
+- `uint32` (little endian): the length of the data part
+- the JSON part, the same as a line would have been without the newline
+- the data part, the raw memory data of the message
+
+Fields that hold base64 strings of memory data in JSON messages instead hold
+the number of bytes that field takes up in the data part, in the order the
+fields appear in the JSON. "VERSION" is answered with a frame as well.
+
 #### Ex. 1
 
 Request: `[{"type": "PING"}]`
@@ -97,6 +119,23 @@ Response:
 
 ---
 
+#### Ex. 5
+
+Request: `[{"type": "WATCH", "address": 500, "size": 4, "domain": "ROM"}]`
+
+Response: `[{"type": "WATCH_RESPONSE", "id": 1, "value": "dGVzdA=="}]`
+
+Later, after the 4 bytes at 500 changed, request: `[{"type": "PING"}]`
+
+Response (2 lines):
+
+```json
+{"type": "WATCH_UPDATE", "changes": [{"id": 1, "value": "dGVzdDI="}]}
+[{"type": "PONG"}]
+```
+
+---
+
 ### Supported Request Types
 
 - `PING`  
@@ -139,7 +178,8 @@ Response:
 
     Additional Fields:
     - `address` (`int`): The address of the memory to check
-    - `expected_data` (string): A base64 string of contiguous data
+    - `expected_data` (string): A base64 string of contiguous data (memory
+    data)
     - `domain` (`string`): The name of the memory domain the address
     corresponds to
 
@@ -175,9 +215,31 @@ Response:
     Additional Fields:
     - `address` (`int`): The address of the memory to write to
     - `value` (`string`): A base64 string representing the data to write
+    (memory data)
+    - `domain` (`string`): The name of the memory domain the address
+    corresponds to
+
+- `WATCH`  
+    Starts watching an array of bytes at the provided address. Its data is
+    returned right away, and sent again in a `WATCH_UPDATE` whenever it
+    changes. Watches last until the client disconnects.
+
+    Expected Response Type: `WATCH_RESPONSE`
+
+    Additional Fields:
+    - `address` (`int`): The address of the memory to watch
+    - `size` (`int`): The number of bytes to watch
     - `domain` (`string`): The name of the memory domain the address
     corresponds to
 
+- `UNWATCH`  
+    Stops watching a range of memory.
+
+    Expected Response Type: `UNWATCH_RESPONSE`
+
+    Additional Fields:
+    - `id` (`int`): The id of the watch, as returned in its `WATCH_RESPONSE`
+
 - `DISPLAY_MESSAGE`  
     Adds a message to the message queue which will be displayed using
     `gui.addmessage` according to the message interval.
@@ -249,11 +311,30 @@ Response:
     Contains the result of a `READ` request.
 
     Additional Fields:
-    - `value` (`string`): A base64 string representing the read data
+    - `value` (`string`): A base64 string representing the read data (memory
+    data)
 
 - `WRITE_RESPONSE`  
     Acknowledges `WRITE`.
 
+- `WATCH_RESPONSE`  
+    Contains the id and current data of a new watch.
+
+    Additional Fields:
+    - `id` (`int`): The id of the watch
+    - `value` (`string`): A base64 string representing the watched data
+    (memory data)
+
+- `UNWATCH_RESPONSE`  
+    Acknowledges `UNWATCH`.
+
+- `WATCH_UPDATE`  
+    Sent on its own line before a response when watched data has changed.
+
+    Additional Fields:
+    - `changes` (`[{id: int, value: string}]`): The id and new data (as a
+    base64 string, memory data) of each watch whose data changed
+
 - `DISPLAY_MESSAGE_RESPONSE`  
     Acknowledges `DISPLAY_MESSAGE`.
 
@@ -309,8 +390,14 @@ local current_time = 0
 
 local locked = false
 
+local binary_mode = false
+local partial_frame = ""
+
 local rom_hash = nil
 
+local watches = {}
+local next_watch_id = 1
+
 function queue_push (self, value)
     self[self.right] = value
     self.right = self.right + 1
@@ -334,6 +421,100 @@ end
 
 local message_queue = new_queue()
 
+-- The field of each request and response type that holds memory data
+local DATA_FIELDS = {
+    ["GUARD"] = "expected_data",
+    ["WRITE"] = "value",
+    ["READ_RESPONSE"] = "value",
+    ["WATCH_RESPONSE"] = "value",
+}
+
+local unpack = table.unpack or unpack
+
+function bytes_to_string (bytes)
+    local chunks = {}
+    for i = 1, #bytes, 4096 do
+        chunks[#chunks + 1] = string.char(unpack(bytes, i, math.min(i + 4095, #bytes)))
+    end
+    return table.concat(chunks)
+end
+
+function string_to_bytes (str, first, last)
+    local bytes = {}
+    for i = first, last, 4096 do
+        local chunk = {str:byte(i, math.min(i + 4095, last))}
+        for j = 1, #chunk do
+            bytes[#bytes + 1] = chunk[j]
+        end
+    end
+    return bytes
+end
+
+function encode_uint32 (value)
+    return string.char(value % 256, math.floor(value / 256) % 256, math.floor(value / 65536) % 256, math.floor(value / 16777216) % 256)
+end
+
+function decode_uint32 (str, first)
+    local a, b, c, d = str:byte(first, first + 3)
+    return a + b * 256 + c * 65536 + d * 16777216
+end
+
+-- Turns the memory data of requests into byte arrays, from base64 or from the data part of a frame
+function decode_data (reqs, data)
+    local offset = 0
+    for i, req in ipairs(reqs) do
+        local field = DATA_FIELDS[req["type"]]
+        if field ~= nil then
+            if data == nil then
+                req[field] = base64.decode(req[field])
+            else
+                local size = req[field]
+                req[field] = string_to_bytes(data, offset + 1, offset + size)
+                offset = offset + size
+            end
+        end
+    end
+end
+
+-- Replaces a byte array with base64, or with its size while adding it to the data part of a frame
+function encode_value (bytes, chunks)
+    if binary_mode then
+        chunks[#chunks + 1] = bytes_to_string(bytes)
+        return #bytes
+    else
+        return base64.encode(bytes)
+    end
+end
+
+function send_message (message, data)
+    if binary_mode then
+        data = data or ""
+        client_socket:send(encode_uint32(#message)..encode_uint32(#data)..message..data)
+    else
+        client_socket:send(message.."\n")
+    end
+end
+
+-- Receives a whole frame, keeping what already arrived if the rest of it has not
+function receive_frame ()
+    local header, err, partial = client_socket:receive(8, partial_frame)
+    if header == nil then
+        partial_frame = partial or ""
+        return nil, nil, err
+    end
+
+    local message_size = decode_uint32(header, 1)
+    local frame
+    frame, err, partial = client_socket:receive(8 + message_size + decode_uint32(header, 5), header)
+    if frame == nil then
+        partial_frame = partial or ""
+        return nil, nil, err
+    end
+
+    partial_frame = ""
+    return frame:sub(9, 8 + message_size), frame:sub(9 + message_size), nil
+end
+
 function lock ()
     locked = true
     client_socket:settimeout(2)
@@ -397,7 +578,7 @@ request_handlers = {
 
     ["GUARD"] = function (req)
         local res = {}
-        local expected_data = base64.decode(req["expected_data"])
+        local expected_data = req["expected_data"]
         local actual_data = memory.read_bytes_as_array(req["address"], #expected_data, req["domain"])
 
         local data_is_validated = true
@@ -437,7 +618,7 @@ request_handlers = {
         local res = {}
 
         res["type"] = "READ_RESPONSE"
-        res["value"] = base64.encode(memory.read_bytes_as_array(req["address"], req["size"], req["domain"]))
+        res["value"] = memory.read_bytes_as_array(req["address"], req["size"], req["domain"])
 
         return res
     end,
@@ -446,7 +627,30 @@ request_handlers = {
         local res = {}
 
         res["type"] = "WRITE_RESPONSE"
-        memory.write_bytes_as_array(req["address"], base64.decode(req["value"]), req["domain"])
+        memory.write_bytes_as_array(req["address"], req["value"], req["domain"])
+
+        return res
+    end,
+
+    ["WATCH"] = function (req)
+        local res = {}
+        local data = memory.read_bytes_as_array(req["address"], req["size"], req["domain"])
+
+        watches[next_watch_id] = {address = req["address"], size = req["size"], domain = req["domain"], data = data}
+
+        res["type"] = "WATCH_RESPONSE"
+        res["id"] = next_watch_id
+        res["value"] = data
+        next_watch_id = next_watch_id + 1
+
+        return res
+    end,
+
+    ["UNWATCH"] = function (req)
+        local res = {}
+
+        res["type"] = "UNWATCH_RESPONSE"
+        watches[req["id"]] = nil
 
         return res
     end,
@@ -479,6 +683,25 @@ request_handlers = {
     end,
 }
 
+-- Returns the id and new data of every watch whose data changed since it was last sent
+function get_watch_changes ()
+    local changes = {}
+
+    for id, watch in pairs(watches) do
+        local data = memory.read_bytes_as_array(watch["address"], watch["size"], watch["domain"])
+
+        for i, byte in ipairs(data) do
+            if byte ~= watch["data"][i] then
+                watch["data"] = data
+                changes[#changes + 1] = {id = id, value = data}
+                break
+            end
+        end
+    end
+
+    return changes
+end
+
 function process_request (req)
     if request_handlers[req["type"]] then
         return request_handlers[req["type"]](req)
@@ -489,7 +712,12 @@ end
 
 -- Receive data from AP client and send message back
 function send_receive ()
-    local message, err = client_socket:receive()
+    local message, data, err
+    if binary_mode then
+        message, data, err = receive_frame()
+    else
+        message, err = client_socket:receive()
+    end
 
     -- Handle errors
     if err == "closed" then
@@ -517,12 +745,23 @@ function send_receive ()
     end
 
     if message == "VERSION" then
-        client_socket:send(tostring(SCRIPT_VERSION).."\n")
+        send_message(tostring(SCRIPT_VERSION))
+    elseif message == "BINARY" then
+        send_message("BINARY")
+        binary_mode = true
     else
         local res = {}
-        local data = json.decode(message)
+        local reqs = json.decode(message)
         local failed_guard_response = nil
-        for i, req in ipairs(data) do
+
+        -- If the memory data can't be decoded, every request gets the same error
+        local status, err = pcall(decode_data, reqs, data)
+        if not status then
+            if type(err) ~= "string" then err = "Unknown error" end
+            failed_guard_response = {type = "ERROR", err = err}
+        end
+
+        for i, req in ipairs(reqs) do
             if failed_guard_response ~= nil then
                 res[i] = failed_guard_response
             else
@@ -542,7 +781,23 @@ function send_receive ()
             end
         end
 
-        client_socket:send(json.encode(res).."\n")
+        local status, changes = pcall(get_watch_changes)
+        if status and #changes > 0 then
+            local chunks = {}
+            for i, change in ipairs(changes) do
+                change["value"] = encode_value(change["value"], chunks)
+            end
+            send_message(json.encode({type = "WATCH_UPDATE", changes = changes}), table.concat(chunks))
+        end
+
+        local chunks = {}
+        for i, response in ipairs(res) do
+            local field = DATA_FIELDS[response["type"]]
+            if field ~= nil then
+                response[field] = encode_value(response[field], chunks)
+            end
+        end
+        send_message(json.encode(res), table.concat(chunks))
     end
 end
 
@@ -603,6 +858,9 @@ function main ()
                     print("Client connected")
                     current_state = STATE_CONNECTED
                     client_socket = client
+                    watches = {}
+                    binary_mode = false
+                    partial_frame = ""
                     server:close()
                     server = nil
                     client_socket:settimeout(0)
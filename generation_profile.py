@@ -0,0 +1,153 @@
+"""
+Collects a machine-readable report of where generation spends its time, enabled through `Generate.py --profile`.
+
+The report covers wall time and peak memory of every world step, the fill phases, access rule evaluation counts per
+player and the most expensive access rules. Rule times are inclusive, so they contain the time of the region and
+entrance checks a rule triggers. Memory is traced with tracemalloc, which slows generation down considerably,
+and the peak of a step that overlaps another one includes the peak of the other.
+"""
+from __future__ import annotations
+
+import collections
+import contextlib
+import json
+import threading
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from BaseClasses import CollectionState, Entrance, Location, MultiWorld
+
+__all__ = ["GenerationProfile"]
+
+
+class GenerationProfile:
+    multiworld: Optional[MultiWorld]
+    top_rules: int
+    """Number of most expensive access rules to include in the report."""
+    trace_memory: bool
+    peak_memory: int
+    steps: List[Dict[str, Any]]
+    phases: Dict[str, float]
+    fill_steps: Dict[str, float]
+    rule_stats: Dict[Tuple[str, int, str, str], List[Any]]
+    """(spot type, player, parent region name, spot name) -> [evaluations, seconds]"""
+    running_steps: int
+    """Steps between start_step and record_step, the peak memory is only reset while none is running."""
+
+    def __init__(self, top_rules: int = 20, trace_memory: bool = True) -> None:
+        self.multiworld = None
+        self.top_rules = top_rules
+        self.trace_memory = trace_memory
+        self.steps = []
+        self.phases = {}
+        self.fill_steps = collections.defaultdict(float)
+        self.rule_stats = {}
+        self.peak_memory = 0
+        self.running_steps = 0
+        self.steps_lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def attach(self, multiworld: MultiWorld) -> None:
+        """Starts collecting the steps and fill phases of multiworld."""
+        self.multiworld = multiworld
+        multiworld.profile = self
+
+    def start_step(self) -> None:
+        with self.steps_lock:
+            if self.trace_memory and not self.running_steps:
+                tracemalloc.reset_peak()
+            self.running_steps += 1
+
+    def record_step(self, method: Callable[..., Any], seconds: float, player: Optional[int]) -> None:
+        """Records a world step or stage that _timed_call ran, with the peak memory since start_step."""
+        with self.steps_lock:
+            self.running_steps -= 1
+            peak_memory = self._get_peak_memory()
+        self.steps.append({
+            "step": method.__qualname__,
+            "player": player,
+            "seconds": seconds,
+            "peak_memory": peak_memory,
+        })
+
+    def _get_peak_memory(self) -> Optional[int]:
+        if not self.trace_memory:
+            return None
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        self.peak_memory = max(self.peak_memory, peak_memory)
+        return peak_memory
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def record_fill_step(self, name: str, seconds: float) -> None:
+        """Adds the time of a fill_restrictive or remaining_fill call, which can run several times per name."""
+        self.fill_steps[name] += seconds
+
+    def instrument_rules(self, multiworld: MultiWorld) -> None:
+        """Wraps the access rules of all locations and entrances to count their evaluations and time."""
+        for location in multiworld.get_locations():
+            self._instrument(location, "location")
+        for entrance in multiworld.get_entrances():
+            self._instrument(entrance, "entrance")
+
+    def _instrument(self, spot: Location | Entrance, spot_type: str) -> None:
+        rule = spot.access_rule
+        region_name = spot.parent_region.name if spot.parent_region else ""
+        # names only have to be unique per player and type, and entrance names not even that, so a duplicate adds up
+        stats = self.rule_stats.setdefault((spot_type, spot.player, region_name, spot.name), [0, 0.0])
+        perf_counter = time.perf_counter
+
+        def profiled_rule(state: CollectionState) -> bool:
+            start = perf_counter()
+            try:
+                return rule(state)
+            finally:
+                stats[0] += 1
+                stats[1] += perf_counter() - start
+
+        compiled_rule = getattr(rule, "compiled_rule", None)
+        if compiled_rule:
+            # keeps CollectionState.filter_reachable sharing the result between equal rules and PendingLocations
+            # indexing the location, compiled rules only depend on the state
+            profiled_rule.compiled_rule = compiled_rule  # type: ignore[attr-defined]
+        spot.access_rule = profiled_rule
+
+    def to_dict(self) -> Dict[str, Any]:
+        assert self.multiworld, "GenerationProfile is not attached to a MultiWorld"
+        multiworld = self.multiworld
+        rule_evaluations: Dict[int, int] = collections.Counter()
+        for (_, player, _, _), (calls, _) in self.rule_stats.items():
+            rule_evaluations[player] += calls
+        top_rules = sorted(self.rule_stats.items(), key=lambda rule: rule[1][1], reverse=True)[:self.top_rules]
+        return {
+            "seed": multiworld.seed_name,
+            "players": {player: {"name": multiworld.player_name[player], "game": multiworld.game[player]}
+                        for player in multiworld.player_ids},
+            "total_seconds": time.perf_counter() - self.start,
+            "peak_memory": self.peak_memory if self._get_peak_memory() is not None else None,
+            "steps": self.steps,
+            "phases": self.phases,
+            "fill_steps": dict(self.fill_steps),
+            "rule_evaluations": dict(rule_evaluations),
+            "top_rules": [{"type": spot_type, "player": player, "region": region, "name": name, "evaluations": calls,
+                           "seconds": seconds}
+                          for (spot_type, player, region, name), (calls, seconds) in top_rules],
+        }
+
+    def write(self, path: str) -> None:
+        """Writes the report as json to path and stops memory tracing if it was started for this profile."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        if self.started_tracing:
+            tracemalloc.stop()
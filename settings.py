@@ -598,6 +598,12 @@ class ServerOptions(Group):
         OFF = 0
         ON = 1
 
+    class SlotDataIdleTime(int):
+        """
+        Drop slot_data from memory after this many seconds without a client requesting it, 0 to keep it loaded.
+        It gets decompressed from the multidata again on the next request.
+        """
+
     host: str | None = None
     port: int = 38281
     password: str | None = None
@@ -616,6 +622,7 @@ class ServerOptions(Group):
     auto_shutdown: AutoShutdown = AutoShutdown(0)
     compatibility: Compatibility = Compatibility(2)
     log_network: LogNetwork = LogNetwork(0)
+    slot_data_idle_time: SlotDataIdleTime = SlotDataIdleTime(0)
 
 
 class GeneratorOptions(Group):
@@ -675,6 +682,28 @@ class GeneratorOptions(Group):
         start_inventory -> Move remaining items to start_inventory, generate additional filler items to fill locations.
         """
 
+    class ProgBalancingTimeLimit(int):
+        """
+        Seconds after which progression balancing stops balancing further spheres, 0 for no limit.
+        With a limit, the same seed can generate differently on a slower or faster machine.
+        """
+
+    class ProgBalancingRounds(int):
+        """
+        Maximum number of spheres progression balancing balances, 0 for no limit.
+        """
+
+    class MultidataFormatVersion(int):
+        """
+        Format version of the .archipelago file in the output.
+        3 can be loaded by every server, 4 loads faster but needs a server that supports it.
+        """
+
+    class ProfileTopRules(int):
+        """
+        Number of most expensive access rules listed in the report written by Generate.py --profile.
+        """
+
     enemizer_path: EnemizerPath = EnemizerPath("EnemizerCLI/EnemizerCLI.Core")  # + ".exe" is implied on Windows
     player_files_path: PlayerFilesPath = PlayerFilesPath("Players")
     players: Players = Players(0)
@@ -684,6 +713,10 @@ class GeneratorOptions(Group):
     race: Race = Race(0)
     plando_options: PlandoOptions = PlandoOptions("bosses, connections, texts")
     panic_method: PanicMethod = PanicMethod("swap")
+    prog_balancing_time_limit: ProgBalancingTimeLimit = ProgBalancingTimeLimit(0)
+    prog_balancing_rounds: ProgBalancingRounds = ProgBalancingRounds(0)
+    multidata_format_version: MultidataFormatVersion = MultidataFormatVersion(3)
+    profile_top_rules: ProfileTopRules = ProfileTopRules(20)
     loglevel: str = "info"
     logtime: bool = False
 
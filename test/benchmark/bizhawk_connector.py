@@ -0,0 +1,102 @@
+"""
+Compares the JSON lines and the binary frames of the BizHawk connector protocol. A client does what a game watcher with
+large reads would do on every tick, a read of several ranges of memory and a small guarded write, against a stand-in
+for the connector script running in another process. Reports the round trips per second, the bytes on the wire per tick
+and the CPU time of both sides for each mode. The stand-in is written in Python, where base64 is a lot faster than in
+the Lua connector, so the difference is larger in BizHawk than it is here.
+
+Example, run from the Archipelago folder:
+python test/benchmark/bizhawk_connector.py --ticks 2000 --size 8192
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import random
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+domain = "System Bus"
+
+
+def run_connector(memory_size: int, connection: "Connection") -> None:
+    asyncio.run(serve_connector(memory_size, connection))
+
+
+async def serve_connector(memory_size: int, connection: "Connection") -> None:
+    """Serves the stand-in connector, and after each mode sends its byte counts and CPU time when asked to."""
+    from test.programs.test_bizhawk_client import FakeConnector
+
+    connector = FakeConnector({domain: bytearray(random.Random(0).randbytes(memory_size))})
+    connection.send(await connector.start())
+    cpu = time.process_time()
+    while await asyncio.get_running_loop().run_in_executor(None, connection.recv):
+        connection.send((connector.bytes_received, connector.bytes_sent, time.process_time() - cpu))
+        connector.bytes_received = connector.bytes_sent = 0
+        cpu = time.process_time()
+    await connector.close()
+
+
+async def run_ticks(port: int, binary_framing: bool, args: argparse.Namespace) -> typing.Tuple[float, float]:
+    """Returns the wall time and the CPU time of the client for all ticks."""
+    from worlds._bizhawk import BizHawkContext, ConnectionStatus, disconnect, enable_binary_framing, guarded_write, \
+        read
+
+    ctx = BizHawkContext()
+    ctx.streams = await asyncio.open_connection("127.0.0.1", port)
+    ctx.connection_status = ConnectionStatus.TENTATIVE
+    if binary_framing and not await enable_binary_framing(ctx):
+        raise RuntimeError("Connector did not switch to binary frames")
+
+    read_size = args.size // args.reads
+    read_list = [(index * read_size, read_size, domain) for index in range(args.reads)]
+    write_list = [(args.size, bytes(range(16)), domain)]
+    start, cpu = time.perf_counter(), time.process_time()
+    for _ in range(args.ticks):
+        data = await read(ctx, read_list)
+        await guarded_write(ctx, write_list, [(0, data[0][:1], domain)])
+    wall_time, cpu = time.perf_counter() - start, time.process_time() - cpu
+    disconnect(ctx)
+    return wall_time, cpu
+
+
+def run_bizhawk_connector_benchmark() -> None:
+    from Utils import init_logging
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=2000, help="Number of game watcher ticks per mode.")
+    parser.add_argument("--size", type=int, default=8192, help="Bytes read per tick.")
+    parser.add_argument("--reads", type=int, default=4, help="Number of ranges the bytes of a tick are read from.")
+    args = parser.parse_args()
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    context = multiprocessing.get_context("spawn")
+    connection, child_connection = context.Pipe()
+    process = context.Process(target=run_connector, name="Benchmark Connector",
+                              args=(args.size + 16, child_connection))
+    process.start()
+    child_connection.close()  # so that receiving fails instead of waiting forever if the connector process dies
+    port = connection.recv()
+
+    logger.info(f"{args.ticks} ticks, each reading {args.size} bytes in {args.reads} ranges and writing 16 bytes:")
+    for name, binary_framing in (("JSON lines", False), ("Binary frames", True)):
+        wall_time, cpu = asyncio.run(run_ticks(port, binary_framing, args))
+        connection.send(True)
+        received, sent, connector_cpu = connection.recv()
+        logger.info(f"{name}: {2 * args.ticks / wall_time:.0f} round trips per second, "
+                    f"{received / args.ticks:.0f} bytes sent and {sent / args.ticks:.0f} bytes received per tick, "
+                    f"{cpu / args.ticks * 1e6:.0f} µs client CPU and {connector_cpu / args.ticks * 1e6:.0f} µs "
+                    f"connector CPU per tick.")
+    connection.send(False)
+    process.join()
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_bizhawk_connector_benchmark()
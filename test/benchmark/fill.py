@@ -0,0 +1,40 @@
+def run_fill_benchmark(player_counts=(10, 50, 200), game: str = "A Link to the Past", seed: int = 0):
+    """Compare the incremental sweep of fill_restrictive against re-sweeping the full pool for every placement."""
+    import logging
+    import typing
+
+    from time_it import TimeIt
+
+    from BaseClasses import Location, MultiWorld
+    from Utils import init_logging
+    from worlds import AutoWorld
+    from Fill import fill_restrictive, sweep_from_pool
+    from test.general import setup_multiworld
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    def progression_fill(players: int, incremental_sweep: bool) -> float:
+        world_type = AutoWorld.AutoWorldRegister.world_types[game]
+        multiworld: MultiWorld = setup_multiworld([world_type] * players, seed=seed)
+        locations: typing.List[Location] = sorted(multiworld.get_unfilled_locations())
+        multiworld.random.shuffle(locations)
+        progitempool = [item for item in sorted(multiworld.itempool) if item.advancement]
+        multiworld.random.shuffle(progitempool)
+        mode = "incremental" if incremental_sweep else "full"
+        with TimeIt(f"{players} players {mode} sweep fill of {len(progitempool)} items", logger) as t:
+            fill_restrictive(multiworld, sweep_from_pool(multiworld.state), locations, progitempool,
+                             name="Benchmark", allow_partial=True, incremental_sweep=incremental_sweep)
+        return t.dif
+
+    for players in player_counts:
+        full_time = progression_fill(players, False)
+        incremental_time = progression_fill(players, True)
+        logger.info(f"{players} players: incremental sweep took {incremental_time:.4f} seconds, "
+                    f"full re-sweep took {full_time:.4f} seconds ({full_time / incremental_time:.2f}x).")
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_fill_benchmark()
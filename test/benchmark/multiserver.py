@@ -0,0 +1,419 @@
+"""
+Load generator for MultiServer. Hosts a synthetic multiworld in a server process and connects simulated clients to it
+from client processes. The clients check locations, create hints, use data storage, send DeathLink Bounces and chat,
+and periodically all reconnect at once. Reports the latency per command, message rates and the CPU time and memory
+of the server process, to find out how much one process can host.
+
+Example, run from the Archipelago folder:
+python test/benchmark/multiserver.py --slots 200 --clients 400 --duration 60
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+    from multiprocessing.synchronize import Event
+
+benchmark_game = "Benchmark"
+
+# command -> weight, each simulated client picks its next command with these weights
+command_weights: typing.Dict[str, int] = {
+    "LocationChecks": 40,
+    "LocationScouts": 5,
+    "Set": 20,
+    "Get": 20,
+    "Bounce": 5,
+    "Say": 2,
+}
+
+
+def create_multidata(slots: int, locations_per_slot: int, seed: int) -> typing.Dict[str, typing.Any]:
+    """A multiworld of a game with generic items and locations, where each location has an item for a random slot."""
+    from NetUtils import NetworkSlot, SlotType
+    from Utils import version_tuple
+
+    rng = random.Random(seed)
+    item_count = 1000
+    data_package = {
+        "item_name_to_id": {f"Item {item}": item for item in range(1, item_count + 1)},
+        "location_name_to_id": {f"Location {location}": location for location in range(1, locations_per_slot + 1)},
+        "item_name_groups": {"Everything": [f"Item {item}" for item in range(1, item_count + 1)]},
+        "location_name_groups": {},
+        "checksum": f"benchmark-{item_count}-{locations_per_slot}",
+    }
+    names = {slot: f"Player{slot}" for slot in range(1, slots + 1)}
+    return {
+        "version": tuple(version_tuple),
+        "minimum_versions": {"server": (0, 0, 0), "clients": {slot: (0, 0, 0) for slot in names}},
+        "seed_name": f"Benchmark{seed}",
+        "slot_info": {slot: NetworkSlot(name, benchmark_game, SlotType.player) for slot, name in names.items()},
+        "connect_names": {name: (0, slot) for slot, name in names.items()},
+        "locations": {slot: {location: (rng.randint(1, item_count), rng.randint(1, slots), rng.choice((0, 0, 1, 2)))
+                             for location in range(1, locations_per_slot + 1)}
+                      for slot in names},
+        "slot_data": {slot: {"benchmark": True, "option": rng.random()} for slot in names},
+        "er_hint_data": {},
+        "precollected_items": {slot: [] for slot in names},
+        "precollected_hints": {slot: set() for slot in names},
+        "server_options": {"hint_cost": 0, "location_check_points": 1, "release_mode": "disabled",
+                           "remaining_mode": "disabled", "collect_mode": "disabled"},
+        "datapackage": {benchmark_game: data_package},
+        "spheres": [],
+    }
+
+
+def get_process_stats() -> typing.Tuple[float, typing.Optional[int]]:
+    """CPU time and resident memory of this process. Memory is the peak if psutil is not installed."""
+    try:
+        import psutil
+    except ImportError:
+        try:
+            import resource
+        except ImportError:  # unix only module
+            return time.process_time(), None
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return time.process_time(), max_rss if sys.platform == "darwin" else max_rss * 1024
+    return time.process_time(), psutil.Process().memory_info().rss
+
+
+def run_server(multidata_path: str, save: bool, log_level: str, connection: "Connection", stop: "Event") -> None:
+    """Hosts multidata_path, sends its port and process stats through connection until stop is set."""
+    import functools
+
+    import websockets
+
+    from MultiServer import Context, get_server_extensions, server
+
+    logging.basicConfig(filename=os.path.join(os.path.dirname(multidata_path), "server.log"), level=log_level.upper())
+
+    async def main() -> None:
+        ctx = Context("127.0.0.1", 0, None, None, 1, 0, False)
+        ctx.load(multidata_path, True)
+        ctx.init_save(save)
+        async with websockets.serve(functools.partial(server, ctx=ctx), "127.0.0.1", 0, max_size=None,
+                                    extensions=get_server_extensions()) as ws_server:
+            connection.send((ws_server.sockets[0].getsockname()[1], *get_process_stats()))
+            await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+            connection.send(get_process_stats())
+        ctx.exit_event.set()
+
+    asyncio.run(main())
+
+
+class Results:
+    latencies: typing.DefaultDict[str, typing.List[float]]
+    sent: int
+    received: int
+    dropped: int
+    """commands that got no answer before the connection was closed or the benchmark ended"""
+
+    def __init__(self) -> None:
+        self.latencies = collections.defaultdict(list)
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+    def update(self, other: "Results") -> None:
+        for command, latencies in other.latencies.items():
+            self.latencies[command] += latencies
+        self.sent += other.sent
+        self.received += other.received
+        self.dropped += other.dropped
+
+
+class SimulatedClient:
+    """Sends a random command of command_weights at random intervals and times the server's answer to it."""
+    socket: typing.Any
+    missing_locations: typing.List[int]
+    items: typing.List[typing.Any]
+    pending: typing.Dict[typing.Tuple[str, typing.Any], float]
+    """(command, answer key) -> time the command was sent"""
+
+    def __init__(self, index: int, slot: int, share: typing.Tuple[int, int], address: str,
+                 args: argparse.Namespace, results: Results) -> None:
+        self.index = index
+        self.slot = slot
+        self.share = share  # this client checks the locations where location % share[1] == share[0]
+        self.address = address
+        self.args = args
+        self.results = results
+        self.random = random.Random(index)
+        self.death_link = self.random.random() < args.death_link
+        self.socket = None
+        self.receiver: typing.Optional[asyncio.Task] = None
+        self.connected = asyncio.Event()
+        self.connected_future: typing.Optional[asyncio.Future] = None
+        self.missing_locations = []
+        self.items = []
+        self.pending = {}
+        self.sequence = 0
+
+    def next_id(self) -> str:
+        self.sequence += 1
+        return f"{self.index}:{self.sequence}"
+
+    async def send(self, command: str, key: typing.Any, message: typing.Dict[str, typing.Any]) -> None:
+        from NetUtils import encode
+
+        self.pending[command, key] = time.perf_counter()
+        self.results.sent += 1
+        await self.socket.send(encode([message]))
+
+    def answered(self, command: str, key: typing.Any) -> None:
+        sent = self.pending.pop((command, key), None)
+        if sent is not None:
+            self.results.latencies[command].append(time.perf_counter() - sent)
+
+    async def connect(self) -> None:
+        import websockets
+        from NetUtils import encode, get_items_checkpoint
+        from Utils import version_tuple
+
+        start = time.perf_counter()
+        self.socket = await websockets.connect(self.address, max_size=None, ping_interval=None)
+        self.connected_future = asyncio.get_running_loop().create_future()
+        self.receiver = asyncio.create_task(self.receive(self.socket))
+        connect = {"cmd": "Connect", "game": benchmark_game, "name": f"Player{self.slot}", "password": None,
+                   "uuid": f"benchmark{self.index}", "version": version_tuple, "items_handling": 0b111,
+                   "tags": ["AP", "DeathLink"] if self.death_link else ["AP"], "slot_data": True,
+                   "columnar_items": self.args.columnar_items}
+        if self.args.resume_items and self.items:
+            connect["items_checkpoint"] = get_items_checkpoint(self.items)
+        else:
+            self.items = []
+        await self.socket.send(encode([connect]))
+        await self.connected_future
+        self.results.latencies["Connect"].append(time.perf_counter() - start)
+        if self.index % 10 == 0:
+            # some clients act as trackers of their slot's data storage keys
+            await self.socket.send(encode([{"cmd": "SetNotify", "prefixes": [f"benchmark_{self.slot}_"],
+                                            "keys": [f"_read_hints_0_{self.slot}"]}]))
+        self.connected.set()
+
+    async def disconnect(self) -> None:
+        self.connected.clear()
+        await self.socket.close()
+        await self.receiver
+        self.results.dropped += len(self.pending)
+        self.pending.clear()
+
+    async def receive(self, socket: typing.Any) -> None:
+        import websockets
+        import json
+
+        try:
+            async for data in socket:
+                # plain json instead of NetUtils.decode, so decoding in the clients costs less
+                for message in json.loads(data):
+                    self.results.received += 1
+                    self.on_message(message)
+        except websockets.ConnectionClosed:
+            pass
+        if not self.connected_future.done():
+            self.connected_future.set_exception(ConnectionError("Connection closed before Connected."))
+
+    def on_message(self, message: typing.Dict[str, typing.Any]) -> None:
+        from NetUtils import NetworkItem, decode_item_columns
+
+        command = message["cmd"]
+        if command == "Connected":
+            self.missing_locations = [location for location in message["missing_locations"]
+                                      if location % self.share[1] == self.share[0]]
+            self.random.shuffle(self.missing_locations)
+            self.connected_future.set_result(None)
+        elif command == "ConnectionRefused":
+            self.connected_future.set_exception(ConnectionError(f"Connection refused: {message['errors']}"))
+        elif command == "ReceivedItems":
+            if "columns" in message:
+                items = decode_item_columns(message["columns"])
+            else:
+                items = [NetworkItem(item["item"], item["location"], item["player"], item["flags"])
+                         for item in message["items"]]
+            if message["index"] == 0:
+                self.items = []
+            self.items += items
+        elif command == "RoomUpdate":
+            for location in message.get("checked_locations", ()):
+                self.answered("LocationChecks", location)
+        elif command == "LocationInfo":
+            self.answered("LocationScouts", message["locations"][0]["location"])
+        elif command in ("SetReply", "Retrieved"):
+            self.answered("Set" if command == "SetReply" else "Get", message.get("benchmark_id"))
+        elif command == "Bounced":
+            self.answered("Bounce", message.get("data", {}).get("benchmark_id"))
+        elif command == "PrintJSON" and message.get("type") == "Chat":
+            self.answered("Say", message["message"])
+
+    async def send_command(self, command: str) -> None:
+        if command == "LocationChecks" and self.missing_locations:
+            location = self.missing_locations.pop()
+            await self.send(command, location, {"cmd": command, "locations": [location]})
+        elif command == "LocationScouts":
+            location = self.random.randint(1, self.args.locations)
+            await self.send(command, location, {"cmd": command, "locations": [location], "create_as_hint": 2})
+        elif command == "Set":
+            key = self.next_id()
+            await self.send(command, key, {"cmd": command, "key": f"benchmark_{self.slot}_{self.random.randint(1, 5)}",
+                                           "default": 0, "want_reply": True, "benchmark_id": key,
+                                           "operations": [{"operation": "add", "value": 1}]})
+        elif command == "Get":
+            key = self.next_id()
+            await self.send(command, key, {"cmd": command, "benchmark_id": key,
+                                           "keys": [f"benchmark_{self.slot}_1", f"_read_hints_0_{self.slot}"]})
+        elif command == "Bounce" and self.death_link:
+            key = self.next_id()
+            await self.send(command, key, {"cmd": command, "tags": ["DeathLink"], "data": {
+                "time": time.time(), "source": f"Player{self.slot}", "cause": "Benchmark", "benchmark_id": key}})
+        elif command == "Say":
+            key = f"Benchmark message {self.next_id()}"
+            await self.send(command, key, {"cmd": command, "text": key})
+
+    async def play(self, end: float) -> None:
+        import websockets
+
+        commands, weights = zip(*command_weights.items())
+        while True:
+            await asyncio.sleep(self.random.expovariate(self.args.rate))
+            if time.time() >= end:
+                return
+            await self.connected.wait()
+            try:
+                await self.send_command(self.random.choices(commands, weights)[0])
+            except websockets.ConnectionClosed:
+                pass
+
+
+async def run_clients_async(address: str, clients: typing.List[typing.Tuple[int, int, typing.Tuple[int, int]]],
+                            args: argparse.Namespace, start: float) -> Results:
+    results = Results()
+    simulated = [SimulatedClient(index, slot, share, address, args, results) for index, slot, share in clients]
+    await asyncio.sleep(max(0.0, start - time.time()))
+    await asyncio.gather(*(client.connect() for client in simulated))
+    end = start + args.duration
+    players = [asyncio.create_task(client.play(end)) for client in simulated]
+    rng = random.Random(clients[0][0] if clients else 0)
+    storm = start + args.storm_interval
+    while args.storm_interval and storm < end:
+        # reconnect storm: many clients lose their connection at the same time and come back at once
+        await asyncio.sleep(max(0.0, storm - time.time()))
+        storming = rng.sample(simulated, int(len(simulated) * args.storm_fraction))
+        await asyncio.gather(*(client.disconnect() for client in storming))
+        await asyncio.gather(*(client.connect() for client in storming))
+        storm += args.storm_interval
+    await asyncio.gather(*players)
+    await asyncio.sleep(1)  # wait for answers that are still on the way
+    for client in simulated:
+        await client.disconnect()
+    return results
+
+
+def run_clients(address: str, clients: typing.List[typing.Tuple[int, int, typing.Tuple[int, int]]],
+                args: argparse.Namespace, start: float, connection: "Connection") -> None:
+    connection.send(asyncio.run(run_clients_async(address, clients, args, start)))
+
+
+def receive_from(connection: "Connection", process: multiprocessing.Process) -> typing.Any:
+    """Waits for the result of a benchmark process, instead of waiting forever if it crashed."""
+    while not connection.poll(1):
+        if not process.is_alive():
+            raise RuntimeError(f"{process.name} exited with code {process.exitcode}.")
+    return connection.recv()
+
+
+def format_latencies(command: str, latencies: typing.List[float]) -> str:
+    latencies = sorted(latencies)
+    if not latencies:
+        return f"{command:>15}: no answers"
+    return (f"{command:>15}: {len(latencies):>8} answered, p50 {latencies[len(latencies) // 2] * 1000:8.2f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:8.2f} ms, max {latencies[-1] * 1000:8.2f} ms")
+
+
+def run_multiserver_benchmark() -> None:
+    from NetUtils import MULTIDATA_FORMAT_VERSION, encode_multidata
+    from Utils import format_SI_prefix, init_logging
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=100, help="Number of slots in the synthetic multiworld.")
+    parser.add_argument("--locations", type=int, default=200, help="Number of locations per slot.")
+    parser.add_argument("--clients", type=int, default=200, help="Number of simulated clients, spread over slots.")
+    parser.add_argument("--processes", type=int, default=max(1, min(4, (os.cpu_count() or 2) - 1)),
+                        help="Number of processes running the simulated clients.")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to send traffic for.")
+    parser.add_argument("--rate", type=float, default=1, help="Average commands per second of each client.")
+    parser.add_argument("--death_link", type=float, default=0.2, help="Share of clients with DeathLink.")
+    parser.add_argument("--storm_interval", type=float, default=10,
+                        help="Seconds between reconnect storms, 0 to disable them.")
+    parser.add_argument("--storm_fraction", type=float, default=0.5,
+                        help="Share of each client process's clients that reconnect in a storm.")
+    parser.add_argument("--resume_items", action="store_true", help="Resume items from a checkpoint on reconnect.")
+    parser.add_argument("--columnar_items", action="store_true", help="Ask for ReceivedItems as columns.")
+    parser.add_argument("--save", action="store_true", help="Let the server save its state.")
+    parser.add_argument("--server_log_level", default="info", help="Log level of the server, logged to a file.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        multidata_path = os.path.join(temp_dir, "AP_Benchmark.archipelago")
+        with open(multidata_path, "wb") as f:
+            f.write(encode_multidata(create_multidata(args.slots, args.locations, args.seed), MULTIDATA_FORMAT_VERSION))
+
+        server_connection, child_connection = context.Pipe()
+        stop = context.Event()
+        server_process = context.Process(target=run_server, name="Benchmark Server", args=(
+            multidata_path, args.save, args.server_log_level, child_connection, stop))
+        server_process.start()
+        port, loaded_cpu, loaded_rss = receive_from(server_connection, server_process)
+        logger.info(f"Server hosts {args.slots} slots with {args.locations} locations each, "
+                    f"{loaded_cpu:.2f} seconds CPU time to load."
+                    + (f" Memory: {format_SI_prefix(loaded_rss, 1024)}iB." if loaded_rss else ""))
+
+        # each slot gets clients round-robin, clients of the same slot check different locations
+        copies = -(-args.clients // args.slots)
+        clients = [(index, index % args.slots + 1, (index // args.slots, copies)) for index in range(args.clients)]
+        start = time.time() + 1 + args.clients / 500  # give the client processes time to start
+        client_processes = []
+        for process_index in range(args.processes):
+            connection, child_connection = context.Pipe()
+            process = context.Process(target=run_clients, name=f"Benchmark Clients {process_index}",
+                                      args=(f"ws://127.0.0.1:{port}", clients[process_index::args.processes],
+                                            args, start, child_connection))
+            process.start()
+            client_processes.append((process, connection))
+
+        results = Results()
+        for process, connection in client_processes:
+            results.update(receive_from(connection, process))
+            process.join()
+        wall_time = time.time() - start
+        stop.set()
+        cpu, rss = receive_from(server_connection, server_process)
+        server_process.join()
+
+    logger.info(f"{args.clients} clients at {args.rate} commands per second each for {args.duration} seconds, "
+                f"reconnect storms of {args.storm_fraction:.0%} every {args.storm_interval} seconds:")
+    for command in ("Connect", *command_weights):
+        logger.info(format_latencies(command, results.latencies[command]))
+    logger.info(f"Sent {results.sent / wall_time:.1f} commands per second, received {results.received / wall_time:.1f} "
+                f"messages per second. {results.dropped} commands were not answered before disconnecting.")
+    logger.info(f"Server used {cpu - loaded_cpu:.2f} seconds of CPU time in {wall_time:.2f} seconds "
+                f"({(cpu - loaded_cpu) / wall_time:.0%} of one core)."
+                + (f" Memory: {format_SI_prefix(rss, 1024)}iB." if rss else ""))
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_multiserver_benchmark()
@@ -0,0 +1,91 @@
+import unittest
+
+from BaseClasses import CollectionState, Entrance, Region
+from worlds.generic import CompiledRules
+from worlds.generic.CompiledRules import (And, CanReachRegion, Has, HasAll, HasAny, HasFromList, compile_rule,
+                                         get_compiled_rule)
+from worlds.generic.Rules import add_rule, set_rule
+from . import generate_items, generate_locations, generate_test_multiworld
+
+
+class TestCompiledRules(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld()
+        self.menu = self.multiworld.get_region("Menu", 1)
+        self.items = generate_items(4, 1, True)
+        self.names = [item.name for item in self.items]
+        self.state = CollectionState(self.multiworld)
+
+    def collect(self, *indices: int) -> None:
+        for index in indices:
+            self.state.collect(self.items[index], True)
+
+    def test_rules_match_state_methods(self):
+        """Ensure compiled rules give the same results as the CollectionState methods they replace."""
+        a, b, c, d = self.names
+        rules = [
+            (Has(a, 2), lambda state: state.has(a, 1, 2)),
+            (HasAll((a, b)), lambda state: state.has_all((a, b), 1)),
+            (HasAny((c, d)), lambda state: state.has_any((c, d), 1)),
+            (HasFromList((a, b, c), 3), lambda state: state.has_from_list((a, b, c), 1, 3)),
+            (Has(a) & (Has(b) | Has(c)) & HasAny((c, d)),
+             lambda state: state.has(a, 1) and state.has_any((b, c), 1) and state.has_any((c, d), 1)),
+        ]
+        for collected in ((), (0,), (0, 0), (0, 1), (1, 2), (0, 2), (0, 1, 3), (0, 0, 1, 2, 3)):
+            self.state = CollectionState(self.multiworld)
+            self.collect(*collected)
+            for rule, expected in rules:
+                with self.subTest(rule=rule, collected=collected):
+                    self.assertEqual(compile_rule(rule, 1)(self.state), expected(self.state))
+
+    def test_large_products_are_nested(self):
+        """Ensure an And over large Ors is kept as nested rules instead of being fully expanded."""
+        rule = And(*(HasAny(self.names) for _ in range(4)))
+        compiled = compile_rule(rule, 1)
+        self.assertLessEqual(len(compiled.clauses), CompiledRules.max_clauses)
+        self.assertEqual(compiled.item_names(), set(self.names))
+        self.assertFalse(compiled(self.state))
+        self.collect(3)
+        self.assertTrue(compiled(self.state))
+
+    def test_unknown_rule(self):
+        """Ensure rules that are not one of the declarative rule types are rejected with the types that are accepted."""
+        with self.assertRaisesRegex(TypeError, "expected Has, HasAll, HasAny, HasFromList, CanReachRegion, And or Or"):
+            compile_rule(lambda state: True, 1)
+
+    def test_equal_rules_are_shared(self):
+        """Ensure equal rules of a player compile to the same rule, so they can be evaluated once per pass."""
+        locations = generate_locations(2, 1, self.menu)
+        for location in locations:
+            set_rule(location, Has(self.names[0]) | Has(self.names[1]))
+        self.assertIs(locations[0].access_rule, locations[1].access_rule)
+        self.assertIsNot(compile_rule(Has(self.names[0]), 1), compile_rule(Has(self.names[0]), 2))
+
+        self.assertEqual(self.state.filter_reachable(locations), set())
+        self.collect(1)
+        self.assertEqual(self.state.filter_reachable(locations), set(locations))
+
+    def test_add_rule(self):
+        """Ensure add_rule combines declarative rules into a single compiled rule."""
+        location = generate_locations(1, 1, self.menu)[0]
+        set_rule(location, Has(self.names[0]))
+        add_rule(location, Has(self.names[1]))
+        self.assertEqual(get_compiled_rule(location.access_rule).rule, And(Has(self.names[1]), Has(self.names[0])))
+        add_rule(location, Has(self.names[2]), "or")
+        self.collect(2)
+        self.assertTrue(location.can_reach(self.state))
+
+    def test_region_rule_registers_indirect_condition(self):
+        """Ensure a region requirement on an entrance is registered as an indirect condition."""
+        target = Region("Target", 1, self.multiworld)
+        other = Region("Other", 1, self.multiworld)
+        self.multiworld.regions += [target, other]
+        self.menu.connect(other, "Menu -> Other", lambda state: state.has(self.names[0], 1))
+        entrance: Entrance = self.menu.create_exit("Menu -> Target")
+        entrance.connect(target)
+        set_rule(entrance, CanReachRegion("Other"))
+        self.assertIn(entrance, self.multiworld.indirect_connections[other])
+
+        self.assertFalse(target.can_reach(self.state))
+        self.collect(0)
+        self.assertTrue(target.can_reach(self.state))
@@ -3,10 +3,11 @@ import unittest
 
 from Options import Accessibility
 from test.general import generate_items, generate_locations, generate_test_multiworld
-from Fill import FillError, balance_multiworld_progression, fill_restrictive, \
-    distribute_early_items, distribute_items_restrictive
+from Fill import FillError, IncrementalPoolSweep, balance_multiworld_progression, fill_restrictive, \
+    distribute_early_items, distribute_items_restrictive, sweep_from_pool
 from BaseClasses import Entrance, LocationProgressType, MultiWorld, Region, Item, Location, \
     ItemClassification
+from worlds.generic.CompiledRules import Has
 from worlds.generic.Rules import CollectionRule, add_item_rule, locality_rules, set_rule
 
 
@@ -463,6 +464,44 @@ class TestFillRestrictive(unittest.TestCase):
         self.assertEqual(1, len(player1.prog_items))
         self.assertIsNot(loc0.item, player1.prog_items[0], "Filled item was still present in item pool")
 
+    def test_incremental_sweep_matches_full_sweep(self):
+        """Test that reusing sweep checkpoints places items the same way as re-sweeping the whole pool"""
+        def fill(incremental_sweep: bool) -> List[str]:
+            multiworld = generate_test_multiworld(3)
+            players = [generate_player_data(multiworld, player, prog_item_count=16) for player in range(1, 4)]
+            for player in players:
+                items = player.prog_items.copy()
+                other_items = players[player.id % 3].prog_items.copy()
+                player.generate_region(player.menu, 4)
+                region = player.generate_region(player.menu, 4, lambda state, i=items: state.has_all(
+                    names(i[:4]), i[0].player))
+                region = player.generate_region(region, 4, lambda state, i=other_items: state.has_all(
+                    names(i[4:8]), i[0].player))
+                player.generate_region(region, 4, lambda state, i=items: state.has_all(
+                    names(i[8:]), i[0].player))
+            locations = multiworld.get_unfilled_locations()
+            multiworld.random.shuffle(locations)
+            item_pool = [item for player in players for item in player.prog_items]
+            multiworld.random.shuffle(item_pool)
+            fill_restrictive(multiworld, multiworld.state, locations, item_pool, incremental_sweep=incremental_sweep)
+            return [f"{location.name}: {location.item.name}" for location in multiworld.get_filled_locations()]
+
+        self.assertEqual(fill(False), fill(True))
+
+    def test_incremental_sweep_per_player_locations(self):
+        """Test that a sweep checkpoint is not reused for the locations of another player"""
+        multiworld = generate_test_multiworld(2)
+        player1 = generate_player_data(multiworld, 1, 1, 1)
+        player2 = generate_player_data(multiworld, 2, 1, 1)
+        player1.locations[0].place_locked_item(player1.prog_items[0])
+        pool_sweep = IncrementalPoolSweep(multiworld.state)
+
+        for player in (player1, player2, player1):
+            locations = multiworld.get_filled_locations(player.id)
+            state = pool_sweep.sweep(player2.prog_items, lambda: player2.prog_items, locations)
+            expected = sweep_from_pool(multiworld.state, player2.prog_items, locations)
+            self.assertEqual(state.prog_items, expected.prog_items)
+
 
 class TestDistributeItemsRestrictive(unittest.TestCase):
     def test_basic_distribute(self):
@@ -834,6 +873,19 @@ class TestBalanceMultiworldProgression(unittest.TestCase):
         self.assertRegionContains(
             self.player1.regions[1], self.player2.prog_items[0])
 
+    def test_balances_progression_compiled_rules(self) -> None:
+        """Tests that progression balancing moves progression items earlier with indexed compiled rules"""
+        self.multiworld.worlds[self.player1.id].options.progression_balancing.value = 50
+        self.multiworld.worlds[self.player2.id].options.progression_balancing.value = 50
+        for player, region in ((self.player1, self.player1.regions[2]), (self.player2, self.player2.regions[1])):
+            for location in region.locations:
+                set_rule(location, Has(player.prog_items[0].name))
+
+        balance_multiworld_progression(self.multiworld)
+
+        self.assertRegionContains(
+            self.player1.regions[1], self.player2.prog_items[0])
+
     def test_skips_balancing_progression(self) -> None:
         """Test that progression balancing is skipped when players have it disabled"""
         self.multiworld.worlds[self.player1.id].options.progression_balancing.value = 0
@@ -847,6 +899,23 @@ class TestBalanceMultiworldProgression(unittest.TestCase):
         self.assertRegionContains(
             self.player1.regions[2], self.player2.prog_items[0])
 
+    def test_balancing_budget(self) -> None:
+        """Test that progression balancing stops balancing once its budget ran out"""
+        self.multiworld.worlds[self.player1.id].options.progression_balancing.value = 50
+        self.multiworld.worlds[self.player2.id].options.progression_balancing.value = 50
+
+        with self.assertLogs(level="WARNING") as logs:
+            balance_multiworld_progression(self.multiworld, time_limit=1e-9)
+        self.assertIn("ran out of its", logs.output[0])
+
+        self.assertRegionContains(
+            self.player1.regions[2], self.player2.prog_items[0])
+
+        balance_multiworld_progression(self.multiworld, max_rounds=1)
+
+        self.assertRegionContains(
+            self.player1.regions[1], self.player2.prog_items[0])
+
     def test_ignores_priority_locations(self) -> None:
         """Test that progression items on priority locations don't get moved by balancing"""
         self.multiworld.worlds[self.player1.id].options.progression_balancing.value = 50
@@ -0,0 +1,62 @@
+import tracemalloc
+import unittest
+
+from BaseClasses import CollectionState, Region
+from generation_profile import GenerationProfile
+from worlds.AutoWorld import call_all
+from worlds.generic.CompiledRules import Has, get_compiled_rule
+from worlds.generic.Rules import set_rule
+from . import generate_locations, generate_test_multiworld
+
+
+class TestGenerationProfile(unittest.TestCase):
+    def test_report(self):
+        """Ensure steps, phases and rule evaluations of an attached multiworld end up in the report."""
+        multiworld = generate_test_multiworld(2)
+        profile = GenerationProfile(top_rules=1, trace_memory=False)
+        profile.attach(multiworld)
+        for player in multiworld.player_ids:
+            generate_locations(2, player, multiworld.get_region("Menu", player))
+        call_all(multiworld, "generate_basic")
+        profile.instrument_rules(multiworld)
+        with profile.phase("fill"):
+            for location in multiworld.get_locations(1):
+                self.assertTrue(location.can_reach(CollectionState(multiworld)))
+
+        report = profile.to_dict()
+        self.assertEqual([step["player"] for step in report["steps"]], [1, 2])
+        self.assertIn("fill", report["phases"])
+        self.assertEqual(report["rule_evaluations"], {1: 2, 2: 0})
+        self.assertEqual(len(report["top_rules"]), 1)
+        self.assertEqual(report["top_rules"][0]["player"], 1)
+
+    def test_instrumented_rules(self):
+        """Ensure instrumented compiled rules stay marked and spots with the same name keep separate stats."""
+        multiworld = generate_test_multiworld()
+        menu = multiworld.get_region("Menu", 1)
+        other = Region("Other", 1, multiworld)
+        multiworld.regions.append(other)
+        location = generate_locations(1, 1, menu)[0]
+        set_rule(location, Has("Item 1"))
+        menu.connect(other, location.name)
+
+        profile = GenerationProfile(trace_memory=False)
+        profile.attach(multiworld)
+        profile.instrument_rules(multiworld)
+        self.assertIsNotNone(get_compiled_rule(location.access_rule))
+        location.access_rule(CollectionState(multiworld))
+        self.assertEqual(profile.rule_stats["location", 1, "Menu", location.name][0], 1)
+        self.assertEqual(profile.rule_stats["entrance", 1, "Menu", location.name][0], 0)
+
+    def test_overlapping_steps(self):
+        """Ensure a step starting while another one runs does not reset the peak memory of the other."""
+        profile = GenerationProfile()
+        if profile.started_tracing:
+            self.addCleanup(tracemalloc.stop)
+        profile.start_step()
+        data = bytearray(1 << 20)
+        profile.start_step()
+        profile.record_step(self.test_overlapping_steps, 0.0, None)
+        del data
+        profile.record_step(self.test_overlapping_steps, 0.0, None)
+        self.assertGreaterEqual(profile.steps[1]["peak_memory"], 1 << 20)
@@ -1,7 +1,10 @@
 import unittest
 
+from BaseClasses import CollectionState, PendingLocations, Region
 from worlds.AutoWorld import AutoWorldRegister, call_all
-from . import setup_solo_multiworld
+from worlds.generic.CompiledRules import Has, HasFromList
+from worlds.generic.Rules import set_rule
+from . import generate_items, generate_locations, generate_test_multiworld, setup_solo_multiworld
 
 
 class TestBase(unittest.TestCase):
@@ -27,3 +30,136 @@ class TestBase(unittest.TestCase):
                     with self.subTest("Step", step=step):
                         call_all(multiworld, step)
                         self.assertTrue(multiworld.get_all_state(False, allow_partial_entrances=True))
+
+
+class TestPendingLocations(unittest.TestCase):
+    def test_only_changed_players_are_rechecked(self):
+        """Ensure a sphere pass skips locations of players that did not collect anything since the last pass."""
+        multiworld = generate_test_multiworld(2)
+        locations = {player: generate_locations(1, player, multiworld.get_region("Menu", player))[0]
+                     for player in (1, 2)}
+        items = {player: generate_items(1, player, True)[0] for player in (1, 2)}
+        checks = {1: 0, 2: 0}
+
+        def counting_rule(player: int, item_name: str):
+            def rule(state: CollectionState) -> bool:
+                checks[player] += 1
+                return state.has(item_name, player)
+            return rule
+
+        for player, location in locations.items():
+            location.access_rule = counting_rule(player, items[player].name)
+            multiworld.worlds[player].own_items_logic = True
+        state = CollectionState(multiworld)
+        pending = PendingLocations(state, locations.values())
+
+        self.assertEqual(pending.pop_reachable(), set())
+        self.assertEqual(checks, {1: 1, 2: 1})
+        state.collect(items[1], True)
+        self.assertEqual(pending.pop_reachable(), {locations[1]})
+        self.assertEqual(checks, {1: 2, 2: 1})
+        self.assertEqual(pending.remaining(), {locations[2]})
+
+    def test_cross_player_rules_are_rechecked(self):
+        """Ensure locations of worlds without own_items_logic are re-checked when another player collects items."""
+        multiworld = generate_test_multiworld(2)
+        location = generate_locations(1, 2, multiworld.get_region("Menu", 2))[0]
+        item = generate_items(1, 1, True)[0]
+        location.access_rule = lambda state: state.has(item.name, 1)
+        multiworld.worlds[1].own_items_logic = True
+        state = CollectionState(multiworld)
+        pending = PendingLocations(state, [location])
+
+        self.assertEqual(pending.pop_reachable(), set())
+        state.collect(item, True)
+        self.assertEqual(pending.pop_reachable(), {location})
+
+    def test_compiled_rules_are_indexed(self):
+        """Ensure only locations whose compiled rules read a collected item or a new region are re-checked."""
+        multiworld = generate_test_multiworld(1)
+        menu = multiworld.get_region("Menu", 1)
+        cave = Region("Cave", 1, multiworld)
+        multiworld.regions.append(cave)
+        first, second, third = generate_locations(3, 1, menu)
+        inside = generate_locations(1, 1, cave, tag="_cave")[0]
+        key, other_key, door_key = generate_items(3, 1, True)
+        set_rule(first, Has(key.name))
+        set_rule(second, Has(other_key.name))
+        set_rule(third, HasFromList((key.name, other_key.name), 2))
+        set_rule(inside, Has(key.name))
+        menu.connect(cave, "Door", lambda state: state.has(door_key.name, 1))
+        state = CollectionState(multiworld)
+        pending = PendingLocations(state, (first, second, third, inside))
+        checked = []
+
+        def filter_reachable(locations):
+            checked.append(set(locations))
+            return CollectionState.filter_reachable(state, locations)
+
+        state.filter_reachable = filter_reachable
+        self.assertEqual(pending.pop_reachable(), set())
+        self.assertEqual(checked.pop(), {first, second, third, inside})
+        self.assertEqual(pending.pop_reachable(), set())
+        self.assertEqual(checked, [])
+        state.collect(key, True)
+        self.assertEqual(pending.pop_reachable(), {first})
+        self.assertEqual(checked.pop(), {first, third, inside})
+        state.collect(door_key, True)
+        self.assertEqual(pending.pop_reachable(), {inside})
+        self.assertEqual(checked.pop(), {inside})
+        state.collect(other_key, True)
+        self.assertEqual(pending.pop_reachable(), {second, third})
+        self.assertEqual(checked.pop(), {second, third})
+        self.assertFalse(pending)
+
+
+class TestStateSnapshot(unittest.TestCase):
+    def test_snapshot_copies_on_write(self):
+        """Ensure a snapshot only copies the containers of the players it writes to."""
+        multiworld = generate_test_multiworld(2)
+        items = {player: generate_items(1, player, True)[0] for player in (1, 2)}
+        state = CollectionState(multiworld)
+        snapshot = state.snapshot()
+        self.assertIs(state.prog_items[1], snapshot.prog_items[1])
+
+        snapshot.collect(items[1], True)
+        self.assertIsNot(state.prog_items[1], snapshot.prog_items[1])
+        self.assertIs(state.prog_items[2], snapshot.prog_items[2])
+        self.assertTrue(snapshot.has(items[1].name, 1))
+        self.assertFalse(state.has(items[1].name, 1))
+
+        state.collect(items[2], True)
+        self.assertTrue(state.has(items[2].name, 2))
+        self.assertFalse(snapshot.has(items[2].name, 2))
+
+    def test_set_item_unshares(self):
+        """Ensure values cached with set_item, like access rules do, stay in the snapshot that cached them."""
+        multiworld = generate_test_multiworld(1)
+        state = CollectionState(multiworld)
+        snapshot = state.snapshot()
+        snapshot.set_item("Cached Value", 1, 3)
+        self.assertEqual(snapshot.count("Cached Value", 1), 3)
+        self.assertEqual(state.count("Cached Value", 1), 0)
+        state.set_item("Cached Value", 1, 0)
+
+
+class TestSphereCache(unittest.TestCase):
+    def test_spheres_are_cached_until_placements_change(self):
+        """Ensure the sphere decomposition is reused until an item is placed."""
+        multiworld = generate_test_multiworld(1)
+        first, second, third = generate_locations(3, 1, multiworld.get_region("Menu", 1))
+        key, other_key = generate_items(2, 1, True)
+        second.access_rule = lambda state: state.has(key.name, 1)
+        third.access_rule = lambda state: state.has(other_key.name, 1)
+        multiworld.push_item(first, key, False)
+        multiworld.push_item(second, other_key, False)
+
+        decomposition = multiworld.get_sphere_decomposition()
+        self.assertEqual(decomposition.spheres, (frozenset({first}), frozenset({second})))
+        self.assertIs(multiworld.get_sphere_decomposition(), decomposition)
+
+        multiworld.push_item(third, generate_items(1, 1)[0], False)
+        decomposition = multiworld.get_sphere_decomposition()
+        self.assertEqual(decomposition.spheres, (frozenset({first}), frozenset({second}), frozenset({third})))
+        self.assertFalse(decomposition.unreachable)
+        self.assertEqual(list(multiworld.get_spheres()), [{first}, {second}, {third}])
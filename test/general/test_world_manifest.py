@@ -0,0 +1,151 @@
+import os
+import subprocess
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+import orjson
+
+import worlds
+from worlds import _matches_data_package, _open_world_manifest, _store_world_manifest, hint_blacklists, \
+    network_data_package
+from worlds.AutoWorld import AutoWorldRegister, WorldTypes
+from worlds.Files import PatchTypes
+
+
+class TestWorldTypes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.world_types = WorldTypes()
+        self.loads = 0
+
+    def load_source(self) -> None:
+        self.loads += 1
+        self.world_types["Game 1"] = type("Game1World", (), {"__file__": "game1"})  # type: ignore[assignment]
+        self.world_types["Game 2"] = type("Game2World", (), {"__file__": "game2"})  # type: ignore[assignment]
+
+    def test_pending_games(self) -> None:
+        """Pending games are listed without loading, and one access loads all games of the world source."""
+        self.world_types.add_pending("Game 1", self.load_source)
+        self.world_types.add_pending("Game 2", self.load_source)
+        self.assertEqual(list(self.world_types), ["Game 1", "Game 2"])
+        self.assertEqual(len(self.world_types), 2)
+        self.assertEqual(self.loads, 0)
+
+        self.assertEqual(self.world_types["Game 2"].__name__, "Game2World")
+        self.assertIn("Game 1", self.world_types)
+        self.assertEqual(self.loads, 1)
+        self.assertFalse(self.world_types.pending)
+        self.assertEqual(list(self.world_types), ["Game 1", "Game 2"])
+
+    def test_items_load_all(self) -> None:
+        self.world_types.add_pending("Game 1", self.load_source)
+        self.assertEqual([game for game, world_type in self.world_types.items()], ["Game 1", "Game 2"])
+        self.assertEqual(self.loads, 1)
+
+    def test_failed_load(self) -> None:
+        """A game that its world source did not register is gone after the attempt."""
+        self.world_types.add_pending("Game 3", lambda: None)
+        self.assertNotIn("Game 3", self.world_types)
+        self.assertEqual(len(self.world_types), 0)
+        with self.assertRaises(KeyError):
+            self.world_types["Game 3"]
+
+    def test_duplicate_game(self) -> None:
+        self.load_source()
+        with self.assertRaises(RuntimeError):
+            self.load_source()
+
+
+class TestPatchTypes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.patch_types = PatchTypes()
+        world_types = AutoWorldRegister.world_types
+        AutoWorldRegister.world_types = WorldTypes()
+        self.addCleanup(setattr, AutoWorldRegister, "world_types", world_types)
+        AutoWorldRegister.world_types.add_pending("Game 1", self.load_source)
+        self.loads = 0
+
+    def load_source(self) -> None:
+        self.loads += 1
+        self.patch_types[".apgame1"] = type("Game1Patch", (), {})  # type: ignore[assignment]
+
+    def test_pending_patch_types(self) -> None:
+        """Pending keys are listed without loading, and accessing one imports the world source of its game."""
+        self.patch_types.add_pending(".apgame1", "Game 1")
+        self.assertEqual(list(self.patch_types), [".apgame1"])
+        self.assertEqual(self.loads, 0)
+        self.assertEqual(self.patch_types[".apgame1"].__name__, "Game1Patch")
+        self.assertEqual(self.loads, 1)
+        self.assertFalse(self.patch_types.pending)
+
+    def test_failed_load(self) -> None:
+        self.patch_types.add_pending(".apgame3", "Game 3")
+        self.assertNotIn(".apgame3", self.patch_types)
+        self.assertEqual(len(self.patch_types), 0)
+
+
+class TestWorldManifest(unittest.TestCase):
+    def test_manifest_matches_worlds(self) -> None:
+        """Games taken from the world manifest are the same as the ones of their imported world types."""
+        for game, world_type in AutoWorldRegister.world_types.items():
+            if game not in hint_blacklists:
+                continue  # registered after worlds were loaded
+            with self.subTest(game=game):
+                game_package = network_data_package["games"][game]
+                self.assertEqual(game_package["item_name_to_id"], world_type.item_name_to_id)
+                self.assertEqual(game_package["location_name_to_id"], world_type.location_name_to_id)
+                self.assertEqual(hint_blacklists[game], world_type.hint_blacklist)
+
+    def test_matches_data_package(self) -> None:
+        """The data package check that replaces get_data_package_data notices a different order of the tables."""
+        world_type = next(world_type for world_type in AutoWorldRegister.world_types.values()
+                          if len(world_type.item_name_to_id) > 1)
+        game_package = world_type.get_data_package_data()
+        self.assertTrue(_matches_data_package(world_type, game_package))
+        reordered = {**game_package, "item_name_to_id": dict(reversed(game_package["item_name_to_id"].items()))}
+        self.assertFalse(_matches_data_package(world_type, reordered))  # type: ignore[arg-type]
+        group_name = next(iter(game_package["item_name_groups"]))
+        changed_group = {**game_package["item_name_groups"], group_name: []}
+        self.assertFalse(_matches_data_package(world_type, {**game_package, "item_name_groups": changed_group}))
+
+    def test_store_and_open(self) -> None:
+        packages = {f"Game {index}": {"item_name_to_id": {f"Item {index}": index}, "checksum": str(index)}
+                    for index in range(3)}
+        sources = {
+            "hash1": {"mtime_ns": 1, "size": 2, "hash": "hash1", "path": "first",
+                      "games": {game: {"checksum": packages[game]["checksum"], "hint_blacklist": [game],
+                                       "offset": 0, "length": 0} for game in ("Game 0", "Game 1")},
+                      "patches": {".apgame0": "Game 0"}},
+            "hash2": {"mtime_ns": 3, "size": 4, "hash": "hash2", "path": "second",
+                      "games": {"Game 2": {"checksum": "2", "hint_blacklist": [], "offset": 0, "length": 0}},
+                      "patches": {}},
+        }
+        world_manifest_path = worlds.world_manifest_path
+        with TemporaryDirectory() as temp_dir:
+            worlds.world_manifest_path = os.path.join(temp_dir, "world_manifest.bin")
+            self.addCleanup(setattr, worlds, "world_manifest_path", world_manifest_path)
+            _store_world_manifest("core", sources, {game: orjson.dumps(package) for game, package in packages.items()})
+            with _open_world_manifest("core") as (manifest, data, data_start):
+                self.assertEqual(manifest, sources)
+                for source in manifest.values():
+                    for game, entry in source["games"].items():
+                        offset = data_start + entry["offset"]
+                        self.assertEqual(orjson.loads(data[offset:offset + entry["length"]]), packages[game])
+            with _open_world_manifest("other core") as (manifest, data, data_start):
+                self.assertEqual(manifest, {})
+
+    def test_patch_handler_from_manifest(self) -> None:
+        """With an up-to-date world manifest, patch types resolve by file ending and game by importing their world."""
+        self.assertTrue(os.path.isfile(worlds.world_manifest_path), "world manifest was not stored")
+        script = (
+            "import json, worlds\n"
+            "from worlds.Files import AutoPatchRegister\n"
+            "pending = 'A Link to the Past' in AutoPatchRegister.patch_types.pending\n"
+            "handler = AutoPatchRegister.get_handler('AP_1_P1_Player.aplttp')\n"
+            "print(json.dumps([pending, handler and handler.patch_file_ending,\n"
+            "                  AutoPatchRegister.patch_types['A Link to the Past'] is handler,\n"
+            "                  bool(worlds.AutoWorldRegister.world_types.pending)]))\n"
+        )
+        output = subprocess.run([sys.executable, "-c", script], cwd=worlds.local_path(), capture_output=True,
+                                stdin=subprocess.DEVNULL, text=True, check=True).stdout
+        self.assertEqual(orjson.loads(output.splitlines()[-1]), [True, ".aplttp", True, True])
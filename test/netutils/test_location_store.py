@@ -3,7 +3,7 @@ import os
 import typing
 import unittest
 import warnings
-from NetUtils import LocationStore, _LocationStore
+from NetUtils import LocationStore, _LocationStore, pack_locations
 
 State = typing.Dict[typing.Tuple[int, int], typing.Set[int]]
 RawLocations = typing.Dict[int, typing.Dict[int, typing.Tuple[int, int, int]]]
@@ -265,6 +265,35 @@ class TestSpeedupsLocationStore(Base.TestLocationStore):
         super().setUp()
 
 
+class TestPackedPurePythonLocationStore(Base.TestLocationStore):
+    """Run base method tests for pure python implementation loaded from packed locations."""
+    def setUp(self) -> None:
+        self.store = _LocationStore.from_packed(pack_locations(sample_data))
+        super().setUp()
+
+
+@unittest.skipIf(LocationStore is _LocationStore and not ci, "_speedups not available")
+class TestPackedSpeedupsLocationStore(Base.TestLocationStore):
+    """Run base method tests for cython implementation using packed locations in place."""
+    def setUp(self) -> None:
+        self.assertFalse(LocationStore is _LocationStore, "Failed to load _speedups")
+        self.store = LocationStore.from_packed(pack_locations(sample_data))
+        super().setUp()
+
+    def test_unaligned(self) -> None:
+        packed = bytearray(b"\0" + pack_locations(sample_data))
+        store = LocationStore.from_packed(memoryview(packed)[1:])
+        self.assertEqual(store[1][11], (21, 2, 7))
+        self.assertEqual(len(store[5]), 1)
+
+    def test_invalid(self) -> None:
+        packed = pack_locations(sample_data)
+        with self.assertRaises(ValueError):
+            LocationStore.from_packed(packed[:-1])
+        with self.assertRaises(ValueError):
+            LocationStore.from_packed(packed[:8] + packed[40:72] + packed[8:40] + packed[72:])  # not sorted
+
+
 @unittest.skipIf(LocationStore is _LocationStore and not ci, "_speedups not available")
 class TestSpeedupsLocationStoreConstructor(Base.TestLocationStoreConstructor):
     """Run base constructor tests and tests the additional constraints for cython implementation."""
@@ -0,0 +1,62 @@
+import unittest
+import zlib
+
+from NetUtils import LEGACY_MULTIDATA_FORMAT_VERSION, MULTIDATA_FORMAT_VERSION, LazySlotData, LocationStore, \
+    NetworkSlot, SlotType, decode_multidata, encode_multidata
+from Utils import restricted_loads
+
+
+class TestMultidataContainer(unittest.TestCase):
+    multidata = {
+        "slot_info": {
+            1: NetworkSlot("Player1", "Archipelago", SlotType.player),
+            2: NetworkSlot("Player2", "Archipelago", SlotType.player),
+        },
+        "locations": {
+            1: {10: (100, 2, 1), 11: (101, 1, 0)},
+            2: {},
+        },
+        "slot_data": {
+            1: {"option": 1},
+            2: {"option": [2, 3]},
+        },
+        "seed_name": "12345",
+    }
+
+    def test_round_trip(self) -> None:
+        decoded = decode_multidata(encode_multidata(self.multidata, MULTIDATA_FORMAT_VERSION))
+        self.assertIsInstance(decoded["locations"], LocationStore)
+        self.assertEqual(dict(decoded["locations"][1].items()), self.multidata["locations"][1])
+        self.assertEqual(len(decoded["locations"][2]), 0)
+        self.assertEqual(dict(decoded["slot_data"]), self.multidata["slot_data"])
+        self.assertEqual(decoded["slot_info"], self.multidata["slot_info"])
+        self.assertEqual(decoded["seed_name"], "12345")
+
+    def test_legacy_format(self) -> None:
+        """Ensure the default format can be read by servers that only support version 3, also after decoding 4."""
+        data = encode_multidata(self.multidata)
+        self.assertEqual(data[0], LEGACY_MULTIDATA_FORMAT_VERSION)
+        self.assertEqual(restricted_loads(zlib.decompress(data[1:])), self.multidata)
+
+        decoded = decode_multidata(encode_multidata(self.multidata, MULTIDATA_FORMAT_VERSION))
+        data = encode_multidata(decoded, LEGACY_MULTIDATA_FORMAT_VERSION)
+        self.assertEqual(restricted_loads(zlib.decompress(data[1:])), self.multidata)
+
+    def test_lazy_slot_data(self) -> None:
+        slot_data = decode_multidata(encode_multidata(self.multidata, MULTIDATA_FORMAT_VERSION))["slot_data"]
+        self.assertEqual(list(slot_data), [1, 2])
+        self.assertEqual(slot_data._decoded, {})
+        self.assertEqual(slot_data[2], {"option": [2, 3]})
+        self.assertEqual(list(slot_data._decoded), [2])
+        self.assertIs(slot_data[2], slot_data[2])
+
+    def test_evict_idle_slot_data(self) -> None:
+        slot_data = LazySlotData.from_dict(self.multidata["slot_data"])
+        self.assertEqual(slot_data[1], {"option": 1})
+        self.assertEqual(slot_data.evict_idle(60), 1, "recently used slot_data should be kept")
+        self.assertEqual(slot_data.evict_idle(0), 0)
+        self.assertEqual(slot_data._decoded, {})
+        self.assertEqual(slot_data[1], {"option": 1}, "evicted slot_data should be decoded again")
+        with self.assertRaises(KeyError):
+            slot_data[3]
+        self.assertEqual(slot_data.evict_idle(60), 1)
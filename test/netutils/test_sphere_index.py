@@ -0,0 +1,33 @@
+import unittest
+
+from NetUtils import SphereIndex
+
+
+class TestSphereIndex(unittest.TestCase):
+    spheres = [
+        {1: {11, 12}, 2: {21}},
+        {1: {13}},
+        {2: {23, 22}, 3: {9}},
+    ]
+
+    def test_get(self) -> None:
+        index = SphereIndex(self.spheres)
+        self.assertTrue(index)
+        for sphere_number, sphere in enumerate(self.spheres):
+            for player, location_ids in sphere.items():
+                for location_id in location_ids:
+                    self.assertEqual(index.get(player, location_id), sphere_number)
+        with self.assertRaises(KeyError):
+            index.get(1, 21)
+        with self.assertRaises(KeyError):
+            index.get(4, 9)
+        self.assertEqual(index.get(1, 14, -1), -1)
+
+    def test_get_many(self) -> None:
+        index = SphereIndex(self.spheres)
+        self.assertEqual(index.get_many(2, [23, 21, 22]), [2, 0, 2])
+        self.assertEqual(index.get_many(1, [13, 99], -1), [1, -1])
+        self.assertEqual(index.get_many(1, []), [])
+
+    def test_empty(self) -> None:
+        self.assertFalse(SphereIndex([]))
@@ -0,0 +1,239 @@
+import asyncio
+import base64
+import json
+import unittest
+from typing import Any
+
+from worlds._bizhawk import FRAME_HEADER, MEMORY_DATA_FIELDS, BizHawkContext, ConnectionStatus, disconnect, \
+    enable_binary_framing, get_script_version, get_watched, guarded_read, guarded_write, ping, read, send_requests, \
+    unwatch, watch
+
+
+class FakeConnector:
+    """Stand-in for connector_bizhawk_generic.lua running in BizHawk, serving requests from memory that tests can change
+    between requests. Memory data in requests and responses is kept as bytes and only encoded for the connection."""
+
+    def __init__(self, memory: dict[str, bytearray], script_version: int = 3) -> None:
+        self.memory = memory
+        self.script_version = script_version
+        self.watches: dict[int, list[Any]] = {}
+        self.next_watch_id = 1
+        self.updates: list[dict[str, Any]] = []
+        self.server: asyncio.Server | None = None
+        self.writers: list[asyncio.StreamWriter] = []
+        self.binary_framing = False
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+    async def start(self) -> int:
+        """Starts listening on a free port and returns it."""
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for writer in self.writers:
+            writer.close()
+            await writer.wait_closed()
+
+    def read(self, address: int, size: int, domain: str) -> bytes:
+        return bytes(self.memory[domain][address:address + size])
+
+    def process_request(self, req: dict[str, Any]) -> dict[str, Any]:
+        if req["type"] == "PING":
+            return {"type": "PONG"}
+        if req["type"] == "GUARD":
+            expected_data = req["expected_data"]
+            valid = self.read(req["address"], len(expected_data), req["domain"]) == expected_data
+            return {"type": "GUARD_RESPONSE", "value": valid, "address": req["address"]}
+        if req["type"] == "READ":
+            return {"type": "READ_RESPONSE", "value": self.read(req["address"], req["size"], req["domain"])}
+        if req["type"] == "WRITE":
+            value = req["value"]
+            self.memory[req["domain"]][req["address"]:req["address"] + len(value)] = value
+            return {"type": "WRITE_RESPONSE"}
+        if req["type"] == "WATCH":
+            data = self.read(req["address"], req["size"], req["domain"])
+            self.watches[self.next_watch_id] = [req["address"], req["size"], req["domain"], data]
+            self.next_watch_id += 1
+            return {"type": "WATCH_RESPONSE", "id": self.next_watch_id - 1, "value": data}
+        if req["type"] == "UNWATCH":
+            self.watches.pop(req["id"], None)
+            return {"type": "UNWATCH_RESPONSE"}
+        return {"type": "ERROR", "err": f"Unknown command: {req['type']}"}
+
+    def get_watch_changes(self) -> list[dict[str, Any]]:
+        changes: list[dict[str, Any]] = []
+        for watch_id, watched in self.watches.items():
+            data = self.read(*watched[:3])
+            if data != watched[3]:
+                watched[3] = data
+                changes.append({"id": watch_id, "value": data})
+        return changes
+
+    async def receive(self, reader: asyncio.StreamReader) -> tuple[bytes, bytes]:
+        if not self.binary_framing:
+            message = await reader.readline()
+            self.bytes_received += len(message)
+            return message.rstrip(b"\n"), b""
+
+        try:
+            message_size, data_size = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+            frame = await reader.readexactly(message_size + data_size)
+        except asyncio.IncompleteReadError:
+            return b"", b""
+        self.bytes_received += FRAME_HEADER.size + len(frame)
+        return frame[:message_size], frame[message_size:]
+
+    def send(self, writer: asyncio.StreamWriter, message: bytes, data: bytes = b"") -> None:
+        if self.binary_framing:
+            message = FRAME_HEADER.pack(len(message), len(data)) + message + data
+        else:
+            message += b"\n"
+        self.bytes_sent += len(message)
+        writer.write(message)
+
+    def encode_memory_data(self, fields: list[tuple[dict[str, Any], str]]) -> bytes:
+        data: list[bytes] = []
+        for item, field in fields:
+            if self.binary_framing:
+                data.append(item[field])
+                item[field] = len(item[field])
+            else:
+                item[field] = base64.b64encode(item[field]).decode("ascii")
+        return b"".join(data)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.writers.append(writer)
+        self.watches.clear()
+        self.binary_framing = False
+        while True:
+            message, data = await self.receive(reader)
+            if not message:
+                break
+            if message == b"VERSION":
+                self.send(writer, str(self.script_version).encode())
+                continue
+            if message == b"BINARY" and self.script_version >= 3:
+                self.send(writer, b"BINARY")
+                self.binary_framing = True
+                continue
+
+            reqs = json.loads(message)
+            offset = 0
+            for req in reqs:
+                field = MEMORY_DATA_FIELDS.get(req["type"])
+                if field is not None:
+                    if self.binary_framing:
+                        req[field], offset = data[offset:offset + req[field]], offset + req[field]
+                    else:
+                        req[field] = base64.b64decode(req[field])
+
+            res: list[dict[str, Any]] = []
+            for req in reqs:
+                if res and res[-1]["type"] == "GUARD_RESPONSE" and not res[-1]["value"]:
+                    res.append(res[-1])
+                else:
+                    res.append(self.process_request(req))
+
+            changes = self.get_watch_changes()
+            if changes:
+                data = self.encode_memory_data([(change, "value") for change in changes])
+                update = {"type": "WATCH_UPDATE", "changes": changes}
+                self.updates.append(update)
+                self.send(writer, json.dumps(update).encode(), data)
+            data = self.encode_memory_data([(response, MEMORY_DATA_FIELDS[response["type"]])
+                                            for response in res if response["type"] in MEMORY_DATA_FIELDS])
+            self.send(writer, json.dumps(res).encode(), data)
+            await writer.drain()
+
+
+class TestBizHawkWatches(unittest.IsolatedAsyncioTestCase):
+    script_version = 3
+    binary_framing = False
+
+    async def asyncSetUp(self) -> None:
+        self.memory = {"RAM": bytearray(range(256)), "ROM": bytearray(b"MYGAME")}
+        self.connector = FakeConnector(self.memory, self.script_version)
+        port = await self.connector.start()
+        self.ctx = BizHawkContext()
+        self.ctx.streams = await asyncio.open_connection("127.0.0.1", port)
+        self.ctx.connection_status = ConnectionStatus.TENTATIVE
+        if self.binary_framing:
+            self.assertTrue(await enable_binary_framing(self.ctx))
+
+    async def asyncTearDown(self) -> None:
+        disconnect(self.ctx)
+        await self.connector.close()
+
+    async def test_requests(self) -> None:
+        self.assertEqual(await get_script_version(self.ctx), self.script_version)
+        self.assertEqual(await read(self.ctx, [(0, 6, "ROM"), (4, 2, "RAM")]), [b"MYGAME", b"\x04\x05"])
+        self.assertIsNone(await guarded_read(self.ctx, [(0, 6, "ROM")], [(1, b"\0", "RAM")]))
+        self.assertFalse(await guarded_write(self.ctx, [(0, [0xFF], "RAM")], [(1, [0], "RAM")]))
+        self.assertTrue(await guarded_write(self.ctx, [(0, [0xFF], "RAM"), (2, b"\n\n", "RAM")], [(1, [1], "RAM")]))
+        self.assertEqual(self.memory["RAM"][:4], b"\xFF\x01\n\n")
+        self.assertEqual(self.ctx.connection_status, ConnectionStatus.CONNECTED)
+
+    async def test_send_requests(self) -> None:
+        """Memory data of requests sent with send_requests is base64 regardless of framing."""
+        res = await send_requests(self.ctx, [{"type": "WRITE", "address": 0, "value": "AAE=", "domain": "ROM"},
+                                             {"type": "READ", "address": 0, "size": 3, "domain": "ROM"}])
+        self.assertEqual(res, [{"type": "WRITE_RESPONSE"}, {"type": "READ_RESPONSE", "value": "AAFH"}])
+
+    async def test_watch(self) -> None:
+        """Changed watched data is sent along with the next response, and only the ranges that changed are sent."""
+        watch_ids = await watch(self.ctx, [(0x10, 4, "RAM"), (0x20, 2, "RAM")])
+        self.assertEqual(get_watched(self.ctx, watch_ids), [bytes(range(0x10, 0x14)), bytes(range(0x20, 0x22))])
+
+        await ping(self.ctx)
+        self.assertEqual(self.connector.updates, [])
+
+        self.memory["RAM"][0x21] = 0
+        self.assertEqual(get_watched(self.ctx, watch_ids)[1], b"\x20\x21")
+        await ping(self.ctx)
+        self.assertEqual(get_watched(self.ctx, watch_ids), [bytes(range(0x10, 0x14)), b"\x20\x00"])
+        self.assertEqual([[change["id"] for change in update["changes"]] for update in self.connector.updates],
+                         [[watch_ids[1]]])
+
+    async def test_unwatch(self) -> None:
+        watch_ids = await watch(self.ctx, [(0x10, 4, "RAM"), (0x20, 2, "RAM")])
+        await unwatch(self.ctx, watch_ids[:1])
+        self.assertIsNone(get_watched(self.ctx, watch_ids))
+        self.memory["RAM"][0x10:0x22] = bytes(0x12)
+        await ping(self.ctx)
+        self.assertEqual(get_watched(self.ctx, watch_ids[1:]), [b"\0\0"])
+        self.assertEqual([[change["id"] for change in update["changes"]] for update in self.connector.updates],
+                         [[watch_ids[1]]])
+
+    async def test_disconnect(self) -> None:
+        """Watches are dropped with the connection."""
+        watch_ids = await watch(self.ctx, [(0, 1, "ROM")])
+        disconnect(self.ctx)
+        self.assertIsNone(get_watched(self.ctx, watch_ids))
+
+
+class TestBizHawkBinaryFraming(TestBizHawkWatches):
+    binary_framing = True
+
+    async def test_large_read(self) -> None:
+        """Memory data is sent as is, without base64."""
+        self.memory["RAM"] = bytearray(range(256)) * 64
+        bytes_sent = self.connector.bytes_sent
+        self.assertEqual(await read(self.ctx, [(0, 0x4000, "RAM")]), [bytes(self.memory["RAM"])])
+        self.assertLess(self.connector.bytes_sent - bytes_sent, 0x4000 + 100)
+
+
+class TestBizHawkFramingFallback(unittest.IsolatedAsyncioTestCase):
+    async def test_old_script(self) -> None:
+        """Connector scripts from before binary frames keep using JSON lines."""
+        connector = FakeConnector({"ROM": bytearray(b"MYGAME")}, script_version=2)
+        port = await connector.start()
+        self.addAsyncCleanup(connector.close)
+        ctx = BizHawkContext()
+        ctx.streams = await asyncio.open_connection("127.0.0.1", port)
+        self.addCleanup(disconnect, ctx)
+        self.assertFalse(await enable_binary_framing(ctx))
+        self.assertEqual(await read(ctx, [(0, 6, "ROM")]), [b"MYGAME"])
@@ -93,3 +93,26 @@ class TestCommonContext(unittest.IsolatedAsyncioTestCase):
         assert self.ctx.item_names.lookup_in_slot(-1, 3) == "Nothing"
         assert self.ctx.item_names.lookup_in_game(-1, "__TestGame1") == "Nothing"
         assert self.ctx.item_names.lookup_in_game(-1, "__TestGame2") == "Nothing"
+
+    async def test_received_items_opt_in(self):
+        """Ensure resuming received items and columnar items are only used by clients that opt in."""
+        sent = []
+
+        async def send_msgs(msgs):
+            sent.extend(msgs)
+
+        self.ctx.send_msgs = send_msgs
+        self.ctx.items_received = [NetUtils.NetworkItem(2**54 + 1, 2**54 + 1, 2, 0)]
+        self.ctx.reset_server_state()
+        self.assertEqual(self.ctx.previous_items_received, [])
+        await self.ctx.send_connect()
+        self.assertFalse(sent[0]["columnar_items"])
+        self.assertNotIn("items_checkpoint", sent[0])
+
+        sent.clear()
+        self.ctx.resume_received_items = self.ctx.columnar_items = True
+        self.ctx.items_received = [NetUtils.NetworkItem(2**54 + 1, 2**54 + 1, 2, 0)]
+        self.ctx.reset_server_state()
+        await self.ctx.send_connect()
+        self.assertTrue(sent[0]["columnar_items"])
+        self.assertEqual(sent[0]["items_checkpoint"], NetUtils.get_items_checkpoint(self.ctx.previous_items_received))
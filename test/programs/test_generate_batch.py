@@ -0,0 +1,60 @@
+# Tests for GenerateBatch.py
+
+import os
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import Generate
+import GenerateBatch
+import Main
+
+
+class TestGenerateBatch(unittest.TestCase):
+    generate_dir = Path(Generate.__file__).parent
+    input_dir = Path(__file__).parent / "data" / "one_player"
+
+    def setUp(self):
+        self.original_cwd = os.getcwd()
+        self.original_local_path = Generate.Utils.local_path.cached_path
+        self.original_user_path = Generate.Utils.user_path.cached_path
+        Generate.Utils.user_path.cached_path = Generate.Utils.local_path.cached_path = str(self.generate_dir)
+        os.chdir(self.generate_dir / "test")
+        self.output_tempdir = TemporaryDirectory(prefix="AP_out_")
+
+    def tearDown(self):
+        self.output_tempdir.cleanup()
+        os.chdir(self.original_cwd)
+        Generate.Utils.local_path.cached_path = self.original_local_path
+        Generate.Utils.user_path.cached_path = self.original_user_path
+
+    def test_batch_matches_standalone(self):
+        """Ensure a batch job generates the same output as a standalone Generate.py run with the same seed."""
+        batch_dir = os.path.join(self.output_tempdir.name, "batch")
+        standalone_dir = os.path.join(self.output_tempdir.name, "standalone")
+        arguments = f"--seed 0 --multi 1 --player_files_path \"{self.input_dir}\" --spoiler 1 --outputpath"
+        results = {}
+
+        GenerateBatch.run_batch([("valid", f"{arguments} \"{batch_dir}\""), ("invalid", "--no_such_argument")],
+                                on_done=lambda name, seed_name, exception: results.update({name: (seed_name,
+                                                                                                  exception)}))
+        Main.main(*Generate.main(GenerateBatch.parse_job(f"{arguments} \"{standalone_dir}\"")))
+
+        self.assertIsNone(results["valid"][1])
+        self.assertIsInstance(results["invalid"][1], ValueError)
+        batch_zip, = Path(batch_dir).glob("*.zip")
+        standalone_zip, = Path(standalone_dir).glob("*.zip")
+        self.assertEqual(batch_zip.name, standalone_zip.name)
+        self.assertEqual(batch_zip.name, f"AP_{results['valid'][0]}.zip")
+        with zipfile.ZipFile(batch_zip) as batch, zipfile.ZipFile(standalone_zip) as standalone:
+            self.assertEqual(batch.namelist(), standalone.namelist())
+            spoiler = next(name for name in batch.namelist() if name.endswith("_Spoiler.txt"))
+            self.assertEqual(batch.read(spoiler), standalone.read(spoiler))
+
+    def test_preload_worlds(self):
+        """Preloading imports the worlds that the world manifest lets skip at startup."""
+        from worlds import AutoWorldRegister
+
+        GenerateBatch.preload_worlds()
+        self.assertFalse(AutoWorldRegister.world_types.pending)
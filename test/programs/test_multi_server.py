@@ -1,5 +1,23 @@
+import asyncio
+import collections
+import copy
+import gc
+import os
+import re
+import tempfile
 import unittest
-from MultiServer import Context, ServerCommandProcessor
+import weakref
+import zlib
+
+import websockets
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+
+from MultiServer import Context, PrefixSubscriptions, SaveJournal, ServerCommandProcessor, broadcast_shared_frames, \
+    get_resync_items, get_server_extensions, min_columnar_items, process_client_cmd, shared_frames_supported, \
+    shared_frames_websockets_versions
+from NetUtils import ClientStatus, Hint, HintStatus, LazySlotData, NetworkItem, decode_item_columns, \
+    get_items_checkpoint
+from Utils import local_path
 
 
 class TestResolvePlayerName(unittest.TestCase):
@@ -38,3 +56,423 @@ class TestResolvePlayerName(unittest.TestCase):
         assert p.resolve_player("ABC") == (1, 2, "abc"), "case insensitive resolves when 1 match"
         assert p.resolve_player("abcd") == (1, 3, "abCD"), "case insensitive resolves when 1 match"
         assert not p.resolve_player("aB"), "partial name shouldn't resolve to player"
+
+
+class TestSaveJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "test.apsave.journal")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    @staticmethod
+    def get_save() -> dict:
+        return {
+            "version": 2,
+            "location_checks": {(0, 1): {1}},
+            "received_items": {},
+            "client_game_state": {(0, 1): ClientStatus.CLIENT_UNKNOWN},
+            "client_activity_timers": (((0, 1), 1.0),),
+            "name_aliases": {(0, 1): "Alias"},
+            "random_state": (1, 2, 3),
+            "stored_data": {},
+            "game_options": {"hint_cost": 10},
+        }
+
+    def get_changes(self, journal: SaveJournal, save: dict) -> list:
+        """Collects the changes of save like Context does, with the dict fields read from save itself."""
+        def get_entry(field: str, key):
+            container = dict(save[field]) if field in SaveJournal.pair_fields else save[field]
+            return copy.copy(container[key])
+
+        return journal.get_changes(save.__getitem__, get_entry)
+
+    def test_journal_replays_changes(self) -> None:
+        """Ensure only marked changes get appended to the journal and replaying them restores the save."""
+        save = self.get_save()
+        journal = SaveJournal(self.path)
+        journal.next_epoch(save)
+        snapshot = copy.deepcopy(save)
+        journal.start(1000)
+        self.assertEqual(self.get_changes(journal, save), [])
+
+        save["location_checks"][0, 1].add(2)
+        journal.mark("location_checks", (0, 1))
+        save["received_items"][0, 1, True] = [NetworkItem(3, 2, 1, 0)]
+        journal.mark("received_items", (0, 1, True))
+        save["stored_data"]["key"] = [1]
+        journal.mark("stored_data", "key")
+        save["name_aliases"][0, 1] = "Unmarked"
+        changes = self.get_changes(journal, save)
+        self.assertEqual(len(changes), 3)
+        journal.append(changes)
+        self.assertEqual(self.get_changes(journal, save), [])
+
+        save["stored_data"]["key"].append(2)
+        journal.mark("stored_data", "key")
+        save["client_game_state"][0, 1] = ClientStatus.CLIENT_GOAL
+        journal.mark("client_game_state", (0, 1))
+        save["client_activity_timers"] = (((0, 1), 2.0),)
+        journal.mark("client_activity_timers", (0, 1))
+        del save["name_aliases"][0, 1]
+        journal.mark("name_aliases", (0, 1))
+        save["random_state"] = (3, 2, 1)
+        save["game_options"] = {"hint_cost": 5}
+        journal.append(self.get_changes(journal, save))
+        with open(self.path, "ab") as f:
+            f.write(b"\x10\x00")  # interrupted write
+
+        loaded = SaveJournal(self.path)
+        loaded.load(snapshot)
+        self.assertEqual(snapshot, save)
+
+    def test_received_items_extend(self) -> None:
+        """Ensure only the new items of a list in received_items get journaled."""
+        save = self.get_save()
+        save["received_items"][0, 1, True] = [NetworkItem(1, 2, 1, 0)]
+        journal = SaveJournal(self.path)
+        journal.next_epoch(save)
+        snapshot = copy.deepcopy(save)
+        journal.start(1000)
+
+        new_items = [NetworkItem(2, 2, 1, 0), NetworkItem(3, 2, 1, 0)]
+        save["received_items"][0, 1, True].extend(new_items)
+        journal.mark("received_items", (0, 1, True))
+        changes = self.get_changes(journal, save)
+        self.assertEqual(changes, [("extend", "received_items", (0, 1, True), new_items)])
+        journal.append(changes)
+        journal.mark("received_items", (0, 1, True))
+        self.assertEqual(self.get_changes(journal, save), [])
+
+        SaveJournal(self.path).load(snapshot)
+        self.assertEqual(snapshot, save)
+
+    def test_snapshot_replaces_journal(self) -> None:
+        """Ensure a journal is not replayed onto a snapshot of a later epoch."""
+        save = self.get_save()
+        journal = SaveJournal(self.path)
+        journal.next_epoch(save)
+        journal.start(1000)
+        del save["name_aliases"][0, 1]
+        journal.mark("name_aliases", (0, 1))
+        journal.append(self.get_changes(journal, save))
+
+        journal.next_epoch(save)
+        save["name_aliases"][0, 1] = "New Alias"
+        SaveJournal(self.path).load(save)
+        self.assertEqual(save["name_aliases"], {(0, 1): "New Alias"})
+
+
+class TestHintIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        # only one Context can load the data package per process, so skip __init__ for the hint bookkeeping
+        self.ctx = Context.__new__(Context)
+        self.ctx.hints = collections.defaultdict(set)
+        self.ctx.hint_index = {}
+        self.ctx.location_checks = collections.defaultdict(set)
+        self.ctx.groups = {}
+        self.ctx.save_journal = None
+
+    def add_hint(self, hint: Hint) -> None:
+        for slot in (hint.receiving_player, hint.finding_player):
+            self.ctx.hints[0, slot].add(hint)
+        self.ctx.index_hint(0, hint)
+
+    def test_check_updates_indexed_hints(self) -> None:
+        hint = Hint(1, 2, 100, 200, False)
+        other_hint = Hint(1, 2, 101, 201, False)
+        self.add_hint(hint)
+        self.add_hint(other_hint)
+
+        self.ctx.location_checks[0, 2].add(100)
+        changed = set()
+        self.ctx.recheck_hints_for_locations(0, 2, {100}, changed)
+        self.assertEqual(changed, {(0, 1), (0, 2)})
+        found_hint = hint._replace(found=True, status=HintStatus.HINT_FOUND)
+        for slot in (1, 2):
+            self.assertIn(found_hint, self.ctx.hints[0, slot])
+            self.assertIn(other_hint, self.ctx.hints[0, slot])
+        self.assertNotIn((0, 2, 100), self.ctx.hint_index)
+
+        changed.clear()
+        self.ctx.recheck_hints_for_locations(0, 1, {101}, changed)
+        self.assertEqual(changed, set(), "a location of another finding player should not affect the hint")
+
+    def test_replaced_hint_stays_indexed(self) -> None:
+        hint = Hint(1, 2, 100, 200, False)
+        self.add_hint(hint)
+        prioritized = hint._replace(status=HintStatus.HINT_PRIORITY)
+        for slot in (1, 2):
+            self.ctx.replace_hint(0, slot, hint, prioritized)
+
+        self.ctx.location_checks[0, 2].add(100)
+        changed = set()
+        self.ctx.recheck_hints_for_locations(0, 2, {100}, changed)
+        self.assertEqual(changed, {(0, 1), (0, 2)})
+        self.assertEqual(self.ctx.hints[0, 1], {hint._replace(found=True, status=HintStatus.HINT_FOUND)})
+
+
+class TestSharedFrames(unittest.TestCase):
+    class Socket:
+        _fragmented_message_waiter = None
+
+        def __init__(self, extensions) -> None:
+            self.extensions = extensions
+            self.written = []
+            self.transport = self
+
+        def write(self, data: bytes) -> None:
+            self.written.append(data)
+
+    def test_broadcast_shared_frames(self) -> None:
+        msg = '[{"cmd": "PrintJSON", "data": [{"text": "Hello"}]}]'
+        shared = [self.Socket([PerMessageDeflate(False, True, 12, 12, {"memLevel": 5})]) for _ in range(3)]
+        uncompressed = self.Socket([])
+        context_takeover = self.Socket([PerMessageDeflate(False, False, 12, 12)])
+
+        remaining = broadcast_shared_frames([*shared, uncompressed, context_takeover], msg)
+        self.assertEqual(remaining, [context_takeover])
+        self.assertEqual(context_takeover.written, [])
+        for socket in shared:
+            self.assertEqual(socket.written, shared[0].written)
+        frame = shared[0].written[0]
+        self.assertEqual(frame[0], 0b11000001, "should be a compressed text frame")
+        self.assertEqual(zlib.decompressobj(-12).decompress(frame[2:] + b"\x00\x00\xff\xff"), msg.encode())
+        self.assertEqual(uncompressed.written, [b"\x81" + bytes([len(msg)]) + msg.encode()])
+
+
+class TestSharedFramesWebsockets(unittest.IsolatedAsyncioTestCase):
+    """Guards the websockets internals that shared frames rely on, against the installed websockets version."""
+
+    def test_pinned_versions(self) -> None:
+        with open(local_path("requirements.txt")) as f:
+            match = re.search(r"^websockets>=(\d+)\.[\d.]*,<(\d+)$", f.read(), re.MULTILINE)
+        self.assertIsNotNone(match, "requirements.txt should pin a range of websockets versions")
+        self.assertEqual((int(match[1]), int(match[2])), shared_frames_websockets_versions,
+                         "shared_frames_websockets_versions should match the versions in requirements.txt")
+
+    async def test_real_sockets(self) -> None:
+        self.assertTrue(shared_frames_supported, f"shared frames are not used with websockets {websockets.__version__}")
+        server_sockets = []
+        connected = asyncio.Event()
+
+        async def handler(socket) -> None:
+            server_sockets.append(socket)
+            if len(server_sockets) == 3:
+                connected.set()
+            await socket.wait_closed()
+
+        async with websockets.serve(handler, "127.0.0.1", 0, extensions=get_server_extensions(),
+                                    ping_interval=None) as server:
+            port = server.sockets[0].getsockname()[1]
+            clients = [await websockets.connect(f"ws://127.0.0.1:{port}", compression=compression)
+                       for compression in ("deflate", "deflate", None)]
+            await connected.wait()
+            for socket in server_sockets:
+                self.assertIsNone(socket._fragmented_message_waiter)
+                self.assertTrue(hasattr(socket, "transport"))
+
+            msg = '[{"cmd": "PrintJSON", "data": [{"text": "Hello"}]}]'
+            self.assertEqual(broadcast_shared_frames(server_sockets, msg), [])
+            for socket in server_sockets:
+                await socket.send("after")
+            for client in clients:
+                self.assertEqual(await client.recv(), msg)
+                self.assertEqual(await client.recv(), "after", "the shared frame should not break compression")
+                await client.close()
+
+
+class TestQueuedTexts(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.ctx = Context.__new__(Context)
+        self.ctx.queued_texts = {}
+        self.ctx.clients = {0: {}}
+        self.ctx.dumper = lambda msgs: msgs
+        self.sent = []
+        self.ctx.broadcast_encoded_now = lambda endpoints, msgs: self.sent.append(msgs)
+
+    def test_without_event_loop(self) -> None:
+        """Texts queued without a running event loop are sent right away, still in chunks."""
+        texts = [{"cmd": "PrintJSON", "data": [{"text": str(index)}]} for index in range(300)]
+        Context.queue_team_texts(self.ctx, 0, texts)
+        self.assertEqual([len(chunk) for chunk in self.sent], [140, 140, 20])
+        self.assertEqual(self.ctx.queued_texts, {})
+
+    async def test_flushed_before_send(self) -> None:
+        """Texts queued before a message is sent to a single client are sent before it."""
+        class Endpoint:
+            socket = None
+
+        self.ctx.queue_team_texts(0, [{"cmd": "PrintJSON", "data": [{"text": "queued"}]}])
+        self.assertEqual(self.sent, [])
+        await self.ctx.send_msgs(Endpoint(), [{"cmd": "Bounced"}])
+        self.assertEqual(len(self.sent), 1)
+
+
+class TestReadData(unittest.TestCase):
+    def setUp(self) -> None:
+        self.ctx = Context.__new__(Context)
+        self.ctx.read_data = {"race_mode": lambda: 1}
+        self.ctx.player_names = {(0, 1): "Player1"}
+        self.ctx.slot_data = LazySlotData.from_dict({1: {"option": 1}})
+        self.ctx.slot_data_idle_time = 0
+        self.ctx.hints = collections.defaultdict(set)
+        self.ctx.client_game_state = collections.defaultdict(int)
+
+    def test_slot_keys(self) -> None:
+        self.assertEqual(self.ctx.get_read_data("race_mode"), 1)
+        self.assertEqual(self.ctx.get_read_data("slot_data_1"), {"option": 1})
+        self.assertEqual(self.ctx.get_read_data("client_status_0_1"), ClientStatus.CLIENT_UNKNOWN)
+        self.assertEqual(self.ctx.get_read_data("hints_0_1"), [])
+        for key in ("slot_data_2", "slot_data_", "hints_0_2", "hints_1", "client_status_x_1", "unknown"):
+            self.assertIsNone(self.ctx.get_read_data(key), key)
+
+
+class TestStoredDataSubscriptions(unittest.TestCase):
+    class Client:
+        slot = 1
+
+    def setUp(self) -> None:
+        self.ctx = Context.__new__(Context)
+        self.ctx.stored_data = {}
+        self.ctx.stored_data_notification_clients = collections.defaultdict(weakref.WeakSet)
+        self.ctx.stored_data_prefix_clients = PrefixSubscriptions()
+        self.ctx.save_journal = None
+
+    def test_prefix_subscriptions(self) -> None:
+        clients = [self.Client() for _ in range(4)]
+        self.ctx.stored_data_prefix_clients.add("tracker_", clients[0])
+        self.ctx.stored_data_prefix_clients.add("tracker_1_", clients[1])
+        self.ctx.stored_data_prefix_clients.add("", clients[2])
+        self.ctx.stored_data_notification_clients["tracker_1_map"].add(clients[3])
+        self.assertEqual(self.ctx.get_stored_data_subscribers("tracker_1_map"), set(clients))
+        self.assertEqual(self.ctx.get_stored_data_subscribers("tracker_2_map"), {clients[0], clients[2]})
+        self.assertEqual(self.ctx.get_stored_data_subscribers("tracker"), {clients[2]})
+        self.assertNotIn("tracker", self.ctx.stored_data_notification_clients, "lookup should not add keys")
+        del clients[0]
+        gc.collect()
+        self.assertEqual(len(self.ctx.get_stored_data_subscribers("tracker_2_map")), 1,
+                         "subscriptions should not keep disconnected clients alive")
+
+    def test_original_value(self) -> None:
+        self.ctx.stored_data["key"] = [1]
+        reply = self.ctx.set_stored_data(self.Client(), {"key": "key", "operations": [
+            {"operation": "update", "value": [2]}]})
+        self.assertEqual(reply["original_value"], [1])
+        self.assertEqual(reply["value"], [1, 2])
+        self.assertEqual(reply["cmd"], "SetReply")
+
+        reply = self.ctx.set_stored_data(self.Client(), {"key": "key", "want_original_value": False, "operations": [
+            {"operation": "add", "value": [3]}]})
+        self.assertNotIn("original_value", reply)
+        self.assertEqual(self.ctx.stored_data["key"], [1, 2, 3])
+
+    def test_invalid_batch(self) -> None:
+        """Ensure a Set batch with an unknown operation is rejected before any of its entries are applied."""
+        sent = []
+
+        async def send_msgs(client, msgs) -> bool:
+            sent.extend(msgs)
+            return True
+
+        self.ctx.send_msgs = send_msgs
+        client = self.Client()
+        client.auth = True
+        asyncio.run(process_client_cmd(self.ctx, client, {"cmd": "Set", "sets": [
+            {"key": "a", "operations": [{"operation": "add", "value": 1}]},
+            {"key": "b", "operations": [{"operation": "unknown", "value": 1}]}]}))
+        self.assertEqual(self.ctx.stored_data, {})
+        self.assertEqual([msg["cmd"] for msg in sent], ["InvalidPacket"])
+
+    def test_failed_batch(self) -> None:
+        """Ensure a Set batch whose operation fails in the middle leaves every key of the batch unchanged."""
+        sent = []
+
+        async def send_msgs(client, msgs) -> bool:
+            sent.extend(msgs)
+            return True
+
+        self.ctx.send_msgs = send_msgs
+        self.ctx.stored_data.update({"a": [1], "b": 1})
+        client = self.Client()
+        client.auth = True
+        asyncio.run(process_client_cmd(self.ctx, client, {"cmd": "Set", "sets": [
+            {"key": "a", "operations": [{"operation": "update", "value": [2]}]},
+            {"key": "b", "operations": [{"operation": "add", "value": "text"}]},
+            {"key": "c", "operations": [{"operation": "replace", "value": 1}]}]}))
+        self.assertEqual(self.ctx.stored_data, {"a": [1], "b": 1})
+        self.assertEqual([msg["cmd"] for msg in sent], ["InvalidPacket"])
+
+    def test_prune_prefix_subscriptions(self) -> None:
+        """Ensure removing prefix subscriptions drops the trie nodes no other subscription needs."""
+        subscriptions = PrefixSubscriptions()
+        clients = [self.Client() for _ in range(2)]
+        subscriptions.add("ab", clients[0])
+        subscriptions.add("abcd", clients[1])
+        subscriptions.remove("abcd", clients[1])
+        self.assertEqual(subscriptions.get("abcd"), {clients[0]})
+        self.assertEqual(subscriptions.children["a"].children["b"].children, {})
+        subscriptions.remove("ab", clients[1])
+        self.assertEqual(subscriptions.get("ab"), {clients[0]}, "removing a missing subscription keeps the others")
+        subscriptions.remove("ab", clients[0])
+        self.assertEqual(subscriptions.children, {})
+
+    def test_disconnect_removes_prefix_subscriptions(self) -> None:
+        """Ensure a disconnecting client's prefix subscriptions and their trie nodes are removed."""
+        async def send_msgs(client, msgs) -> bool:
+            return True
+
+        self.ctx.send_msgs = send_msgs
+        self.ctx.endpoints = []
+        self.ctx.clients = {0: {1: []}}
+        client = self.Client()
+        client.team = 0
+        client.auth = True
+        client.stored_data_prefixes = set()
+        asyncio.run(process_client_cmd(self.ctx, client, {"cmd": "SetNotify", "prefixes": ["tracker_"]}))
+        self.assertEqual(self.ctx.get_stored_data_subscribers("tracker_1"), {client})
+        client.auth = False  # skips announcing the disconnect
+        asyncio.run(self.ctx.disconnect(client))
+        self.assertEqual(self.ctx.stored_data_prefix_clients.children, {})
+
+
+class TestResyncItems(unittest.TestCase):
+    class Client:
+        team = 0
+        slot = 1
+        no_items = False
+        remote_items = True
+        remote_start_inventory = True
+        columnar_items = False
+        send_index = 0
+
+    def setUp(self) -> None:
+        self.ctx = Context.__new__(Context)
+        self.ctx.start_inventory = {1: [NetworkItem(1, -2, 0)]}
+        self.ctx.received_items = {(0, 1, True): [NetworkItem(item, item, 2, 1) for item in range(100)]}
+        self.items = self.ctx.start_inventory[1] + self.ctx.received_items[0, 1, True]
+
+    def test_checkpoint(self) -> None:
+        client = self.Client()
+        packets = get_resync_items(self.ctx, client, get_items_checkpoint(self.items[:60]))
+        self.assertEqual(packets, [{"cmd": "ReceivedItems", "index": 60, "items": self.items[60:]}])
+        self.assertEqual(client.send_index, len(self.items))
+
+        packets = get_resync_items(self.ctx, client, get_items_checkpoint(self.items))
+        self.assertEqual(packets, [{"cmd": "ReceivedItems", "index": len(self.items), "items": []}])
+
+    def test_mismatched_checkpoint(self) -> None:
+        other_items = self.items[:59] + [NetworkItem(1, 1, 1, 0)]
+        for checkpoint in (get_items_checkpoint(other_items), {"index": 1000, "hash": 0}, {"index": 1}, None):
+            packets = get_resync_items(self.ctx, self.Client(), checkpoint)
+            self.assertEqual(packets, [{"cmd": "ReceivedItems", "index": 0, "items": self.items}], checkpoint)
+
+    def test_columns(self) -> None:
+        client = self.Client()
+        client.columnar_items = True
+        packet, = get_resync_items(self.ctx, client)
+        self.assertNotIn("items", packet)
+        self.assertEqual(decode_item_columns(packet["columns"]), self.items)
+        packet, = get_resync_items(self.ctx, client, get_items_checkpoint(self.items[:-1]))
+        self.assertLess(len(packet["items"]), min_columnar_items, "small packets should not use columns")
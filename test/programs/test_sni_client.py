@@ -0,0 +1,86 @@
+import asyncio
+import json
+import unittest
+
+from SNIClient import SNESState, SNIContext, merge_read_ranges, snes_max_read_operands, snes_read, snes_read_batch
+
+
+class FakeSNISocket:
+    """Replies to GetAddress requests from memory, in order and after some latency, like SNI."""
+    open = True
+    closed = False
+    extra = b""
+    """appended to replies, to make them invalid"""
+
+    def __init__(self, ctx: SNIContext, memory: bytes, latency: float = 0.01) -> None:
+        self.ctx = ctx
+        self.memory = memory
+        self.latency = latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def reply(self, data: bytes) -> None:
+        self.in_flight -= 1
+        self.ctx.snes_recv_queue.put_nowait(data)
+
+    async def send(self, message: str) -> None:
+        request = json.loads(message)
+        assert request["Opcode"] == "GetAddress"
+        operands = request["Operands"]
+        data = b"".join(self.memory[int(address, 16):int(address, 16) + int(size, 16)]
+                        for address, size in zip(operands[::2], operands[1::2])) + self.extra
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        asyncio.get_running_loop().call_later(self.latency, self.reply, data)
+
+    async def close(self) -> None:
+        self.open = False
+        self.closed = True
+
+
+class TestMergeReadRanges(unittest.TestCase):
+    def test_merge(self) -> None:
+        self.assertEqual(merge_read_ranges([(10, 2), (0, 4), (4, 2), (2, 1)]), [(0, 6), (10, 2)])
+        self.assertEqual(merge_read_ranges([(0, 8), (2, 2)]), [(0, 8)])
+        self.assertEqual(merge_read_ranges([(0, 2), (3, 1)]), [(0, 2), (3, 1)])
+        self.assertEqual(merge_read_ranges([]), [])
+
+
+class TestSNIReads(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.ctx = SNIContext("localhost", "", "")
+        self.memory = bytes(range(256))
+        self.socket = FakeSNISocket(self.ctx, self.memory)
+        self.ctx.snes_socket = self.socket  # type: ignore[assignment]
+        self.ctx.snes_state = SNESState.SNES_ATTACHED
+
+    async def test_batch(self) -> None:
+        """Adjacent and overlapping reads are merged into one request and split up again in the original order."""
+        reads = [(0x40, 4), (0x10, 1), (0x42, 4), (0x11, 2), (0x80, 3)]
+        data = await snes_read_batch(self.ctx, reads)
+        self.assertEqual(data, [self.memory[address:address + size] for address, size in reads])
+        self.assertEqual(self.socket.requests, 1)
+
+    async def test_batch_operand_limit(self) -> None:
+        reads = [(address, 1) for address in range(0, 4 * snes_max_read_operands, 2)]
+        data = await snes_read_batch(self.ctx, reads)
+        self.assertEqual(data, [self.memory[address:address + size] for address, size in reads])
+        self.assertEqual(self.socket.requests, 2)
+        self.assertEqual(self.socket.max_in_flight, 2)
+
+    async def test_pipelined_reads(self) -> None:
+        """Reads of concurrent tasks are all sent before the first reply arrives, and each gets its own data."""
+        reads = [(address, address % 5 + 1) for address in range(0, 100, 20)]
+        data = await asyncio.gather(*(snes_read(self.ctx, address, size) for address, size in reads))
+        self.assertEqual(data, [self.memory[address:address + size] for address, size in reads])
+        self.assertEqual(self.socket.max_in_flight, len(reads))
+        self.assertIsNone(self.ctx.snes_last_read)
+
+    async def test_failed_read(self) -> None:
+        """A reply of the wrong size closes the connection, and reads that were sent after it fail too."""
+        self.socket.extra = b"\0"
+        data = await asyncio.gather(snes_read(self.ctx, 0x0E, 4), snes_read(self.ctx, 0, 1))
+        self.assertEqual(data, [None, None])
+        self.assertTrue(self.socket.closed)
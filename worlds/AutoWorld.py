@@ -7,8 +7,8 @@ import sys
 import time
 from random import Random
 from dataclasses import make_dataclass
-from typing import (Any, Callable, ClassVar, Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, TextIO, Tuple,
-                    TYPE_CHECKING, Type, Union)
+from typing import (Any, Callable, ClassVar, Dict, FrozenSet, Iterable, Iterator, List, Mapping, MutableMapping,
+                    Optional, Set, TextIO, Tuple, TYPE_CHECKING, Type, Union)
 
 from Options import item_and_loc_options, ItemsAccessibility, OptionGroup, PerGameCommonOptions
 from BaseClasses import CollectionState
@@ -21,9 +21,88 @@ if TYPE_CHECKING:
 
 perf_logger = logging.getLogger("performance")
 
+output_steps: FrozenSet[str] = frozenset({"generate_output", "fill_slot_data", "extend_hint_information",
+                                          "modify_multidata", "write_spoiler_header", "write_spoiler",
+                                          "write_spoiler_end"})
+"""Steps that run while output is written and may not change item placements, so they keep the cached spheres."""
+
+
+class WorldTypes(MutableMapping[str, "Type[World]"]):
+    """
+    Registered world types by game name.
+
+    Games of world sources that were skipped because of an up-to-date world manifest are pending: they are listed,
+    but their world source is only imported on first access. Iterating items or values imports all of them.
+    """
+    loaded: Dict[str, Type[World]]
+    pending: Dict[str, Callable[[], Any]]
+    """loader of the world source that registers the game"""
+
+    def __init__(self) -> None:
+        self.loaded = {}
+        self.pending = {}
+
+    def add_pending(self, game: str, loader: Callable[[], Any]) -> None:
+        if game not in self.loaded:
+            self.pending[game] = loader
+
+    def _load_pending(self, game: str) -> None:
+        loader = self.pending[game]
+        # a world source can register multiple games, they all stop being pending before it is imported
+        for pending_game in [pending_game for pending_game, other in self.pending.items() if other == loader]:
+            del self.pending[pending_game]
+        loader()
+
+    def load_all(self) -> None:
+        """Imports all world sources with pending games."""
+        while self.pending:
+            self._load_pending(next(iter(self.pending)))
+
+    def __getitem__(self, game: str) -> Type[World]:
+        if game in self.pending:
+            self._load_pending(game)
+        return self.loaded[game]
+
+    def __contains__(self, game: object) -> bool:
+        if game in self.pending:
+            self._load_pending(game)  # type: ignore[arg-type]
+        return game in self.loaded
+
+    def __setitem__(self, game: str, world_type: Type[World]) -> None:
+        if game in self.loaded:
+            raise RuntimeError(f"""Game {game} already registered in 
+                {self.loaded[game].__file__} when attempting to register from
+                {world_type.__file__}.""")
+        self.pending.pop(game, None)
+        self.loaded[game] = world_type
+
+    def __delitem__(self, game: str) -> None:
+        if game in self.pending:
+            del self.pending[game]
+        else:
+            del self.loaded[game]
+
+    def __iter__(self) -> Iterator[str]:
+        # a snapshot, as accessing a pending game while iterating registers new ones
+        return iter([*self.loaded, *self.pending])
+
+    def __len__(self) -> int:
+        return len(self.loaded) + len(self.pending)
+
+    def items(self):  # type: ignore[override]
+        self.load_all()
+        return self.loaded.items()
+
+    def values(self):  # type: ignore[override]
+        self.load_all()
+        return self.loaded.values()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(loaded={list(self.loaded)}, pending={list(self.pending)})"
+
 
 class AutoWorldRegister(type):
-    world_types: Dict[str, Type[World]] = {}
+    world_types: MutableMapping[str, Type[World]] = WorldTypes()
     __file__: str
     zip_path: Optional[str]
     settings_key: str
@@ -85,10 +164,7 @@ class AutoWorldRegister(type):
         new_class = super().__new__(mcs, name, bases, dct)
         new_class.__file__ = sys.modules[new_class.__module__].__file__
         if "game" in dct:
-            if dct["game"] in AutoWorldRegister.world_types:
-                raise RuntimeError(f"""Game {dct["game"]} already registered in 
-                {AutoWorldRegister.world_types[dct["game"]].__file__} when attempting to register from
-                {new_class.__file__}.""")
+            # raises if the game is already registered
             AutoWorldRegister.world_types[dct["game"]] = new_class
         if ".apworld" in new_class.__file__:
             new_class.zip_path = pathlib.Path(new_class.__file__).parents[1]
@@ -161,9 +237,14 @@ class WebWorldRegister(type):
 
 def _timed_call(method: Callable[..., Any], *args: Any,
                 multiworld: Optional["MultiWorld"] = None, player: Optional[int] = None) -> Any:
+    profile = multiworld.profile if multiworld else None
+    if profile:
+        profile.start_step()
     start = time.perf_counter()
     ret = method(*args)
     taken = time.perf_counter() - start
+    if profile:
+        profile.record_step(method, taken, player)
     if taken > 1.0:
         if player and multiworld:
             perf_logger.info(f"Took {taken:.4f} seconds in {method.__qualname__} for player {player}, "
@@ -202,6 +283,9 @@ def call_all(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
                         f"Duplicate item reference of \"{item.name}\" in \"{multiworld.worlds[player].game}\" "
                         f"of player \"{multiworld.player_name[player]}\". Please make a copy instead.")
 
+    if method_name not in output_steps:
+        # worlds may place, move or reclassify items in any step before output
+        multiworld.fill_generation += 1
     call_stage(multiworld, method_name, *args)
 
 
@@ -210,7 +294,9 @@ def call_stage(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
     for world_type in sorted(world_types, key=lambda world: world.__name__):
         stage_callable = getattr(world_type, f"stage_{method_name}", None)
         if stage_callable:
-            _timed_call(stage_callable, multiworld, *args)
+            _timed_call(stage_callable, multiworld, *args, multiworld=multiworld)
+            if method_name not in output_steps:
+                multiworld.fill_generation += 1
 
 
 class WebWorld(metaclass=WebWorldRegister):
@@ -315,6 +401,13 @@ class World(metaclass=AutoWorldRegister):
     If False, everything is rechecked at every step, which is slower computationally, 
     but may be desirable in complex/dynamic worlds."""
 
+    own_items_logic: bool = False
+    """If True, the access rules of this world's locations only depend on this player's own items and regions.
+    Sphere sweeps then only re-check this world's locations after this player collected or removed an item.
+    If False, they are re-checked on every pass, which is required for rules that check other players' items.
+    Locations with declarative rules from worlds.generic.CompiledRules are always only re-checked once an item or region
+    they read changed, regardless of this."""
+
     multiworld: "MultiWorld"
     """autoset on creation. The MultiWorld object for the currently generating multiworld."""
     player: int
@@ -8,7 +8,8 @@ import os
 import threading
 from io import BytesIO
 
-from typing import ClassVar, Dict, List, Literal, Tuple, Any, Optional, Union, BinaryIO, overload, Sequence
+from typing import (ClassVar, Dict, Iterator, List, Literal, MutableMapping, Tuple, Any, Optional, Union, BinaryIO,
+                    overload, Sequence)
 
 import bsdiff4
 
@@ -18,9 +19,76 @@ del threading
 del os
 
 
+class PatchTypes(MutableMapping[str, "AutoPatchRegister"]):
+    """
+    Registered patch types, by game or by file ending.
+
+    Keys of world sources that were skipped because of an up-to-date world manifest are pending: they are listed with
+    a game of their world source, which is imported on first access. Iterating items or values imports all of them.
+    """
+    loaded: Dict[str, AutoPatchRegister]
+    pending: Dict[str, str]
+    """game of the world source that registers the key"""
+
+    def __init__(self) -> None:
+        self.loaded = {}
+        self.pending = {}
+
+    def add_pending(self, key: str, world_game: str) -> None:
+        if key not in self.loaded:
+            self.pending[key] = world_game
+
+    def _load_pending(self, key: str) -> None:
+        from .AutoWorld import AutoWorldRegister
+        AutoWorldRegister.world_types.get(self.pending.pop(key))
+
+    def load_all(self) -> None:
+        """Imports all world sources with pending keys."""
+        while self.pending:
+            self._load_pending(next(iter(self.pending)))
+
+    def __getitem__(self, key: str) -> AutoPatchRegister:
+        if key in self.pending:
+            self._load_pending(key)
+        return self.loaded[key]
+
+    def __contains__(self, key: object) -> bool:
+        if key in self.pending:
+            self._load_pending(key)  # type: ignore[arg-type]
+        return key in self.loaded
+
+    def __setitem__(self, key: str, patch_type: AutoPatchRegister) -> None:
+        self.pending.pop(key, None)
+        self.loaded[key] = patch_type
+
+    def __delitem__(self, key: str) -> None:
+        if key in self.pending:
+            del self.pending[key]
+        else:
+            del self.loaded[key]
+
+    def __iter__(self) -> Iterator[str]:
+        # a snapshot, as accessing a pending key while iterating registers new ones
+        return iter([*self.loaded, *self.pending])
+
+    def __len__(self) -> int:
+        return len(self.loaded) + len(self.pending)
+
+    def items(self):  # type: ignore[override]
+        self.load_all()
+        return self.loaded.items()
+
+    def values(self):  # type: ignore[override]
+        self.load_all()
+        return self.loaded.values()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(loaded={list(self.loaded)}, pending={list(self.pending)})"
+
+
 class AutoPatchRegister(abc.ABCMeta):
-    patch_types: ClassVar[Dict[str, AutoPatchRegister]] = {}
-    file_endings: ClassVar[Dict[str, AutoPatchRegister]] = {}
+    patch_types: ClassVar[PatchTypes] = PatchTypes()
+    file_endings: ClassVar[PatchTypes] = PatchTypes()
 
     def __new__(mcs, name: str, bases: Tuple[type, ...], dct: Dict[str, Any]) -> AutoPatchRegister:
         # construct class
@@ -34,7 +102,11 @@ class AutoPatchRegister(abc.ABCMeta):
 
     @staticmethod
     def get_handler(file: str) -> Optional[AutoPatchRegister]:
-        for file_ending, handler in AutoPatchRegister.file_endings.items():
+        # only the world sources of pending file endings that match get imported
+        for file_ending in [file_ending for file_ending in AutoPatchRegister.file_endings.pending
+                            if file.endswith(file_ending)]:
+            AutoPatchRegister.file_endings._load_pending(file_ending)
+        for file_ending, handler in AutoPatchRegister.file_endings.loaded.items():
             if file.endswith(file_ending):
                 return handler
         return None
@@ -55,10 +127,13 @@ class AutoPatchExtensionRegister(abc.ABCMeta):
     def get_handler(game: Optional[str]) -> Union[AutoPatchExtensionRegister, List[AutoPatchExtensionRegister]]:
         if not game:
             return APPatchExtension
+        from .AutoWorld import AutoWorldRegister
+        AutoWorldRegister.world_types.get(game)  # imports the world source, in case it was skipped at startup
         handler = AutoPatchExtensionRegister.extension_types.get(game, APPatchExtension)
         if handler.required_extensions:
             handlers = [handler]
             for required in handler.required_extensions:
+                AutoWorldRegister.world_types.get(required)
                 ext = AutoPatchExtensionRegister.extension_types.get(required)
                 if not ext:
                     raise NotImplementedError(f"No handler for {required}.")
@@ -1,15 +1,25 @@
+import contextlib
+import hashlib
 import importlib
 import importlib.util
 import logging
+import mmap
 import os
 import sys
+import struct
 import warnings
 import zipimport
 import time
 import dataclasses
-from typing import Dict, List, TypedDict
+import functools
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple, Type, TypedDict, Union, TYPE_CHECKING
 
-from Utils import local_path, user_path
+import orjson
+
+from Utils import __version__, cache_path, local_path, user_path
+
+if TYPE_CHECKING:
+    from .AutoWorld import World
 
 local_folder = os.path.dirname(__file__)
 user_folder = user_path("worlds") if user_path() != local_path() else user_path("custom_worlds")
@@ -27,6 +37,8 @@ __all__ = {
     "GamesPackage",
     "DataPackage",
     "failed_world_loads",
+    "hint_blacklists",
+    "load_all_worlds",
 }
 
 
@@ -45,6 +57,27 @@ class DataPackage(TypedDict):
     games: Dict[str, GamesPackage]
 
 
+class WorldManifestGame(TypedDict):
+    checksum: str
+    hint_blacklist: List[str]
+    offset: int
+    """of the encoded data package in the world manifest"""
+    length: int
+
+
+class WorldFingerprint(TypedDict):
+    mtime_ns: int
+    size: int
+    hash: str
+
+
+class WorldManifestSource(WorldFingerprint):
+    path: str
+    games: Dict[str, WorldManifestGame]
+    patches: Dict[str, str]
+    """game of each patch type, by file ending"""
+
+
 @dataclasses.dataclass(order=True)
 class WorldSource:
     path: str  # typically relative path from this module
@@ -61,6 +94,46 @@ class WorldSource:
             return os.path.join(local_folder, self.path)
         return self.path
 
+    @property
+    def module_name(self) -> str:
+        name = os.path.basename(self.path)
+        return f"worlds.{name.rsplit('.', 1)[0] if self.is_zip else name}"
+
+    def contains_module(self, module_name: str) -> bool:
+        return module_name == self.module_name or module_name.startswith(f"{self.module_name}.")
+
+    def get_fingerprint(self, known: Optional[WorldFingerprint] = None) -> WorldFingerprint:
+        """
+        Modification time, size and hash of the world source, without importing it.
+        Folders are hashed by the names, modification times and sizes of their files.
+        .apworld files are hashed by content, unless modification time and size match the known fingerprint.
+        """
+        if self.is_zip:
+            stat = os.stat(self.resolved_path)
+            if known and known["mtime_ns"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+                return {"mtime_ns": known["mtime_ns"], "size": known["size"], "hash": known["hash"]}
+            with open(self.resolved_path, "rb") as f:
+                return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                        "hash": hashlib.sha1(f.read()).hexdigest()}
+
+        files: List[str] = []
+        mtime_ns = size = 0
+        folders = [""]
+        while folders:
+            folder = folders.pop()
+            for entry in os.scandir(os.path.join(self.resolved_path, folder)):
+                name = f"{folder}/{entry.name}" if folder else entry.name
+                if entry.is_dir():
+                    if entry.name != "__pycache__":
+                        folders.append(name)
+                    continue
+                stat = entry.stat()
+                mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+                size += stat.st_size
+                files.append(f"{name}\0{stat.st_mtime_ns}\0{stat.st_size}")
+        files.sort()
+        return {"mtime_ns": mtime_ns, "size": size, "hash": hashlib.sha1("\n".join(files).encode()).hexdigest()}
+
     def load(self) -> bool:
         try:
             start = time.perf_counter()
@@ -115,15 +188,196 @@ for folder in (folder for folder in (user_folder, local_folder) if folder):
             elif entry.is_file() and entry.name.endswith(".apworld"):
                 world_sources.append(WorldSource(file_name, is_zip=True, relative=relative))
 
-# import all submodules to trigger AutoWorldRegister
-world_sources.sort()
-for world_source in world_sources:
-    world_source.load()
+world_manifest_path = cache_path("world_manifest.bin")
+"""
+Data package and hint blacklist of each game, by hash of its world source.
+World sources that did not change since it was written are not imported until one of their games is accessed, and
+their data packages are read from it instead of being built again.
+
+The file starts with the length of a JSON index, which holds the offset and length of each encoded data package after
+it, so it can be mapped into memory and only the data packages of unchanged world sources get decoded.
+"""
+_world_manifest_header = struct.Struct("<4sQ")
+_world_manifest_magic = b"APWM"
+
+
+def _get_core_hash() -> str:
+    # the manifest holds the output of this module and AutoWorldRegister, so it is only valid for the same code
+    core_hash = hashlib.sha1(__version__.encode())
+    for file_name in (__file__, sys.modules[AutoWorldRegister.__module__].__file__):
+        try:
+            with open(file_name, "rb") as f:
+                core_hash.update(f.read())
+        except (OSError, TypeError):
+            pass  # frozen, the version has to do
+    return core_hash.hexdigest()
+
+
+@contextlib.contextmanager
+def _open_world_manifest(core_hash: str) \
+        -> Iterator[Tuple[Dict[str, WorldManifestSource], Union[mmap.mmap, bytes], int]]:
+    """Yields the world sources in the manifest by hash, the mapped manifest and where the data packages start."""
+    with contextlib.ExitStack() as stack:
+        sources: Dict[str, WorldManifestSource] = {}
+        data: Union[mmap.mmap, bytes] = b""
+        data_start = 0
+        try:
+            f = stack.enter_context(open(world_manifest_path, "rb"))
+            mapped = stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            magic, index_length = _world_manifest_header.unpack_from(mapped)
+            index = orjson.loads(mapped[_world_manifest_header.size:_world_manifest_header.size + index_length])
+            if magic == _world_manifest_magic and index["core"] == core_hash:
+                sources, data = index["sources"], mapped
+                data_start = _world_manifest_header.size + index_length
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.debug(f"Could not load world manifest: {e}")
+        yield sources, data, data_start
+
+
+def _store_world_manifest(core_hash: str, sources: Dict[str, WorldManifestSource],
+                          encoded_packages: Dict[str, bytes]) -> None:
+    offset = 0
+    for source in sources.values():
+        for game, entry in source["games"].items():
+            entry["offset"] = offset
+            entry["length"] = len(encoded_packages[game])
+            offset += entry["length"]
+    index = orjson.dumps({"core": core_hash, "sources": sources})
+    # written to a temporary file first, as other processes may be reading it
+    temp_path = f"{world_manifest_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(world_manifest_path), exist_ok=True)
+        with open(temp_path, "wb") as f:
+            f.write(_world_manifest_header.pack(_world_manifest_magic, len(index)))
+            f.write(index)
+            for source in sources.values():
+                for game in source["games"]:
+                    f.write(encoded_packages[game])
+        os.replace(temp_path, world_manifest_path)
+    except OSError as e:
+        logging.debug(f"Could not store world manifest: {e}")
+
+
+def _load_world_sources() -> Tuple[Dict[str, GamesPackage], Dict[str, FrozenSet[str]]]:
+    """
+    Imports all world sources that changed since the world manifest was written and registers the games of unchanged
+    ones as pending. Returns the data package and hint blacklist of all games of the world sources.
+    """
+    core_hash = _get_core_hash()
+    sources: Dict[str, WorldManifestSource] = {}
+    packages: Dict[str, GamesPackage] = {}
+    encoded_packages: Dict[str, bytes] = {}
+    hint_blacklists: Dict[str, FrozenSet[str]] = {}
+    with _open_world_manifest(core_hash) as (manifest, data, data_start):
+        known_by_path = {source["path"]: source for source in manifest.values()}
+        for world_source in world_sources:
+            try:
+                fingerprint = world_source.get_fingerprint(known_by_path.get(world_source.resolved_path))
+            except OSError:
+                fingerprint = None
+            known = manifest.get(fingerprint["hash"]) if fingerprint else None
+            source_games: Dict[str, WorldManifestGame] = {}
+            source_patches: Dict[str, str] = {}
+            if known and known["games"]:
+                try:
+                    for game, entry in known["games"].items():
+                        offset = data_start + entry["offset"]
+                        encoded_packages[game] = data[offset:offset + entry["length"]]
+                        packages[game] = orjson.loads(encoded_packages[game])
+                        source_games[game] = entry
+                except Exception as e:
+                    logging.debug(f"Could not load {world_source} from world manifest: {e}")
+                    known = None
+                    source_games = {}
+            if known and known["games"]:
+                loader = functools.partial(_load_pending_world_source, world_source, tuple(source_games))
+                for game in source_games:
+                    AutoWorldRegister.world_types.add_pending(game, loader)
+                # patch types are looked up by game or file ending, accessing either imports the world source
+                source_patches = known["patches"]
+                for file_ending, patch_game in source_patches.items():
+                    AutoPatchRegister.file_endings.add_pending(file_ending, next(iter(source_games)))
+                    AutoPatchRegister.patch_types.add_pending(patch_game, next(iter(source_games)))
+            elif world_source.load():
+                # a world source can register games in submodules, or import another world source before its turn
+                for game, world_type in AutoWorldRegister.world_types.loaded.items():
+                    if world_source.contains_module(world_type.__module__):
+                        packages[game] = world_type.get_data_package_data()
+                        encoded_packages[game] = orjson.dumps(packages[game])
+                        source_games[game] = {"checksum": packages[game]["checksum"],
+                                              "hint_blacklist": sorted(world_type.hint_blacklist),
+                                              "offset": 0, "length": 0}
+                for file_ending, patch_type in AutoPatchRegister.file_endings.loaded.items():
+                    if world_source.contains_module(patch_type.__module__):
+                        source_patches[file_ending] = patch_type.game
+            else:
+                continue
+            hint_blacklists.update((game, frozenset(entry["hint_blacklist"])) for game, entry in source_games.items())
+            if fingerprint:
+                sources[fingerprint["hash"]] = {**fingerprint, "path": world_source.resolved_path,
+                                                "games": source_games, "patches": source_patches}
+
+    if sources.keys() != manifest.keys() or any(
+            (source["mtime_ns"], source["path"]) != (manifest[source_hash]["mtime_ns"], manifest[source_hash]["path"])
+            for source_hash, source in sources.items()):
+        _store_world_manifest(core_hash, sources, encoded_packages)
+    return packages, hint_blacklists
+
+
+def _matches_data_package(world_type: Type["World"], game_package: GamesPackage) -> bool:
+    """
+    Whether get_data_package_data of the world type would return game_package, without encoding and hashing it.
+    This includes the order of the name to id tables, as the checksum depends on it.
+    """
+    for key in ("item_name_to_id", "location_name_to_id"):
+        if key not in game_package or list(getattr(world_type, key).items()) != list(game_package[key].items()):
+            return False
+    for key in ("item_name_groups", "location_name_groups"):
+        groups: Dict[str, FrozenSet[str]] = getattr(world_type, key)
+        if key not in game_package or groups.keys() != game_package[key].keys():
+            return False
+        for group_name, group in groups.items():
+            package_group = game_package[key][group_name]
+            if len(group) != len(package_group) or not group.issuperset(package_group):
+                return False
+    return True
+
+
+def _load_pending_world_source(world_source: WorldSource, games: Tuple[str, ...]) -> None:
+    if world_source.load():
+        for game in games:
+            world_type = AutoWorldRegister.world_types.loaded.get(game)
+            game_package = network_data_package["games"].get(game)
+            # worlds that build their tables from sets have a different order, and checksum, in every process
+            if world_type and not (game_package and _matches_data_package(world_type, game_package)):
+                network_data_package["games"][game] = world_type.get_data_package_data()
+
+
+def load_all_worlds() -> None:
+    """Imports all world sources that were skipped at startup because they did not change."""
+    AutoWorldRegister.world_types.load_all()
+
 
-# Build the data package for each game.
 from .AutoWorld import AutoWorldRegister
+from .Files import AutoPatchRegister
+
+# import changed submodules to trigger AutoWorldRegister
+world_sources.sort()
+_manifest_packages, _manifest_hint_blacklists = _load_world_sources()
 
+# Build the data package for each game.
 network_data_package: DataPackage = {
-    "games": {world_name: world.get_data_package_data() for world_name, world in AutoWorldRegister.world_types.items()},
+    "games": {world_name: _manifest_packages[world_name] if world_name in _manifest_packages
+              else AutoWorldRegister.world_types[world_name].get_data_package_data()
+              for world_name in AutoWorldRegister.world_types},
 }
 
+hint_blacklists: Dict[str, FrozenSet[str]] = {
+    world_name: _manifest_hint_blacklists[world_name] if world_name in _manifest_hint_blacklists
+    else AutoWorldRegister.world_types[world_name].hint_blacklist
+    for world_name in AutoWorldRegister.world_types
+}
+"""hint_blacklist of each game, without importing its world source"""
+del _manifest_packages, _manifest_hint_blacklists
@@ -9,6 +9,7 @@ import asyncio
 import base64
 import enum
 import json
+import struct
 import sys
 from typing import Any, Sequence
 
@@ -16,6 +17,21 @@ from typing import Any, Sequence
 BIZHAWK_SOCKET_PORT_RANGE_START = 43055
 BIZHAWK_SOCKET_PORT_RANGE_SIZE = 5
 
+BINARY_FRAMING_SCRIPT_VERSION = 3
+"""The first version of the connector script that supports binary frames"""
+
+FRAME_HEADER = struct.Struct("<II")
+"""Starts every binary frame, with the sizes of its JSON part and its data part"""
+
+MEMORY_DATA_FIELDS = {
+    "GUARD": "expected_data",
+    "WRITE": "value",
+    "READ_RESPONSE": "value",
+    "WATCH_RESPONSE": "value",
+}
+"""The field of each request and response type that holds memory data, which is a base64 string in JSON lines and the
+size of the data in binary frames"""
+
 
 class ConnectionStatus(enum.IntEnum):
     NOT_CONNECTED = 1
@@ -46,46 +62,80 @@ class SyncError(Exception):
 class BizHawkContext:
     streams: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None
     connection_status: ConnectionStatus
+    watched_data: dict[int, bytes]
+    """The latest data of each range of memory registered with `watch`, by watch id"""
+    binary_framing: bool
+    """Whether messages are sent as binary frames instead of JSON lines, see `enable_binary_framing`"""
     _lock: asyncio.Lock
     _port: int | None
 
     def __init__(self) -> None:
         self.streams = None
         self.connection_status = ConnectionStatus.NOT_CONNECTED
+        self.watched_data = {}
+        self.binary_framing = False
         self._lock = asyncio.Lock()
         self._port = None
 
-    async def _send_message(self, message: str):
+    def _close(self, writer: asyncio.StreamWriter) -> None:
+        writer.close()
+        self.streams = None
+        self.connection_status = ConnectionStatus.NOT_CONNECTED
+        self.watched_data.clear()
+        self.binary_framing = False
+
+    async def _receive(self, reader: asyncio.StreamReader) -> tuple[bytes, bytes]:
+        if not self.binary_framing:
+            return await reader.readline(), b""
+
+        try:
+            message_size, data_size = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+            frame = await reader.readexactly(message_size + data_size)
+        except asyncio.IncompleteReadError:
+            return b"", b""
+        return frame[:message_size], frame[message_size:]
+
+    async def _send_message(self, message: str) -> str:
+        return (await self._exchange(message.encode("utf-8"), b""))[0].decode("utf-8")
+
+    async def _exchange(self, message: bytes, data: bytes) -> tuple[bytes, bytes]:
+        """Sends a message and returns the response, along with the data parts of both if using binary frames"""
         async with self._lock:
             if self.streams is None:
                 raise NotConnectedError("You tried to send a request before a connection to BizHawk was made")
 
             try:
                 reader, writer = self.streams
-                writer.write(message.encode("utf-8") + b"\n")
+                if self.binary_framing:
+                    writer.write(FRAME_HEADER.pack(len(message), len(data)) + message + data)
+                else:
+                    writer.write(message + b"\n")
                 await asyncio.wait_for(writer.drain(), timeout=5)
 
-                res = await asyncio.wait_for(reader.readline(), timeout=5)
+                res, res_data = await asyncio.wait_for(self._receive(reader), timeout=5)
+
+                # Changes to watched memory are sent ahead of the response, as an object instead of a list
+                while res.startswith(b"{"):
+                    changes = json.loads(res)["changes"]
+                    _decode_memory_data([(change, "value") for change in changes], res_data, self.binary_framing)
+                    for change in changes:
+                        if change["id"] in self.watched_data:
+                            self.watched_data[change["id"]] = change["value"]
+                    res, res_data = await asyncio.wait_for(self._receive(reader), timeout=5)
 
                 if res == b"":
-                    writer.close()
-                    self.streams = None
-                    self.connection_status = ConnectionStatus.NOT_CONNECTED
+                    self._close(writer)
                     raise RequestFailedError("Connection closed")
 
                 if self.connection_status == ConnectionStatus.TENTATIVE:
                     self.connection_status = ConnectionStatus.CONNECTED
 
-                return res.decode("utf-8")
+                return res, res_data
             except asyncio.TimeoutError as exc:
-                writer.close()
-                self.streams = None
-                self.connection_status = ConnectionStatus.NOT_CONNECTED
+                self._close(writer)
                 raise RequestFailedError("Connection timed out") from exc
             except ConnectionResetError as exc:
-                writer.close()
-                self.streams = None
-                self.connection_status = ConnectionStatus.NOT_CONNECTED
+                self._close(writer)
                 raise RequestFailedError("Connection reset") from exc
 
 
@@ -116,17 +166,59 @@ def disconnect(ctx: BizHawkContext) -> None:
         ctx.streams[1].close()
         ctx.streams = None
     ctx.connection_status = ConnectionStatus.NOT_CONNECTED
+    ctx.watched_data.clear()
+    ctx.binary_framing = False
 
 
 async def get_script_version(ctx: BizHawkContext) -> int:
     return int(await ctx._send_message("VERSION"))
 
 
-async def send_requests(ctx: BizHawkContext, req_list: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    """Sends a list of requests to the BizHawk connector and returns their responses.
+async def enable_binary_framing(ctx: BizHawkContext) -> bool:
+    """Switches the connection to binary frames if the connector script supports them, so that memory data is sent as
+    raw bytes instead of base64 strings inside JSON. Otherwise, messages stay JSON lines.
 
-    It's likely you want to use the wrapper functions instead of this."""
-    responses = json.loads(await ctx._send_message(json.dumps(req_list)))
+    Should be called right after connecting, before any other requests are made.
+
+    Returns whether binary frames are in use."""
+    if not ctx.binary_framing and await get_script_version(ctx) >= BINARY_FRAMING_SCRIPT_VERSION:
+        ctx.binary_framing = (await ctx._send_message("BINARY")).strip() == "BINARY"
+
+    return ctx.binary_framing
+
+
+def _decode_memory_data(fields: list[tuple[dict[str, Any], str]], data: bytes, binary_framing: bool) -> None:
+    """Replaces the memory data in each (item, field) with bytes, either from base64 or from the data part of a frame"""
+    offset = 0
+    for item, field in fields:
+        if binary_framing:
+            size = item[field]
+            item[field] = data[offset:offset + size]
+            offset += size
+        else:
+            item[field] = base64.b64decode(item[field])
+
+
+async def _send_requests(ctx: BizHawkContext, req_list: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Like `send_requests`, but memory data in requests and responses are bytes instead of base64 strings."""
+    binary_framing = ctx.binary_framing
+    data: list[bytes] = []
+    encoded_list: list[dict[str, Any]] = []
+    for req in req_list:
+        field = MEMORY_DATA_FIELDS.get(req["type"])
+        if field is not None:
+            value = bytes(req[field])
+            if binary_framing:
+                data.append(value)
+                req = {**req, field: len(value)}
+            else:
+                req = {**req, field: base64.b64encode(value).decode("ascii")}
+        encoded_list.append(req)
+
+    message, res_data = await ctx._exchange(json.dumps(encoded_list).encode("utf-8"), b"".join(data))
+    responses = json.loads(message)
+    _decode_memory_data([(response, MEMORY_DATA_FIELDS[response["type"]]) for response in responses
+                         if response["type"] in MEMORY_DATA_FIELDS], res_data, binary_framing)
     errors: list[ConnectorError] = []
 
     for response in responses:
@@ -142,6 +234,24 @@ async def send_requests(ctx: BizHawkContext, req_list: list[dict[str, Any]]) ->
     return responses
 
 
+async def send_requests(ctx: BizHawkContext, req_list: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Sends a list of requests to the BizHawk connector and returns their responses.
+
+    It's likely you want to use the wrapper functions instead of this."""
+    responses = await _send_requests(ctx, [
+        {**req, MEMORY_DATA_FIELDS[req["type"]]: base64.b64decode(req[MEMORY_DATA_FIELDS[req["type"]]])}
+        if req["type"] in MEMORY_DATA_FIELDS else req
+        for req in req_list
+    ])
+
+    for response in responses:
+        if response["type"] in MEMORY_DATA_FIELDS:
+            field = MEMORY_DATA_FIELDS[response["type"]]
+            response[field] = base64.b64encode(response[field]).decode("ascii")
+
+    return responses
+
+
 async def ping(ctx: BizHawkContext) -> None:
     """Sends a PING request and receives a PONG response."""
     res = (await send_requests(ctx, [{"type": "PING"}]))[0]
@@ -250,10 +360,10 @@ async def guarded_read(ctx: BizHawkContext, read_list: Sequence[tuple[int, int,
 
     Returns None if any item in guard_list failed to validate. Otherwise returns a list of bytes in the order they
     were requested."""
-    res = await send_requests(ctx, [{
+    res = await _send_requests(ctx, [{
         "type": "GUARD",
         "address": address,
-        "expected_data": base64.b64encode(bytes(expected_data)).decode("ascii"),
+        "expected_data": expected_data,
         "domain": domain
     } for address, expected_data, domain in guard_list] + [{
         "type": "READ",
@@ -271,7 +381,7 @@ async def guarded_read(ctx: BizHawkContext, read_list: Sequence[tuple[int, int,
             if item["type"] != "READ_RESPONSE":
                 raise SyncError(f"Expected response of type READ_RESPONSE or GUARD_RESPONSE but got {item['type']}")
 
-            ret.append(base64.b64decode(item["value"]))
+            ret.append(item["value"])
 
     return ret
 
@@ -303,15 +413,15 @@ async def guarded_write(ctx: BizHawkContext, write_list: Sequence[tuple[int, Seq
     - `domain` is the name of the region of memory the address corresponds to
 
     Returns False if any item in guard_list failed to validate. Otherwise returns True."""
-    res = await send_requests(ctx, [{
+    res = await _send_requests(ctx, [{
         "type": "GUARD",
         "address": address,
-        "expected_data": base64.b64encode(bytes(expected_data)).decode("ascii"),
+        "expected_data": expected_data,
         "domain": domain
     } for address, expected_data, domain in guard_list] + [{
         "type": "WRITE",
         "address": address,
-        "value": base64.b64encode(bytes(value)).decode("ascii"),
+        "value": value,
         "domain": domain
     } for address, value, domain in write_list])
 
@@ -334,3 +444,58 @@ async def write(ctx: BizHawkContext, write_list: Sequence[tuple[int, Sequence[in
     - `value` is a list of bytes to write, in order, starting at `address`
     - `domain` is the name of the region of memory the address corresponds to"""
     await guarded_write(ctx, write_list, [])
+
+
+async def watch(ctx: BizHawkContext, watch_list: Sequence[tuple[int, int, str]]) -> list[int]:
+    """Starts watching data at 1 or more addresses. Instead of reading the data again on every loop, the connector
+    sends the data of watched memory along with the response to any later request, but only when it has changed. Use
+    `get_watched` to get the latest data.
+
+    Items in `watch_list` should be organized `(address, size, domain)` where
+    - `address` is the address of the first byte of data
+    - `size` is the number of bytes to watch
+    - `domain` is the name of the region of memory the address corresponds to
+
+    Watches are dropped when the connection is lost, so they have to be made again after reconnecting.
+
+    Returns a list of watch ids in the order they were requested."""
+    res = await _send_requests(ctx, [{
+        "type": "WATCH",
+        "address": address,
+        "size": size,
+        "domain": domain
+    } for address, size, domain in watch_list])
+
+    watch_ids: list[int] = []
+    for item in res:
+        if item["type"] != "WATCH_RESPONSE":
+            raise SyncError(f"Expected response of type WATCH_RESPONSE but got {item['type']}")
+
+        ctx.watched_data[item["id"]] = item["value"]
+        watch_ids.append(item["id"])
+
+    return watch_ids
+
+
+async def unwatch(ctx: BizHawkContext, watch_ids: Sequence[int]) -> None:
+    """Stops watching the memory of 1 or more watch ids returned by `watch`."""
+    for watch_id in watch_ids:
+        ctx.watched_data.pop(watch_id, None)
+
+    res = await send_requests(ctx, [{"type": "UNWATCH", "id": watch_id} for watch_id in watch_ids])
+
+    for item in res:
+        if item["type"] != "UNWATCH_RESPONSE":
+            raise SyncError(f"Expected response of type UNWATCH_RESPONSE but got {item['type']}")
+
+
+def get_watched(ctx: BizHawkContext, watch_ids: Sequence[int]) -> list[bytes] | None:
+    """Gets the latest data of 1 or more watch ids returned by `watch`, as of the last response from the connector. This
+    does not send a request.
+
+    Returns None if any of the watches no longer exists (e.g. because the connection was lost). Otherwise returns a
+    list of bytes in the order they were requested."""
+    try:
+        return [ctx.watched_data[watch_id] for watch_id in watch_ids]
+    except KeyError:
+        return None
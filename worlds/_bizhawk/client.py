@@ -56,6 +56,8 @@ class AutoBizHawkClientRegister(abc.ABCMeta):
 
     @staticmethod
     async def get_handler(ctx: "BizHawkClientContext", system: str) -> BizHawkClient | None:
+        from worlds import load_all_worlds
+        load_all_worlds()  # any game could own the rom, so their clients have to be registered
         for systems, handlers in AutoBizHawkClientRegister.game_handlers.items():
             if system in systems:
                 for handler in handlers.values():
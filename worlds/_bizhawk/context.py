@@ -12,12 +12,12 @@ from CommonClient import CommonContext, ClientCommandProcessor, get_base_parser,
 import Patch
 import Utils
 
-from . import BizHawkContext, ConnectionStatus, NotConnectedError, RequestFailedError, connect, disconnect, get_hash, \
-    get_script_version, get_system, ping
+from . import BizHawkContext, ConnectionStatus, NotConnectedError, RequestFailedError, connect, disconnect, \
+    enable_binary_framing, get_hash, get_script_version, get_system, ping
 from .client import BizHawkClient, AutoBizHawkClientRegister
 
 
-EXPECTED_SCRIPT_VERSION = 1
+EXPECTED_SCRIPT_VERSION = 3
 
 
 class AuthStatus(enum.IntEnum):
@@ -152,6 +152,8 @@ async def _game_watcher(ctx: BizHawkClientContext):
                     disconnect(ctx.bizhawk_ctx)
                     continue
 
+                await enable_binary_framing(ctx.bizhawk_ctx)
+
             showed_connecting_message = False
 
             await ping(ctx.bizhawk_ctx)
@@ -517,15 +517,15 @@ class ALTTPSNIClient(SNIClient):
         return True
 
     async def game_watcher(self, ctx):
-        from SNIClient import snes_read, snes_buffered_write, snes_flush_writes
-        gamemode = await snes_read(ctx, WRAM_START + 0x10, 1)
+        from SNIClient import snes_read_batch, snes_buffered_write, snes_flush_writes
+        reads = await snes_read_batch(ctx, ((WRAM_START + 0x10, 1), (SAVEDATA_START + 0x443, 1),
+                                            (SAVEDATA_START + 0x42E, 4), (RECV_PROGRESS_ADDR, 8)))
+        gamemode, gameend, game_timer, data = reads if reads else (None, None, None, None)
         if "DeathLink" in ctx.tags and gamemode and ctx.last_death_link + 1 < time.time():
             currently_dead = gamemode[0] in DEATH_MODES
             await ctx.handle_deathlink_state(currently_dead,
                                              ctx.player_names[ctx.slot] + " ran out of hearts." if ctx.slot else "")
 
-        gameend = await snes_read(ctx, SAVEDATA_START + 0x443, 1)
-        game_timer = await snes_read(ctx, SAVEDATA_START + 0x42E, 4)
         if gamemode is None or gameend is None or game_timer is None or \
                 (gamemode[0] not in INGAME_MODES and gamemode[0] not in ENDGAME_MODES):
             return
@@ -538,7 +538,6 @@ class ALTTPSNIClient(SNIClient):
         if gamemode in ENDGAME_MODES:  # triforce room and credits
             return
 
-        data = await snes_read(ctx, RECV_PROGRESS_ADDR, 8)
         if data is None:
             return
 
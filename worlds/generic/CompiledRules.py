@@ -0,0 +1,213 @@
+"""
+Declarative access rules that worlds can opt into instead of lambdas.
+
+A rule is built from `Has`, `HasAll`, `HasAny`, `HasFromList`, `CanReachRegion`, `And` and `Or` (or `&` and `|`) and
+assigned through `set_rule`/`add_rule` from `worlds.generic.Rules`, which compile it for the Location's or Entrance's
+player. Compiled rules are flattened into a disjunction of clauses, from which a function is generated that checks
+`CollectionState.prog_items` directly. Equal rules of one player share a single compiled rule, so a batched
+reachability pass like `CollectionState.filter_reachable` only evaluates each of them once.
+"""
+
+import dataclasses
+import typing
+import weakref
+
+if typing.TYPE_CHECKING:
+    from BaseClasses import CollectionState
+
+__all__ = ["Rule", "Has", "HasAll", "HasAny", "HasFromList", "CanReachRegion", "And", "Or",
+           "CompiledRule", "compile_rule", "get_compiled_rule"]
+
+max_clauses: int = 64
+"""Maximum number of clauses an `And` gets expanded into, larger products are kept as nested rules instead."""
+
+
+class Rule:
+    """Base class of the declarative rule nodes. Nodes are immutable and compare by value."""
+
+    def __and__(self, other: "Rule") -> "Rule":
+        return And(self, other)
+
+    def __or__(self, other: "Rule") -> "Rule":
+        return Or(self, other)
+
+
+@dataclasses.dataclass(frozen=True)
+class Has(Rule):
+    item: str
+    count: int = 1
+
+
+@dataclasses.dataclass(frozen=True, init=False)
+class HasAll(Rule):
+    items: typing.Tuple[str, ...]
+
+    def __init__(self, items: typing.Iterable[str]) -> None:
+        object.__setattr__(self, "items", tuple(items))
+
+
+@dataclasses.dataclass(frozen=True, init=False)
+class HasAny(Rule):
+    items: typing.Tuple[str, ...]
+
+    def __init__(self, items: typing.Iterable[str]) -> None:
+        object.__setattr__(self, "items", tuple(items))
+
+
+@dataclasses.dataclass(frozen=True, init=False)
+class HasFromList(Rule):
+    """At least `count` items in total out of `items`, same as `CollectionState.has_from_list`."""
+    items: typing.Tuple[str, ...]
+    count: int
+
+    def __init__(self, items: typing.Iterable[str], count: int) -> None:
+        object.__setattr__(self, "items", tuple(items))
+        object.__setattr__(self, "count", count)
+
+
+@dataclasses.dataclass(frozen=True)
+class CanReachRegion(Rule):
+    """The region of the same player. When used on an Entrance, the indirect condition is registered automatically."""
+    region: str
+
+
+@dataclasses.dataclass(frozen=True, init=False)
+class And(Rule):
+    rules: typing.Tuple[Rule, ...]
+
+    def __init__(self, *rules: Rule) -> None:
+        object.__setattr__(self, "rules", rules)
+
+
+@dataclasses.dataclass(frozen=True, init=False)
+class Or(Rule):
+    rules: typing.Tuple[Rule, ...]
+
+    def __init__(self, *rules: Rule) -> None:
+        object.__setattr__(self, "rules", rules)
+
+
+class Clause(typing.NamedTuple):
+    """Requirements that all have to be met. Each field is a flat table that is checked in order."""
+    items: typing.Tuple[typing.Tuple[str, int], ...] = ()
+    lists: typing.Tuple[typing.Tuple[typing.Tuple[str, ...], int], ...] = ()
+    regions: typing.Tuple[str, ...] = ()
+    rules: typing.Tuple["CompiledRule", ...] = ()
+
+    def merge(self, other: "Clause") -> "Clause":
+        return Clause(self.items + other.items, self.lists + other.lists,
+                      self.regions + other.regions, self.rules + other.rules)
+
+
+class CompiledRule:
+    """
+    A `Rule` bound to a player, fulfilled if any of its clauses is fulfilled.
+    `evaluate` is generated from the clauses and is what gets assigned as access rule.
+    """
+    __slots__ = ("rule", "player", "clauses", "evaluate", "__weakref__")
+
+    rule: Rule
+    player: int
+    clauses: typing.Tuple[Clause, ...]
+    evaluate: typing.Callable[["CollectionState"], bool]
+
+    def __init__(self, rule: Rule, player: int, clauses: typing.Tuple[Clause, ...]) -> None:
+        self.rule = rule
+        self.player = player
+        self.clauses = clauses
+        self.evaluate = self._generate()
+
+    def __call__(self, state: "CollectionState") -> bool:
+        return self.evaluate(state)
+
+    def _generate(self) -> typing.Callable[["CollectionState"], bool]:
+        # item and region names are passed as constants instead of being written into the source
+        constants: typing.Dict[str, typing.Any] = {}
+
+        def constant(value: typing.Any) -> str:
+            name = f"_c{len(constants)}"
+            constants[name] = value
+            return name
+
+        clauses: typing.List[str] = []
+        for items, lists, regions, rules in self.clauses:
+            conditions = [f"get({constant(item)}, 0) >= {count}" for item, count in items if count > 0]
+            conditions += [" + ".join(f"get({constant(item)}, 0)" for item in list_items) + f" >= {count}"
+                           for list_items, count in lists if count > 0 and list_items]
+            conditions += ["False" for list_items, count in lists if count > 0 and not list_items]
+            conditions += [f"state.can_reach_region({constant(region)}, {self.player})" for region in regions]
+            conditions += [f"{constant(rule.evaluate)}(state)" for rule in rules]
+            clauses.append(f"({' and '.join(conditions)})" if conditions else "True")
+        # dict.get skips Counter.__missing__ for items that were not collected yet
+        source = (f"def compiled_rule(state):\n"
+                  f"    get = state.prog_items[{self.player}].get\n"
+                  f"    return {' or '.join(clauses) if clauses else 'False'}\n")
+        exec(compile(source, f"<compiled rule of player {self.player}>", "exec"), constants)
+        evaluate = constants["compiled_rule"]
+        evaluate.compiled_rule = self
+        return evaluate
+
+    def item_names(self) -> typing.Set[str]:
+        """All items this rule can check, including nested rules."""
+        names: typing.Set[str] = set()
+        for clause in self.clauses:
+            names.update(item for item, count in clause.items)
+            for list_items, count in clause.lists:
+                names.update(list_items)
+            for rule in clause.rules:
+                names |= rule.item_names()
+        return names
+
+    def region_names(self) -> typing.Set[str]:
+        """All regions this rule can check, including nested rules."""
+        names: typing.Set[str] = set()
+        for clause in self.clauses:
+            names.update(clause.regions)
+            for rule in clause.rules:
+                names |= rule.region_names()
+        return names
+
+    def __repr__(self) -> str:
+        return f"CompiledRule({self.rule!r}, player={self.player})"
+
+
+_compiled_rules: "weakref.WeakValueDictionary[typing.Tuple[Rule, int], CompiledRule]" = weakref.WeakValueDictionary()
+
+
+def compile_rule(rule: Rule, player: int) -> CompiledRule:
+    """Compiles rule for player. Equal rules of the same player return the same CompiledRule while it is in use."""
+    key = (rule, player)
+    compiled = _compiled_rules.get(key)
+    if compiled is None:
+        compiled = _compiled_rules[key] = CompiledRule(rule, player, tuple(_to_clauses(rule, player)))
+    return compiled
+
+
+def get_compiled_rule(access_rule: typing.Callable[["CollectionState"], bool]) -> typing.Optional[CompiledRule]:
+    """Returns the CompiledRule an access rule was generated from, or None for other rules."""
+    return getattr(access_rule, "compiled_rule", None)
+
+
+def _to_clauses(rule: Rule, player: int) -> typing.List[Clause]:
+    if isinstance(rule, Has):
+        return [Clause(items=((rule.item, rule.count),))]
+    if isinstance(rule, HasAll):
+        return [Clause(items=tuple((item, 1) for item in rule.items))]
+    if isinstance(rule, HasAny):
+        return [Clause(items=((item, 1),)) for item in rule.items]
+    if isinstance(rule, HasFromList):
+        return [Clause(lists=((rule.items, rule.count),))]
+    if isinstance(rule, CanReachRegion):
+        return [Clause(regions=(rule.region,))]
+    if isinstance(rule, Or):
+        return [clause for sub_rule in rule.rules for clause in _to_clauses(sub_rule, player)]
+    if isinstance(rule, And):
+        clauses = [Clause()]
+        for sub_rule in rule.rules:
+            sub_clauses = _to_clauses(sub_rule, player)
+            if len(clauses) * len(sub_clauses) > max_clauses:
+                # expanding further would multiply the clauses, check this part as a whole instead
+                sub_clauses = [Clause(rules=(compile_rule(sub_rule, player),))]
+            clauses = [clause.merge(sub_clause) for clause in clauses for sub_clause in sub_clauses]
+        return clauses
+    raise TypeError(f"Cannot compile {rule!r}, expected Has, HasAll, HasAny, HasFromList, CanReachRegion, And or Or.")
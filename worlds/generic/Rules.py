@@ -3,6 +3,7 @@ import logging
 import typing
 
 from BaseClasses import LocationProgressType, MultiWorld, Location, Region, Entrance
+from .CompiledRules import And, Or, Rule, compile_rule, get_compiled_rule
 
 if typing.TYPE_CHECKING:
     import BaseClasses
@@ -96,12 +97,25 @@ def exclusion_rules(multiworld: MultiWorld, player: int, exclude_locations: typi
                 logging.warning(f"Unable to exclude location {loc_name} in player {player}'s world.")
 
 
-def set_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"], rule: CollectionRule):
+def set_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"],
+             rule: typing.Union[CollectionRule, Rule]):
+    """Sets the access rule of spot. Declarative rules from worlds.generic.CompiledRules are compiled for its player."""
+    if isinstance(rule, Rule):
+        rule = _compile_spot_rule(spot, rule)
     spot.access_rule = rule
 
 
-def add_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"], rule: CollectionRule, combine="and"):
+def add_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"],
+             rule: typing.Union[CollectionRule, Rule], combine="and"):
     old_rule = spot.access_rule
+    if isinstance(rule, Rule):
+        old_compiled = get_compiled_rule(old_rule)
+        if old_compiled is not None:
+            # keep the combined rule declarative, so it stays a single flat rule
+            rule = And(rule, old_compiled.rule) if combine == "and" else Or(rule, old_compiled.rule)
+            spot.access_rule = _compile_spot_rule(spot, rule)
+            return
+        rule = _compile_spot_rule(spot, rule)
     # empty rule, replace instead of add
     if old_rule is Location.access_rule or old_rule is Entrance.access_rule:
         spot.access_rule = rule if combine == "and" else old_rule
@@ -112,6 +126,19 @@ def add_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"],
             spot.access_rule = lambda state: rule(state) or old_rule(state)
 
 
+def _compile_spot_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"],
+                       rule: Rule) -> CollectionRule:
+    compiled = compile_rule(rule, spot.player)
+    if isinstance(spot, Entrance):
+        region_names = compiled.region_names()
+        if region_names:
+            assert spot.parent_region, f"Entrance {spot.name} needs a parent_region to depend on a region."
+            multiworld = spot.parent_region.multiworld
+            for region_name in region_names:
+                multiworld.register_indirect_condition(multiworld.get_region(region_name, spot.player), spot)
+    return compiled.evaluate
+
+
 def forbid_item(location: "BaseClasses.Location", item: str, player: int):
     old_rule = location.item_rule
     # empty rule
@@ -37,11 +37,11 @@ def recalculate_reachable_orbs(state: CollectionState, player: int, world: "JakA
     for level in level_table:
         accessible_level_orbs = count_reachable_orbs_level(state, world, level)
         accessible_total_orbs += accessible_level_orbs
-        state.prog_items[player][f"{level} Reachable Orbs".lstrip()] = accessible_level_orbs
+        state.set_item(f"{level} Reachable Orbs".lstrip(), player, accessible_level_orbs)
 
     # Also recalculate the global count, still used even when Orbsanity is Off.
-    state.prog_items[player]["Reachable Orbs"] = accessible_total_orbs
-    state.prog_items[player]["Reachable Orbs Fresh"] = True
+    state.set_item("Reachable Orbs", player, accessible_total_orbs)
+    state.set_item("Reachable Orbs Fresh", player, True)
 
 
 def count_reachable_orbs_global(state: CollectionState,
@@ -206,13 +206,16 @@ def dice_simulation_state_change(state, player, frags_per_dice, frags_per_roll,
     """
 
     if state.prog_items[player]["state_is_fresh"] == 0:
-        state.prog_items[player]["state_is_fresh"] = 1
+        # set_item, as this state may share prog_items with a snapshot
+        state.set_item("state_is_fresh", player, 1)
         categories, num_dice, num_rolls, fixed_mult, step_mult, expoints = extract_progression(
             state, player, frags_per_dice, frags_per_roll, allowed_categories
         )
-        state.prog_items[player]["maximum_achievable_score"] = (
+        state.set_item(
+            "maximum_achievable_score",
+            player,
             dice_simulation_strings(categories, num_dice, num_rolls, fixed_mult, step_mult, difficulty, player)
-            + expoints
+            + expoints,
         )
 
     return state.prog_items[player]["maximum_achievable_score"]